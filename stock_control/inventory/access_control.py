@@ -1,7 +1,7 @@
 from django.http import HttpResponseForbidden
 from functools import wraps
 
-from .utils import is_admin_user
+from .utils import get_user_group_names, is_admin_user
 from .constants import LEGACY_ROLE_GROUPS, GROUP_NAME_TO_ROLE_KEY
 
 
@@ -10,7 +10,8 @@ def has_access(user, allowed_groups=None):
         if is_admin_user(user):
             return True
         if allowed_groups:
-            if user.groups.filter(name__in=allowed_groups).exists():
+            group_names = get_user_group_names(user)
+            if group_names.intersection(allowed_groups):
                 return True
             legacy_targets = []
             for group in allowed_groups:
@@ -22,7 +23,7 @@ def has_access(user, allowed_groups=None):
                     for legacy_name, legacy_role in LEGACY_ROLE_GROUPS.items()
                     if legacy_role == role_key
                 ])
-            if legacy_targets and user.groups.filter(name__in=legacy_targets).exists():
+            if group_names.intersection(legacy_targets):
                 return True
     return False
 
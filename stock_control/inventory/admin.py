@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
-from services.data_storage.models import Product, ProductItem, Withdrawal, PurchaseOrder, Supplier, Location
+from services.data_storage.models import DailyConsumption, Product, ProductItem, ProductStockSummary, Withdrawal, PurchaseOrder, Supplier, Location, StockMovement
+from services.data_storage.ledger import record_movement
 
 # ✅ Custom UserAdmin
 class CustomUserAdmin(BaseUserAdmin):
@@ -48,6 +50,22 @@ class ProductItemAdmin(admin.ModelAdmin):
     list_filter = ("product__supplier", "product_feature", "expiry_date", "location")
     search_fields = ("product__name", "lot_number")
 
+    def save_model(self, request, obj, form, change):
+        previous_stock = form.initial.get("current_stock") if change else None
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if not change:
+                record_movement(obj, obj.current_stock, StockMovement.SOURCE_LOT_CREATED, user=request.user)
+            elif previous_stock is not None and obj.current_stock != previous_stock:
+                record_movement(obj, obj.current_stock - previous_stock, StockMovement.SOURCE_ADJUSTMENT, user=request.user)
+
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes bypass ProductItem.delete(), so refresh the affected summaries here
+        product_ids = list(queryset.values_list("product_id", flat=True).distinct())
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            ProductStockSummary.refresh_for_products(product_ids)
+
 
 @admin.register(Withdrawal)
 class WithdrawalAdmin(admin.ModelAdmin):
@@ -63,6 +81,13 @@ class WithdrawalAdmin(admin.ModelAdmin):
     list_filter = ("withdrawal_type", "timestamp", "location")
     search_fields = ("product_code", "product_name", "lot_number", "user__username")
 
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes bypass Withdrawal.delete(), so take them out of the daily rollups here
+        withdrawals = list(queryset)
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            DailyConsumption.record_withdrawals(withdrawals, sign=-1)
+
 
 @admin.register(PurchaseOrder)
 class PurchaseOrderAdmin(admin.ModelAdmin):
@@ -83,3 +108,31 @@ class LocationAdmin(admin.ModelAdmin):
     list_display = ("name", "is_default")
     search_fields = ("name",)
     list_filter = ("is_default",)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = (
+        "timestamp",
+        "source",
+        "product_code",
+        "lot_number",
+        "quantity_delta",
+        "parts_delta",
+        "location",
+        "user",
+        "reference",
+    )
+    list_filter = ("source", "timestamp", "location")
+    search_fields = ("product_code", "lot_number", "reference", "user__username")
+    list_select_related = ("location", "user")
+
+    # The ledger is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
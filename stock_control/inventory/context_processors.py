@@ -1,11 +1,10 @@
-from stock_control.module_loader import load_enabled_modules
+from stock_control.module_loader import enabled_module_flags
 
-from .utils import get_active_user_count
+from .utils import get_active_user_count, get_user_roles
 
 def module_flags(request):
-    enabled = load_enabled_modules()
     return {
-        "flags": {module: True for module in enabled}
+        "flags": enabled_module_flags()
     }
 
 
@@ -13,3 +12,10 @@ def active_user_stats(request):
     return {
         "active_user_count": get_active_user_count(),
     }
+
+
+def user_roles(request):
+    # Resolved once here so the navbar's role filters are set lookups.
+    return {
+        "user_roles": get_user_roles(getattr(request, "user", None)),
+    }
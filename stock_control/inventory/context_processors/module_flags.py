@@ -1,11 +1,5 @@
-from django.conf import settings
-import json
-import os
+from stock_control.module_loader import module_config_flags
+
 
 def module_flags(request):
-    config_path = os.path.join(settings.BASE_DIR, "config", "module_config.json")
-    try:
-        with open(config_path, "r") as f:
-            return {"module_flags": json.load(f)}
-    except Exception:
-        return {"module_flags": {}}
\ No newline at end of file
+    return {"module_flags": module_config_flags()}
@@ -0,0 +1,26 @@
+import time
+
+from inventory.utils import ACTIVE_SESSION_SEEN_KEY, ACTIVE_SESSION_TOUCH_SECONDS, record_active_session
+
+
+class ActiveSessionMiddleware:
+    """Keep the signed-in user's ``ActiveUserSession`` row in step with their session.
+
+    Runs after the view so a login or logout during the request is already
+    reflected. The row is written at most every ``ACTIVE_SESSION_TOUCH_SECONDS``
+    per session, or straight away when the session key has changed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            session = request.session
+            seen = session.get(ACTIVE_SESSION_SEEN_KEY)
+            if (not seen or seen[0] != session.session_key
+                    or time.time() - seen[1] >= ACTIVE_SESSION_TOUCH_SECONDS):
+                record_active_session(request, user)
+        return response
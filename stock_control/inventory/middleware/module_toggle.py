@@ -1,17 +1,15 @@
-import json
-from django.conf import settings
-from django.http import HttpResponseNotFound
-import os
+from stock_control.module_loader import enabled_modules, module_config_flags
+from stock_control.urls import urlconf_for
 
-CONFIG_PATH = os.path.join(settings.BASE_DIR, "config", "module_config.json")
-
-with open(CONFIG_PATH, "r") as f:
-    MODULE_CONFIG = json.load(f)
 
 class ModuleToggleMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        request.module_config = MODULE_CONFIG
-        return self.get_response(request)
\ No newline at end of file
+        # Both files are re-read only when they change on disk (see module_loader).
+        request.module_config = module_config_flags()
+        urlconf = urlconf_for(enabled_modules())
+        if urlconf is not None:
+            request.urlconf = urlconf
+        return self.get_response(request)
@@ -0,0 +1,73 @@
+from django.contrib.auth.models import Group, User
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.contrib.sessions.models import Session
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from .utils import (
+    ensure_role_groups,
+    forget_active_session,
+    forget_role_groups,
+    forget_user_groups,
+    prune_active_sessions,
+    record_active_session,
+)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        forget_user_groups([instance.pk], instance)
+    elif action == 'pre_clear':
+        # group.user_set.clear(): pk_set is not given, so read the members first
+        forget_user_groups(list(instance.user_set.values_list('pk', flat=True)))
+    elif pk_set:
+        # group.user_set.add/remove(...)
+        forget_user_groups(pk_set)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    # A rename changes the names cached for every member.
+    if not created:
+        forget_user_groups(list(instance.user_set.values_list('pk', flat=True)))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Memberships are removed without m2m_changed, so collect them while they exist.
+    forget_user_groups(list(instance.user_set.values_list('pk', flat=True)))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    forget_role_groups()
+
+
+@receiver(post_migrate)
+def create_role_groups(sender, app_config=None, **kwargs):
+    # inventory has no models of its own, so hook onto auth's migrations.
+    if app_config is not None and app_config.label == 'auth':
+        ensure_role_groups(force=True)
+
+
+@receiver(user_logged_in)
+def session_started(sender, request, user, **kwargs):
+    if hasattr(request, 'session'):
+        record_active_session(request, user)
+    prune_active_sessions()
+
+
+@receiver(user_logged_out)
+def session_ended(sender, request, user, **kwargs):
+    if hasattr(request, 'session'):
+        forget_active_session(request.session.session_key)
+
+
+@receiver(post_delete, sender=Session)
+def session_deleted(sender, instance, **kwargs):
+    # Password changes cycle the key and the admin can delete sessions directly.
+    forget_active_session(instance.session_key)
@@ -2,50 +2,36 @@
 
 from django import template
 
-from inventory.utils import is_admin_user
-from inventory.constants import LEGACY_ROLE_GROUPS, GROUP_NAME_TO_ROLE_KEY
+from inventory.utils import get_user_roles
+from inventory.constants import ROLE_GROUP_MAP, ROLE_KEY_ADMIN
 
 register = template.Library()
 
+ADMIN_ROLE = ROLE_GROUP_MAP[ROLE_KEY_ADMIN]
+
+
+def _roles(value):
+    # Templates pass the ``user_roles`` set from the context processor; a user
+    # still works where that context is not available.
+    if isinstance(value, (set, frozenset)):
+        return value
+    return get_user_roles(value)
+
 
 @register.filter(name='has_role_or_admin')
-def has_role_or_admin(user, group_name):
-    if is_admin_user(user):
-        return True
-    group = group_name.strip()
-    if user.groups.filter(name=group).exists():
-        return True
-    role_key = GROUP_NAME_TO_ROLE_KEY.get(group)
-    if role_key:
-        legacy_groups = [name for name, role in LEGACY_ROLE_GROUPS.items() if role == role_key]
-        return user.groups.filter(name__in=legacy_groups).exists()
-    return False
+def has_role_or_admin(roles, group_name):
+    roles = _roles(roles)
+    return ADMIN_ROLE in roles or group_name.strip() in roles
 
 
 @register.filter(name='has_any_role')
-def has_any_role(user, group_list):
-    if is_admin_user(user):
-        return True
-    groups = [g.strip() for g in group_list.split(',') if g.strip()]
-    if user.groups.filter(name__in=groups).exists():
+def has_any_role(roles, group_list):
+    roles = _roles(roles)
+    if ADMIN_ROLE in roles:
         return True
-    legacy_targets = []
-    for group in groups:
-        role_key = GROUP_NAME_TO_ROLE_KEY.get(group)
-        if role_key:
-            legacy_targets.extend([name for name, role in LEGACY_ROLE_GROUPS.items() if role == role_key])
-    if legacy_targets:
-        return user.groups.filter(name__in=legacy_targets).exists()
-    return False
+    return any(g.strip() in roles for g in group_list.split(',') if g.strip())
 
 
 @register.filter(name='has_role')
-def has_role(user, group_name):
-    group = group_name.strip()
-    if user.groups.filter(name=group).exists():
-        return True
-    role_key = GROUP_NAME_TO_ROLE_KEY.get(group)
-    if role_key:
-        legacy_groups = [name for name, role in LEGACY_ROLE_GROUPS.items() if role == role_key]
-        return user.groups.filter(name__in=legacy_groups).exists()
-    return False
+def has_role(roles, group_name):
+    return group_name.strip() in _roles(roles)
@@ -1,3 +1,168 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+
+from services.data_collection.data_collection import parse_barcode_data
+from services.data_collection.gs1_corpus import BARCODE_CORPUS
+from services.data_storage.keyset import encode_cursor
+from services.data_storage.models import Location, Product, ProductItem, ProductStockSummary, Withdrawal
+
+from .constants import ROLE_GROUP_MAP, ROLE_KEY_STAFF
+from .utils import get_user_group_names, get_user_roles, set_user_role
+
+
+class BarcodeParserTests(SimpleTestCase):
+    def test_corpus(self):
+        for raw, expected in BARCODE_CORPUS:
+            with self.subTest(raw=raw):
+                result = parse_barcode_data(raw)
+                if expected is None:
+                    self.assertIsNone(result)
+                else:
+                    self.assertEqual((result["product_code"], result["lot_number"], result["expiry_date"]), expected)
+
+
+class NavbarQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("staff", "staff@example.com", "pw")
+        set_user_role(self.user, "staff")
+
+    def navbar_request(self):
+        request = RequestFactory().get("/")
+        # Wrapped like AuthenticationMiddleware wraps it, and loaded up front
+        request.user = SimpleLazyObject(lambda: User.objects.get(pk=self.user.pk))
+        request.user.is_authenticated
+        request.session = {}
+        return request
+
+    def test_role_filters_do_not_query_per_call(self):
+        request = self.navbar_request()
+        cache.clear()
+        # The user's groups and the active user count, however many filters run.
+        with self.assertNumQueries(2):
+            html = render_to_string("includes/navbar.html", request=request)
+        self.assertIn("Stock Management", html)
+        self.assertNotIn("User Management", html)
+
+    def test_role_lookup_is_cached_between_requests(self):
+        render_to_string("includes/navbar.html", request=self.navbar_request())
+        request = self.navbar_request()
+        # Only the active user count; the groups come from the cache.
+        with self.assertNumQueries(1):
+            render_to_string("includes/navbar.html", request=request)
+
+    def test_group_names_are_memoized_on_a_lazy_user(self):
+        request = self.navbar_request()
+        get_user_group_names(request.user)
+        with mock.patch("inventory.utils.cache") as cache_mock, self.assertNumQueries(0):
+            names = get_user_group_names(request.user)
+        cache_mock.get.assert_not_called()
+        self.assertEqual(names, {ROLE_GROUP_MAP[ROLE_KEY_STAFF]})
+
+    def test_effective_roles_are_memoized_on_a_lazy_user(self):
+        request = self.navbar_request()
+        roles = get_user_roles(request.user)
+        with mock.patch("inventory.utils.cache") as cache_mock, self.assertNumQueries(0):
+            self.assertIs(get_user_roles(request.user), roles)
+        cache_mock.get.assert_not_called()
+
+
+class WithdrawalScanTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("scanner", "scanner@example.com", "pw")
+        set_user_role(self.user, "user")
+        self.client.force_login(self.user)
+
+    def test_bad_parts_withdrawn_is_a_400(self):
+        url = reverse("data_collection_2:create_withdrawal_scan")
+        for parts in ("abc", "-1"):
+            response = self.client.post(url, {"quantity": "1", "withdrawal_type": "unit",
+                                               "withdrawal_mode": "part", "parts_withdrawn": parts})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("parts_withdrawn", response.json()["errors"])
+
+    def test_non_integer_ids_are_a_400(self):
+        url = reverse("data_collection_2:create_withdrawal_scan")
+        for name in ("location_id", "product_dropdown"):
+            with self.subTest(name=name):
+                response = self.client.post(url, {"quantity": "1", "withdrawal_type": "unit", name: "abc"})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": f"{name} must be an integer"})
+
+
+class ChangefeedCursorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("etl", "etl@example.com", "pw")
+        set_user_role(self.user, "staff")
+        self.client.force_login(self.user)
+
+    def test_cursor_values_of_the_wrong_type_are_a_400(self):
+        for feed, values in (("withdrawals", [None]), ("withdrawals", ["abc"]),
+                             ("purchase-orders", [123, 1]), ("purchase-orders", ["2026-01-01T00:00:00", None])):
+            with self.subTest(feed=feed, values=values):
+                response = self.client.get(reverse("reporting:changefeed", args=[feed]),
+                                           {"cursor": encode_cursor(values)})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Invalid cursor"})
+
+
+class RegisterStockScanTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("receiver", "receiver@example.com", "pw")
+        self.client.force_login(self.user)
+
+    def test_out_of_range_quantities_are_a_400(self):
+        url = reverse("data_collection_3:register-stock-scan")
+        for quantity in ("1e30", "10000000000"):
+            with self.subTest(quantity=quantity):
+                response = self.client.post(url, {"barcode": "0104012345678901", "quantity": quantity, "use_now": "on"})
+                self.assertEqual(response.status_code, 400)
+                response = self.client.post(url, {"batch_scans": f'[{{"barcode": "0104012345678901", "quantity": {quantity}}}]',
+                                                  "use_now": "on"})
+                self.assertEqual(response.status_code, 400)
+
+
+class StockSummaryTests(TestCase):
+    def test_moving_a_lot_refreshes_both_products(self):
+        old = Product.objects.create(product_code="OLD", name="Old", threshold=1)
+        new = Product.objects.create(product_code="NEW", name="New", threshold=1)
+        item = ProductItem.objects.create(product=old, lot_number="L1", current_stock=Decimal("5"))
+        item.product = new
+        item.save()
+        self.assertEqual(ProductStockSummary.objects.get(product=old).total_stock, 0)
+        self.assertEqual(ProductStockSummary.objects.get(product=new).total_stock, 5)
+
+
+class TrackWithdrawalsTests(TestCase):
+    def test_location_filter_includes_rows_shown_under_the_lot_location(self):
+        admin = User.objects.create_user("boss", "boss@example.com", "pw", is_staff=True)
+        self.client.force_login(admin)
+        lab = Location.objects.create(name="Lab")
+        product = Product.objects.create(product_code="P1", name="Reagent", threshold=1)
+        item = ProductItem.objects.create(product=product, lot_number="L1", current_stock=Decimal("5"), location=lab)
+        withdrawal = Withdrawal.objects.create(product_item=item, quantity=Decimal("1"))
+        Withdrawal.objects.filter(pk=withdrawal.pk).update(location=None)
+
+        response = self.client.get(reverse("reporting:reporting_stock_withdrawal:track_withdrawals"),
+                                   {"location_id": lab.pk})
+        rows = list(response.context["withdrawals"])
+        self.assertEqual([row.pk for row in rows], [withdrawal.pk])
+        self.assertEqual(rows[0].location_name, "Lab")
+
+
+class DownloadReportPageTests(TestCase):
+    def test_background_exports_are_offered_to_admins_only(self):
+        for role, offered in (("staff", False), ("admin", True)):
+            with self.subTest(role=role):
+                user = User.objects.create_user(f"{role}-reports", f"{role}@example.com", "pw")
+                set_user_role(user, role)
+                self.client.force_login(user)
+                response = self.client.get(reverse("reporting:download_report"))
+                self.assertEqual(b"data-export-format" in response.content, offered)
@@ -1,10 +1,12 @@
 import datetime as dt
-from typing import Dict, List, Optional
+from typing import Dict, FrozenSet, List, Optional
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, User
-from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db.models import Max
 from django.utils import timezone
+from django.utils.functional import LazyObject, empty
 
 from .constants import (
     ROLE_GROUP_MAP,
@@ -15,12 +17,42 @@ from .constants import (
     LEGACY_ROLE_GROUPS,
     ALL_MANAGED_GROUP_NAMES,
 )
+from services.data_storage.models import ActiveUserSession
 
 
-def ensure_role_groups() -> None:
-    """Ensure the baseline role groups exist in the database."""
+# Group names per user are cached for this long. Signals in inventory.signals
+# drop the entry when memberships change; settings use a cache every worker
+# shares, and the TTL bounds staleness should a per-process backend be used.
+ROLE_CACHE_SECONDS = 60
+ROLE_CACHE_VERSION = 1
+
+_role_groups_ensured = False
+
+
+def ensure_role_groups(force: bool = False) -> None:
+    """Ensure the baseline role groups exist in the database.
+
+    Runs once per process (and from ``post_migrate``); pass ``force`` to check again.
+    """
+    global _role_groups_ensured
+    if _role_groups_ensured and not force:
+        return
+    existing = set(Group.objects.filter(name__in=ROLE_GROUP_MAP.values()).values_list('name', flat=True))
     for group_name in ROLE_GROUP_MAP.values():
-        Group.objects.get_or_create(name=group_name)
+        if group_name not in existing:
+            Group.objects.get_or_create(name=group_name)
+    _role_groups_ensured = True
+
+
+def forget_role_groups() -> None:
+    """Make the next ``ensure_role_groups`` call check the database again."""
+    global _role_groups_ensured
+    _role_groups_ensured = False
+
+# A signed-in session's presence row is refreshed at most this often. The
+# session remembers when (and under which key) it was last recorded.
+ACTIVE_SESSION_TOUCH_SECONDS = 300
+ACTIVE_SESSION_SEEN_KEY = "_presence_seen"
 
 
 def _get_group_for_role(role_key: str) -> Optional[Group]:
@@ -28,7 +60,12 @@ def _get_group_for_role(role_key: str) -> Optional[Group]:
     if not group_name:
         return None
     ensure_role_groups()
-    return Group.objects.filter(name=group_name).first()
+    group = Group.objects.filter(name=group_name).first()
+    if group is None:
+        # Deleted since this process last checked
+        ensure_role_groups(force=True)
+        group = Group.objects.filter(name=group_name).first()
+    return group
 
 
 def set_user_role(user: User, role_key: str) -> None:
@@ -49,23 +86,67 @@ def set_user_role(user: User, role_key: str) -> None:
     user.save(update_fields=['is_staff'])
 
 
+def role_cache_key(user_id: int) -> str:
+    return f"inventory:user-groups:v{ROLE_CACHE_VERSION}:{user_id}"
+
+
+def _unwrap_user(user):
+    """The object behind ``request.user``'s lazy wrapper, whose own ``__dict__`` holds no memo."""
+    if isinstance(user, LazyObject):
+        if user._wrapped is empty:
+            user._setup()
+        return user._wrapped
+    return user
+
+
+def get_user_group_names(user: User) -> FrozenSet[str]:
+    """Return the names of the user's groups, loading them at most once per request.
+
+    The result is memoized on the user object (``request.user`` lives for one
+    request) and shared between requests through the cache.
+    """
+    user = _unwrap_user(user)
+    if not isinstance(user, User) or user.pk is None:
+        return frozenset()
+    names = user.__dict__.get('_role_group_names')
+    if names is not None:
+        return names
+
+    prefetched = getattr(user, '_prefetched_objects_cache', {}).get('groups')
+    if prefetched is not None:
+        names = frozenset(group.name for group in prefetched)
+    else:
+        key = role_cache_key(user.pk)
+        names = cache.get(key)
+        if names is None:
+            names = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, names, ROLE_CACHE_SECONDS)
+    user._role_group_names = names
+    return names
+
+
+def forget_user_groups(user_ids, instance: Optional[User] = None) -> None:
+    """Drop cached group names after a membership change."""
+    cache.delete_many([role_cache_key(user_id) for user_id in user_ids])
+    if instance is not None:
+        instance = _unwrap_user(instance)
+        instance.__dict__.pop('_role_group_names', None)
+        instance.__dict__.pop('_effective_roles', None)
+
+
 def get_user_role(user: User) -> Optional[str]:
     """Return the canonical role key for the user."""
     if not isinstance(user, User):
         return None
 
-    ensure_role_groups()
-
-    if user.groups.filter(name=ROLE_GROUP_MAP[ROLE_KEY_ADMIN]).exists():
-        return ROLE_KEY_ADMIN
-    for role_key in (ROLE_KEY_STAFF, ROLE_KEY_USER, ROLE_KEY_SUPPLIER):
-        group_name = ROLE_GROUP_MAP[role_key]
-        if user.groups.filter(name=group_name).exists():
+    names = get_user_group_names(user)
+    for role_key in (ROLE_KEY_ADMIN, ROLE_KEY_STAFF, ROLE_KEY_USER, ROLE_KEY_SUPPLIER):
+        if ROLE_GROUP_MAP[role_key] in names:
             return role_key
 
     # Legacy groups support
     for legacy_group, mapped_role in LEGACY_ROLE_GROUPS.items():
-        if user.groups.filter(name=legacy_group).exists():
+        if legacy_group in names:
             return mapped_role
 
     if user.is_staff:
@@ -81,33 +162,64 @@ def is_admin_user(user: User) -> bool:
     return get_user_role(user) == ROLE_KEY_ADMIN
 
 
-def _active_session_map() -> Dict[int, Dict[str, timezone.datetime]]:
-    """Return a map of user_id to freshest session metadata for authenticated users."""
-    session_map: Dict[int, Dict[str, timezone.datetime]] = {}
-    active_sessions = Session.objects.filter(expire_date__gte=timezone.now())
-    for session in active_sessions:
-        data = session.get_decoded()
-        user_id = data.get("_auth_user_id")
-        if not user_id:
-            continue
-        try:
-            user_id = int(user_id)
-        except (TypeError, ValueError):
-            continue
-        current = session_map.get(user_id)
-        if not current or session.expire_date > current["expire_date"]:
-            session_map[user_id] = {"expire_date": session.expire_date}
-    return session_map
+def get_user_roles(user: User) -> FrozenSet[str]:
+    """Return the role group names the user effectively holds.
+
+    Legacy groups count as the role they map to, and admins (see
+    ``is_admin_user``) always hold the Admin role.
+    """
+    user = _unwrap_user(user)
+    if not isinstance(user, User):
+        return frozenset()
+    roles = user.__dict__.get('_effective_roles')
+    if roles is None:
+        names = get_user_group_names(user)
+        roles = set(names & set(ROLE_GROUP_MAP.values()))
+        roles.update(ROLE_GROUP_MAP[role] for group, role in LEGACY_ROLE_GROUPS.items() if group in names)
+        if is_admin_user(user):
+            roles.add(ROLE_GROUP_MAP[ROLE_KEY_ADMIN])
+        roles = frozenset(roles)
+        user._effective_roles = roles
+    return roles
+
+
+def record_active_session(request, user: User) -> None:
+    """Create or refresh the presence row for the request's session."""
+    session = request.session
+    if not session.session_key:
+        return
+    now = timezone.now()
+    ActiveUserSession.objects.update_or_create(
+        session_key=session.session_key,
+        defaults={"user": user, "expire_date": session.get_expiry_date(), "last_seen": now},
+    )
+    session[ACTIVE_SESSION_SEEN_KEY] = [session.session_key, now.timestamp()]
+
+
+def forget_active_session(session_key: Optional[str]) -> None:
+    if session_key:
+        ActiveUserSession.objects.filter(session_key=session_key).delete()
+
+
+def prune_active_sessions() -> int:
+    """Delete presence rows whose session has expired."""
+    deleted, _ = ActiveUserSession.objects.filter(expire_date__lt=timezone.now()).delete()
+    return deleted
 
 
 def get_active_user_count() -> int:
     """Return the number of distinct users with a non-expired session."""
-    return len(_active_session_map())
+    return (ActiveUserSession.objects.filter(expire_date__gte=timezone.now())
+            .values("user_id").distinct().count())
 
 
 def get_active_user_sessions() -> List[Dict[str, object]]:
     """Return a list of dictionaries describing currently authenticated users."""
-    session_map = _active_session_map()
+    session_map = {
+        row["user_id"]: {"expire_date": row["expire_date"]}
+        for row in ActiveUserSession.objects.filter(expire_date__gte=timezone.now())
+        .values("user_id").annotate(expire_date=Max("expire_date")).order_by()
+    }
     if not session_map:
         return []
 
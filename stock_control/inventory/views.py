@@ -11,6 +11,7 @@ from .forms import (
     ProductItemForm,
     PurchaseOrderCompletionForm,
 )
+from services.data_storage.code_index import product_code_index
 from services.data_storage.models import Product, Withdrawal, PurchaseOrder, ProductItem, PurchaseOrderCompletionLog, Location, StockRegistrationLog
 from services.data_storage.models_acceptance import LotAcceptanceTest
 from django.contrib.auth.forms import UserCreationForm
@@ -73,7 +74,7 @@ def manage_users(request):
     else:
         form = UserCreateForm(initial={'role': ROLE_KEY_USER})
 
-    users = User.objects.all().order_by('username')
+    users = User.objects.all().prefetch_related('groups').order_by('username')
     user_rows = []
     for user in users:
         role_key = get_user_role(user)
@@ -173,7 +174,7 @@ def user_activity_overview(request):
 @user_passes_test(is_admin, login_url='inventory:dashboard')
 def role_assignment(request):
     ensure_role_groups()
-    users = User.objects.all().order_by('username')
+    users = User.objects.all().prefetch_related('groups').order_by('username')
 
     if request.method == 'POST':
         updates = 0
@@ -241,6 +242,10 @@ from .utils import (
     get_active_user_sessions,
 )
 from django.urls import reverse, NoReverseMatch
+from services.data_storage.low_stock import low_stock_products, paginate_low_stock
+from services.data_storage.ledger import record_movement
+from services.data_storage.models import StockMovement
+from django.db import transaction
 
 @login_required
 @group_required(["Admin", "Staff", "User", "Supplier"])
@@ -252,17 +257,7 @@ def inventory_dashboard(request):
     context = get_dashboard_data()
 
     # 1. Low stock alerts
-    low_stock_alerts = []
-    for product in Product.objects.prefetch_related("items").all():
-        total_stock = sum(item.current_stock for item in product.items.all())
-        if total_stock < product.threshold:
-            has_pending_po = PurchaseOrder.objects.filter(
-                product_code=product.product_code,
-                status__in=["Ordered", "Delayed"],
-            ).exists()
-            if not has_pending_po:
-                low_stock_alerts.append(product)
-    has_low_stock_alerts = len(low_stock_alerts) > 0
+    has_low_stock_alerts = low_stock_products().exists()
 
     # 2. Expired lots
     has_expired_lot_alerts = ProductItem.objects.filter(expiry_date__lte=now().date()).exists()
@@ -502,6 +497,7 @@ def create_withdrawal(request):
 def product_list(request):
     products = (
         Product.objects
+        .select_related("stock_summary")
         .prefetch_related(
             Prefetch(
                 "items",
@@ -525,18 +521,14 @@ def product_list(request):
     }
 
     for product in products:
-        product.full_items = product.get_full_items_in_stock()
-        product.remaining_parts = product.get_remaining_parts()
-        product.total_stock = sum(item.current_stock for item in product.items.all())
+        summary = product.get_stock_summary()
+        product.full_items = int(summary.total_stock)
+        product.remaining_parts = summary.partial_units
+        product.total_stock = summary.total_stock
+        product.lot_instances = summary.lot_count
+        product.earliest_expiry = summary.earliest_expiry
 
         items = list(product.items.all())
-        product.lot_instances = len(items)
-
-        product.earliest_expiry = None
-        if items:
-            expiries = [i.expiry_date for i in items if getattr(i, "expiry_date", None)]
-            product.earliest_expiry = min(expiries) if expiries else None
-
         passed = failed = untested = 0
         for item in items:
             tests = list(getattr(item, "acceptance_tests", []).all()) if hasattr(item, "acceptance_tests") else []
@@ -570,20 +562,14 @@ def product_list(request):
 @login_required
 @group_required(["Admin", "Staff", "User", "Supplier"])
 def low_stock_lots(request):
-    products = Product.objects.prefetch_related('items', 'items__location').all()
+    products = low_stock_products().prefetch_related(
+        Prefetch('items', queryset=ProductItem.objects.select_related('location'))
+    )
+    page = paginate_low_stock(products, request.GET.get('page'))
     rows = []
 
-    for product in products:
-        total_stock = sum(item.current_stock for item in product.items.all())
-        if total_stock >= product.threshold:
-            continue
-        has_pending_po = PurchaseOrder.objects.filter(
-            product_code=product.product_code,
-            status__in=["Ordered", "Delayed"],
-        ).exists()
-        if has_pending_po:
-            continue
-
+    for product in page.object_list:
+        total_stock = product.total_stock
         items = list(product.items.all())
         if items:
             for item in items:
@@ -611,6 +597,7 @@ def low_stock_lots(request):
 
     return render(request, 'inventory/low_stock_lots.html', {
         'rows': rows,
+        'page_obj': page,
     })
 
 
@@ -696,34 +683,32 @@ def record_purchase_order(request):
                     if product_item:
                         po.product_item = product_item            
             print(po)
-            po.save()
+            with transaction.atomic():
+                po.save()
 
-            if po.status == 'Delivered' and po.product_item:
-                po.product_item.current_stock = F('current_stock') + po.quantity_ordered
-                po.product_item.save()
-                print(po)
+                if po.status == 'Delivered' and po.product_item:
+                    po.product_item.current_stock = F('current_stock') + po.quantity_ordered
+                    po.product_item.save()
+                    record_movement(
+                        po.product_item,
+                        po.quantity_ordered,
+                        StockMovement.SOURCE_PO_DELIVERY,
+                        user=request.user,
+                        reference=f"PurchaseOrder:{po.pk}",
+                    )
+                    print(po)
 
             return redirect('inventory:record_purchase_order')
     else:
         form = PurchaseOrderForm(initial=initial)
 
     # 🧮 Recalculate low stock again, excluding products with an outstanding PO
-    products = Product.objects.all()
-    low_stock = []
-    for p in products:
-        total_stock = sum(item.current_stock for item in p.items.all())
-        if total_stock < p.threshold:
-            # Exclude if an order is already placed and pending (status Ordered/Delayed)
-            has_pending_po = PurchaseOrder.objects.filter(
-                product_code=p.product_code,
-                status__in=["Ordered", "Delayed"],
-            ).exists()
-            if not has_pending_po:
-                low_stock.append(p)
+    low_stock = paginate_low_stock(low_stock_products(), request.GET.get('page'))
 
     return render(request, 'inventory/record_purchase_order.html', {
         'form': form,
         'low_stock': low_stock,
+        'page_obj': low_stock,
     })
 
 
@@ -772,6 +757,13 @@ def track_purchase_orders(request):
                     "completion_form": form
                 })
 
+            # Matching PurchaseOrder (by product) that this delivery completes
+            po = PurchaseOrder.objects.filter(
+                Q(product_code=product_code),
+                Q(status="Ordered") | Q(status="Delayed")
+            ).order_by("-order_date").first()
+            po_reference = f"PurchaseOrder:{po.pk}" if po else ""
+
             total_received = 0
             touched_items = []
             if lot_mode == "multiple":
@@ -797,8 +789,11 @@ def track_purchase_orders(request):
                         expiry_date=ed_obj,
                         defaults={"current_stock": 0}
                     )
-                    item.current_stock = F("current_stock") + q_int
-                    item.save()
+                    with transaction.atomic():
+                        item.current_stock = F("current_stock") + q_int
+                        item.save()
+                        record_movement(item, q_int, StockMovement.SOURCE_PO_DELIVERY,
+                                        user=request.user, reference=po_reference)
                     item.refresh_from_db()
                     touched_items.append(item)
                     total_received += q_int
@@ -823,18 +818,16 @@ def track_purchase_orders(request):
                     expiry_date=expiry_date,
                     defaults={"current_stock": 0}
                 )
-                item.current_stock = F("current_stock") + int(qty or 0)
-                item.save()
+                with transaction.atomic():
+                    item.current_stock = F("current_stock") + int(qty or 0)
+                    item.save()
+                    record_movement(item, int(qty or 0), StockMovement.SOURCE_PO_DELIVERY,
+                                    user=request.user, reference=po_reference)
                 item.refresh_from_db()
                 touched_items.append(item)
                 total_received = int(qty or 0)
 
-            # Update matching PurchaseOrder (by product) to Delivered
-            po = PurchaseOrder.objects.filter(
-                Q(product_code=product_code),
-                Q(status="Ordered") | Q(status="Delayed")
-            ).order_by("-order_date").first()
-
+            # Update matching PurchaseOrder to Delivered
             if po:
                 po.status = "Delivered"
                 po.delivered_at = timezone.now()
@@ -881,11 +874,19 @@ def track_purchase_orders(request):
 def mark_order_delivered(request, order_id):
     purchase_order = get_object_or_404(PurchaseOrder, id=order_id)
     if purchase_order.status != 'Delivered':
-        if purchase_order.product_item:
-            purchase_order.product_item.current_stock = F('current_stock') + purchase_order.quantity_ordered
-            purchase_order.product_item.save()
-        purchase_order.status = 'Delivered'
-        purchase_order.save()
+        with transaction.atomic():
+            if purchase_order.product_item:
+                purchase_order.product_item.current_stock = F('current_stock') + purchase_order.quantity_ordered
+                purchase_order.product_item.save()
+                record_movement(
+                    purchase_order.product_item,
+                    purchase_order.quantity_ordered,
+                    StockMovement.SOURCE_PO_DELIVERY,
+                    user=request.user,
+                    reference=f"PurchaseOrder:{purchase_order.pk}",
+                )
+            purchase_order.status = 'Delivered'
+            purchase_order.save()
     return redirect('inventory:track_purchase_orders')
 
 
@@ -906,21 +907,10 @@ def lot_quality_review(request):
 
     if barcode_query:
         parsed = parse_barcode_data(barcode_query)
-        codes = []
-        if parsed:
-            code = parsed.get('product_code') or ''
-            if code:
-                codes.append(code)
-                normalized = code.lstrip('0')
-                if normalized and normalized != code:
-                    codes.append(normalized)
-        else:
-            normalized = barcode_query.lstrip('0')
-            codes = [barcode_query]
-            if normalized and normalized != barcode_query:
-                codes.append(normalized)
-        if codes:
-            products = products.filter(product_code__in=codes)
+        code = (parsed.get('product_code') or '') if parsed else barcode_query
+        product_id = product_code_index.product_id(code)
+        if product_id:
+            products = products.filter(pk=product_id)
         else:
             products = products.none()
 
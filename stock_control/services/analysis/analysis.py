@@ -1,17 +1,18 @@
 import json
+import numpy as np
 import pandas as pd
 from datetime import timedelta
-from django.utils.timezone import now
+from django.utils import timezone
+from django.utils.timezone import now, make_aware, get_current_timezone
 from django.shortcuts import render
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
 import datetime
 from django.db.models import Count, Sum, Value, CharField
-from django.db.models.functions import Coalesce
-from services.data_storage.models import Product, ProductItem, Withdrawal, PurchaseOrder
+from django.db.models.functions import Coalesce, TruncDate
+from services.data_storage.models import DailyConsumption, ForecastResult, Product, ProductItem, PurchaseOrder
 
 def get_dashboard_data():
     # 1. Stock Level Status
-    products = Product.objects.all()
+    products = Product.objects.select_related('stock_summary')
     heatmap_data = []
     for product in products:
         stock = product.get_full_items_in_stock()
@@ -33,13 +34,16 @@ def get_dashboard_data():
     # 3. Recent Withdrawals Trend (last 30 days)
     today = now().date()
     start_date = today - datetime.timedelta(days=30)
-    withdrawals = Withdrawal.objects.filter(timestamp__date__gte=start_date)
-    withdrawal_by_day = withdrawals.extra({'day': "date(timestamp)"}).values('day').annotate(total=Count('id')).order_by('day')
-    withdrawal_dates = [item['day'] for item in withdrawal_by_day]
+    withdrawal_by_day = (DailyConsumption.objects
+                         .filter(day__gte=start_date)
+                         .values('day')
+                         .annotate(total=Sum('count'))
+                         .order_by('day'))
+    withdrawal_dates = [item['day'].isoformat() for item in withdrawal_by_day]
     withdrawal_counts = [item['total'] for item in withdrawal_by_day]
 
     # 4. Top Withdrawn Products
-    top_withdrawn = Withdrawal.objects.values('product_name').annotate(total=Sum('quantity')).order_by('-total')[:5]
+    top_withdrawn = DailyConsumption.objects.values('product_name').annotate(total=Sum('quantity')).order_by('-total')[:5]
     top_products_labels = [item['product_name'] for item in top_withdrawn]
     top_products_counts = [float(item['total']) for item in top_withdrawn]
 
@@ -73,6 +77,29 @@ def get_dashboard_data():
 
 
 
+def _day_bounds(first_day, last_day):
+    """Aware ``[start, end)`` datetimes covering whole local days, for index-friendly range filters."""
+    tz = get_current_timezone()
+    start = make_aware(datetime.datetime.combine(first_day, datetime.time.min), tz)
+    end = make_aware(datetime.datetime.combine(last_day + timedelta(days=1), datetime.time.min), tz)
+    return start, end
+
+
+def _stored_forecast(product):
+    """The product's ``ForecastResult`` fetched via ``select_related``, or ``None``."""
+    try:
+        return product.forecast
+    except ForecastResult.DoesNotExist:
+        return None
+
+
+def _days_from(today, day):
+    """Whole days from ``today`` to ``day``, clamped to the chart range (0-400)."""
+    if day is None:
+        return 0.0
+    return float(min(max((day - today).days, 0), 400))
+
+
 # import json
 # import pandas as pd
 # from datetime import timedelta
@@ -106,21 +133,28 @@ def inventory_analysis_forecasting(request):
     recent_dates = [start_date + timedelta(days=i) for i in range((today - start_date).days + 1)]
 
     # === Filtered Products ===
-    products = Product.objects.prefetch_related('items').all()
+    products = Product.objects.select_related('stock_summary', 'forecast').all()
     if limit:
         products = products[:limit]
+    products = list(products)
 
     product_names = [p.name for p in products]
     product_codes = [p.product_code for p in products]
-    current_stock = [float(sum(i.current_stock for i in p.items.all())) for p in products]
+    current_stock_arr = np.array([float(p.get_stock_summary().total_stock) for p in products], dtype=float)
+    current_stock = current_stock_arr.tolist()
     stock_thresholds = [p.threshold for p in products]
     lead_times = [p.lead_time.days for p in products]
 
-    # === Withdrawals over Date Range ===
-    withdrawal_counts = [
-        float(Withdrawal.objects.filter(timestamp__date=day).aggregate(total=Sum('quantity'))['total'] or 0)
-        for day in recent_dates
-    ]
+    # === Withdrawals over Date Range (one GROUP BY, scattered by day offset) ===
+    withdrawal_series = np.zeros(len(recent_dates), dtype=float)
+    daily_rows = (DailyConsumption.objects
+                  .filter(day__range=[start_date, today])
+                  .values('day')
+                  .annotate(total=Sum('quantity'))
+                  .order_by())
+    for row in daily_rows:
+        withdrawal_series[(row['day'] - start_date).days] = float(row['total'] or 0)
+    withdrawal_counts = withdrawal_series.tolist()
     date_labels = [day.strftime("%b %d") for day in recent_dates]
 
     # === DataFrame for SMA & Forecast ===
@@ -129,46 +163,53 @@ def inventory_analysis_forecasting(request):
     df["SMA_7"] = df["withdrawals"].rolling(window=7, min_periods=1).mean()
     df["SMA_14"] = df["withdrawals"].rolling(window=14, min_periods=1).mean()
 
-    # === Exponential Smoothing Forecast ===
-    forecast_values = [0] * 7
-    if df["withdrawals"].sum() > 0:
-        model = ExponentialSmoothing(df["withdrawals"], trend="add", seasonal=None, damped_trend=True)
-        fitted = model.fit()
-        forecast_values = [round(val, 2) for val in fitted.forecast(7).tolist()]
+    # === Precomputed Forecasts (manage.py compute_forecasts) ===
+    forecasts = [_stored_forecast(p) for p in products]
+    forecast_computed_at = max((f.computed_at for f in forecasts if f is not None), default=None)
+
+    # Sum the stored per-product forecasts for the next 7 days, aligned by date
+    # so a forecast computed yesterday still lines up with tomorrow.
+    forecast_series = np.zeros(7, dtype=float)
+    for forecast in forecasts:
+        if forecast is None:
+            continue
+        offset = (today - timezone.localtime(forecast.computed_at).date()).days
+        window = np.asarray(forecast.daily_forecast[max(offset, 0):max(offset, 0) + 7], dtype=float)
+        forecast_series[:window.size] += window
+    forecast_values = [round(val, 2) for val in forecast_series.tolist()]
 
     forecast_dates = [(today + timedelta(days=i)).strftime("%b %d") for i in range(1, 8)]
 
-    # === Run-Out & Reorder Estimates ===
-    days_until_run_out = []
-    days_until_reorder = []
-
-    for idx, product in enumerate(products):
-        total_withdrawn = Withdrawal.objects.filter(
-            product_item__product=product,
-            timestamp__gte=start_date
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-
-        avg_daily = float(total_withdrawn) / max(days_back, 1)
-        current = current_stock[idx]
-
-        if avg_daily > 0 and current > 0:
-            run_out = round(current / float(avg_daily), 2)
-            # Clamp run-out to 400 days max for readability
-            if run_out > 400:
-                run_out = 400.0
-            reorder = max(run_out - lead_times[idx], 0)
-            if reorder > 400:
-                reorder = 400.0
-        else:
-            run_out = 0
-            reorder = 0
-
-        days_until_run_out.append(run_out)
-        days_until_reorder.append(reorder)
+    # === Run-Out & Reorder Estimates (vectorised across products) ===
+    # Products without a stored forecast fall back to the average daily rate over the range.
+    withdrawn_by_code = {
+        row['product_code']: float(row['total'] or 0)
+        for row in (DailyConsumption.objects
+                    .filter(day__gte=start_date, product_code__in=product_codes)
+                    .values('product_code')
+                    .annotate(total=Sum('quantity'))
+                    .order_by())
+    }
+    total_withdrawn = np.array([withdrawn_by_code.get(code, 0.0) for code in product_codes], dtype=float)
+    avg_daily = total_withdrawn / max(days_back, 1)
+    lead_time_arr = np.array(lead_times, dtype=float)
+
+    has_rate = (avg_daily > 0) & (current_stock_arr > 0)
+    safe_rate = np.where(has_rate, avg_daily, 1.0)
+    # Clamp run-out and reorder to 400 days max for readability
+    run_out_arr = np.where(has_rate, np.minimum(np.round(current_stock_arr / safe_rate, 2), 400.0), 0.0)
+    reorder_arr = np.where(has_rate, np.clip(run_out_arr - lead_time_arr, 0.0, 400.0), 0.0)
+    for i, forecast in enumerate(forecasts):
+        if forecast is None:
+            continue
+        run_out_arr[i] = _days_from(today, forecast.run_out_date)
+        reorder_arr[i] = _days_from(today, forecast.reorder_date)
+    days_until_run_out = run_out_arr.tolist()
+    days_until_reorder = reorder_arr.tolist()
 
     # === Top Consumed Products ===
-    top = (Withdrawal.objects
-           .filter(timestamp__date__gte=start_date)
+    top = (DailyConsumption.objects
+           .filter(day__gte=start_date)
            .values('product_code', 'product_name')
            .annotate(total_quantity=Sum('quantity'))
            .order_by('-total_quantity'))
@@ -181,9 +222,9 @@ def inventory_analysis_forecasting(request):
     top_consumed_quantities = [float(i['total_quantity']) for i in top]
 
     # === Location-specific Withdrawal Totals (within range) ===
-    loc_qs = (Withdrawal.objects
-              .filter(timestamp__date__gte=start_date)
-              .annotate(loc_name=Coalesce(Coalesce('location__name', 'product_item__location__name'), Value('Central', output_field=CharField())))
+    loc_qs = (DailyConsumption.objects
+              .filter(day__gte=start_date)
+              .annotate(loc_name=Coalesce('location__name', Value('Central', output_field=CharField())))
               .values('loc_name')
               .annotate(total_qty=Sum('quantity'))
               .order_by('-total_qty'))
@@ -191,14 +232,21 @@ def inventory_analysis_forecasting(request):
     location_withdrawals = [float(row['total_qty'] or 0) for row in loc_qs]
 
     # === Delayed deliveries per day in chosen range ===
-    delayed_counts = [
-        PurchaseOrder.objects.filter(status='Delayed', expected_delivery__date=day).count()
-        for day in recent_dates
-    ]
+    range_start, range_end = _day_bounds(start_date, today)
+    delayed_series = np.zeros(len(recent_dates), dtype=int)
+    delayed_rows = (PurchaseOrder.objects
+                    .filter(status='Delayed', expected_delivery__gte=range_start, expected_delivery__lt=range_end)
+                    .annotate(day=TruncDate('expected_delivery'))
+                    .values('day')
+                    .annotate(total=Count('id'))
+                    .order_by())
+    for row in delayed_rows:
+        delayed_series[(row['day'] - start_date).days] = row['total']
+    delayed_counts = delayed_series.tolist()
 
     # === Top 10 deleted quantities by product (lot_discard) ===
-    deleted_qs = (Withdrawal.objects
-                  .filter(withdrawal_type='lot_discard', timestamp__date__gte=start_date)
+    deleted_qs = (DailyConsumption.objects
+                  .filter(withdrawal_type='lot_discard', day__gte=start_date)
                   .values('product_code', 'product_name')
                   .annotate(total_qty=Sum('quantity'))
                   .order_by('-total_qty')[:10])
@@ -245,6 +293,7 @@ def inventory_analysis_forecasting(request):
         "upcoming_expiry_quantities": json.dumps(upcoming_expiry_quantities),
         "upcoming_expiry_names": json.dumps(upcoming_expiry_names),
         "deleted_names": json.dumps(deleted_names),
+        "forecast_computed_at": forecast_computed_at,
         "selected_range": selected_range,
         "selected_limit": selected_limit,
     }
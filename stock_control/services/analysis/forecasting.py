@@ -0,0 +1,163 @@
+"""Offline per-product demand forecasting, persisted to ``ForecastResult``.
+
+The fits run outside the request cycle (``manage.py compute_forecasts``) so the
+analysis page only reads stored rows. ``fit_product_series`` is a plain
+top-level function without database access so it can be shipped to a
+``ProcessPoolExecutor`` worker.
+"""
+import datetime
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from services.data_storage.models import DailyConsumption, ForecastResult, Product
+
+DEFAULT_HISTORY_DAYS = 180
+DEFAULT_HORIZON_DAYS = 30
+# Run-out dates beyond this are not meaningful for ordering, same cap as the analysis charts.
+MAX_RUN_OUT_DAYS = 400
+# A damped-trend fit needs a few days with demand; sparser series use the mean.
+MIN_DEMAND_DAYS = 5
+
+METHOD_HOLT_DAMPED = "holt_damped"
+METHOD_MEAN = "mean"
+METHOD_ZERO = "zero"
+
+
+def fit_product_series(payload):
+    """Fit one product's daily demand series and return its forecast.
+
+    ``payload`` is ``(product_id, series, horizon_days)``. Returns a dict with
+    ``product_id``, ``method``, ``forecast`` (non-negative floats), ``aic``,
+    ``fit_seconds`` and ``error``. Failed fits fall back to the series mean.
+    """
+    product_id, series, horizon_days = payload
+    started = time.perf_counter()
+    history = np.asarray(series, dtype=float)
+    method, aic, error = METHOD_ZERO, None, ""
+    forecast = np.zeros(horizon_days)
+
+    if np.count_nonzero(history) >= MIN_DEMAND_DAYS:
+        try:
+            from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                fitted = ExponentialSmoothing(history, trend="add", seasonal=None, damped_trend=True).fit()
+            forecast = np.asarray(fitted.forecast(horizon_days), dtype=float)
+            if not np.all(np.isfinite(forecast)):
+                raise ValueError("non-finite forecast")
+            method = METHOD_HOLT_DAMPED
+            aic = float(fitted.aic) if np.isfinite(fitted.aic) else None
+        except Exception as exc:  # statsmodels raises a variety of numeric errors
+            error = f"{type(exc).__name__}: {exc}"[:500]
+            method = METHOD_MEAN
+            forecast = np.full(horizon_days, history.mean())
+    elif history.any():
+        method = METHOD_MEAN
+        forecast = np.full(horizon_days, history.mean())
+
+    return {
+        "product_id": product_id,
+        "method": method,
+        "forecast": np.round(np.clip(forecast, 0.0, None), 4).tolist(),
+        "aic": aic,
+        "fit_seconds": time.perf_counter() - started,
+        "error": error,
+    }
+
+
+def build_demand_series(products, start, end):
+    """Daily withdrawn quantity per product from the rollup, as a ``(products, days)`` matrix.
+
+    Lot discards are excluded because they are write-offs, not demand.
+    """
+    row_by_code = {p.product_code: i for i, p in enumerate(products)}
+    matrix = np.zeros((len(products), (end - start).days + 1), dtype=float)
+    rows = (DailyConsumption.objects
+            .filter(day__range=[start, end], product_code__in=list(row_by_code))
+            .exclude(withdrawal_type="lot_discard")
+            .values("product_code", "day")
+            .annotate(total=Sum("quantity"))
+            .order_by())
+    for row in rows:
+        matrix[row_by_code[row["product_code"]], (row["day"] - start).days] = float(row["total"] or 0)
+    return matrix
+
+
+def run_out_offset(stock, forecast):
+    """Days from the forecast start until cumulative demand reaches ``stock``, or ``None``.
+
+    Beyond the horizon the last forecast rate is extrapolated, capped at
+    ``MAX_RUN_OUT_DAYS``.
+    """
+    if stock <= 0:
+        return 0
+    cumulative = np.cumsum(forecast)
+    reached = np.nonzero(cumulative >= stock)[0]
+    if reached.size:
+        return int(reached[0]) + 1
+    tail_rate = forecast[-1] if len(forecast) else 0.0
+    if tail_rate <= 0:
+        return None
+    remaining = stock - (cumulative[-1] if len(cumulative) else 0.0)
+    return min(len(forecast) + int(np.ceil(remaining / tail_rate)), MAX_RUN_OUT_DAYS)
+
+
+def compute_forecasts(history_days=DEFAULT_HISTORY_DAYS, horizon_days=DEFAULT_HORIZON_DAYS,
+                      workers=None, today=None):
+    """Fit every product and replace the stored ``ForecastResult`` rows.
+
+    ``workers=1`` fits in-process, otherwise fits are spread over a process
+    pool (``None`` lets the executor pick the CPU count). Returns the saved rows.
+    """
+    today = today or timezone.localdate()
+    start = today - datetime.timedelta(days=history_days - 1)
+    products = list(Product.objects.select_related("stock_summary").order_by("pk"))
+    matrix = build_demand_series(products, start, today)
+    payloads = [(p.pk, matrix[i].tolist(), horizon_days) for i, p in enumerate(products)]
+
+    if workers == 1 or len(payloads) < 2:
+        fits = list(map(fit_product_series, payloads))
+    else:
+        pool_size = workers or os.cpu_count() or 1
+        chunksize = max(1, len(payloads) // (pool_size * 4))
+        with ProcessPoolExecutor(max_workers=pool_size) as pool:
+            fits = list(pool.map(fit_product_series, payloads, chunksize=chunksize))
+
+    computed_at = timezone.now()
+    results = []
+    for product, history, fit in zip(products, matrix, fits):
+        stock = product.get_stock_summary().total_stock
+        offset = run_out_offset(float(stock), np.asarray(fit["forecast"]))
+        run_out_date = today + datetime.timedelta(days=offset) if offset is not None else None
+        reorder_date = None
+        if run_out_date is not None:
+            reorder_date = max(run_out_date - datetime.timedelta(days=product.lead_time.days), today)
+        results.append(ForecastResult(
+            product=product,
+            computed_at=computed_at,
+            method=fit["method"],
+            history_days=history_days,
+            horizon_days=horizon_days,
+            daily_forecast=fit["forecast"],
+            avg_daily_demand=round(float(history.mean()), 4) if history.size else 0.0,
+            stock_at_forecast=Decimal(stock),
+            run_out_date=run_out_date,
+            reorder_date=reorder_date,
+            fit_seconds=round(fit["fit_seconds"], 4),
+            aic=fit["aic"],
+            error=fit["error"],
+        ))
+
+    with transaction.atomic():
+        ForecastResult.objects.all().delete()
+        ForecastResult.objects.bulk_create(results, batch_size=500)
+    return results
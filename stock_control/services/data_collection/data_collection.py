@@ -1,98 +1,40 @@
+import datetime
 import re
+from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from services.data_storage.code_index import product_code_index
+from services.data_collection.gs1 import parse_gs1
 from services.data_storage.models import Product, ProductItem
-from django.db.models import Q
+from services.data_storage.models_acceptance import LotAcceptanceTest
+from django.db.models import BooleanField, CharField, DateTimeField, OuterRef, Q, Subquery
 import string
 
-# 🔧 Utility function to format GS1 expiry date
-def _format_gs1_date(raw_date):
-    try:
-        yy, mm, dd = raw_date[:2], raw_date[2:4], raw_date[4:6]
-        return f"{dd}.{mm}.20{yy}"
-    except Exception:
-        return ""
-
 # 🔍 Reusable parser that works independently of Django
 def parse_barcode_data(raw):
-    result = {
-        "product_code": "",
-        "lot_number": "",
-        "expiry_date": "",
-        "format": None
-    }
+    """Product code, lot and expiry (``DD.MM.YYYY``) from a scan, or ``None``.
 
+    ``3PR`` house labels are split on ``**``; anything else is read as a GS1
+    element string (see ``gs1.py``), whose AIs are also returned under ``ais``.
+    """
     if not raw:
         return None
 
-    # Normalize common scanner variations
-    # - Remove ASCII GS (Group Separator, 0x1D) which often appears between AIs
-    # - Remove whitespace and other non-alnum (keep parentheses for bracketed parse)
-    gs_char = "\x1D"
-    # Remove GS control char but otherwise keep original content for bracketed parse
-    raw_no_gs = raw.replace(gs_char, "")
-    raw_keep_paren = raw_no_gs
-    # Fully flattened (no parentheses) for the unbracketed pass
-    # Flattened string with only A-Z, a-z, 0-9 kept
-    raw_flat = re.sub(r"[^A-Za-z0-9]+", "", raw_no_gs.replace("(", "").replace(")", ""))
-
     # Case 1: 3PR barcode
     if "**" in raw and "3PR" in raw:
         try:
             parts = raw.split("**")
             product_code = re.search(r"3PR\d+", parts[0])
-            result["product_code"] = product_code.group(0) if product_code else ""
-            result["lot_number"] = parts[1] if len(parts) > 1 else ""
-            result["expiry_date"] = parts[2] if len(parts) > 2 else ""
-            result["format"] = "3PR"
-            return result
+            return {
+                "product_code": product_code.group(0) if product_code else "",
+                "lot_number": parts[1] if len(parts) > 1 else "",
+                "expiry_date": parts[2] if len(parts) > 2 else "",
+                "format": "3PR",
+            }
         except Exception:
             return None
 
-    # Case 2: Bracketed GS1
-    try:
-        product_code = re.search(r"\(01\)(\d{14})", raw_keep_paren)
-        expiry = re.search(r"\(17\)(\d{6})", raw_keep_paren)
-        lot = re.search(r"\(10\)([^\(\)]+)", raw_keep_paren)
-
-        if product_code:
-            result["product_code"] = product_code.group(1)
-            if expiry:
-                result["expiry_date"] = _format_gs1_date(expiry.group(1))
-            if lot:
-                result["lot_number"] = lot.group(1)
-            result["format"] = "GS1"
-            return result
-        # If no product_code in bracketed form, fall through to flattened parsing
-    except Exception:
-        pass
-
-    # Case 3: Flattened GS1
-    try:
-        s = raw_flat
-        # Must start with AI 01 and have 14 digits after
-        m01 = re.search(r"01(\d{14})", s)
-        if not m01:
-            raise ValueError("Missing AI 01")
-        result["product_code"] = m01.group(1)
-
-        # Search for expiry AI 17 (fixed length 6) anywhere after the GTIN
-        after01 = s[m01.end():]
-        m17 = re.search(r"17(\d{6})", after01)
-        if m17:
-            result["expiry_date"] = _format_gs1_date(m17.group(1))
-
-        # Search for lot AI 10 (variable length). Prefer to stop at next AI (two digits) if present
-        # Capture lot (AI 10) until next known AI or end. Allow common lot punctuation
-        m10 = re.search(r"10([A-Za-z0-9\-_.\/]+?)(?=(?:01|17|21|15|11|30|37)\d|$)", after01)
-        if m10:
-            result["lot_number"] = m10.group(1)
-
-        result["format"] = "GS1_flat"
-        return result
-    except Exception:
-        pass
-
-    return None
+    # Case 2: GS1, bracketed or flat
+    return parse_gs1(raw)
 
 # 🌐 Django endpoint to use parse_barcode_data
 def parse_barcode(request):
@@ -111,17 +53,114 @@ def parse_barcode(request):
         return JsonResponse(result)
     return JsonResponse({"error": "Unrecognized barcode format"}, status=400)
 
+# 🔧 Product for a scan: own product code first, then ProductCodeMapping
+def resolve_scan_product(raw, parsed=None):
+    """Return ``(product, matched_by)`` for a raw scan, or ``(None, None)``; one query on a hit."""
+    raw = (raw or "").strip()
+    code = (parsed or {}).get("product_code") or raw
+    product_id, matched_by = product_code_index.resolve(code)
+    if product_id is None and code != raw:
+        # A mapping may list the whole printed barcode rather than its GTIN
+        product_id, matched_by = product_code_index.resolve(raw)
+    if product_id is None:
+        return None, None
+    product = Product.objects.filter(pk=product_id).first()
+    return (product, matched_by) if product else (None, None)
+
+
+def _lot_payload(item, lot_number, expiry):
+    return {
+        "id": item.pk,
+        "lot_number": item.lot_number,
+        "expiry_date": item.expiry_date.isoformat() if item.expiry_date else "",
+        "current_stock": str(item.current_stock),
+        "accumulated_partial": item.accumulated_partial,
+        "units_per_quantity": item.units_per_quantity,
+        "product_feature": item.product_feature,
+        "location": {"id": item.location_id, "name": item.location.name} if item.location else None,
+        "matches_scan": bool(lot_number or expiry)
+                        and (not lot_number or item.lot_number.lower() == lot_number.lower())
+                        and (not expiry or item.expiry_date == expiry),
+        "acceptance": {
+            "tested_at": item.last_tested.isoformat(),
+            "passed": item.last_passed,
+            "reference": item.last_ref or "",
+            "signed_off_by": item.last_signed_by or "",
+        } if item.last_tested else None,
+    }
+
+
+def _parse_scan_expiry(value):
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value or "", fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+# 🌐 Parse, product and FEFO lots for a scan in one call
+@login_required
+def resolve_scan(request):
+    """``GET data/resolve-scan/?raw=...[&location_id=...]``.
+
+    Lots with stock (and the scanned lot even when empty) come back
+    first-expiry-first-out with their latest acceptance test. Two queries,
+    however many lots the product has.
+    """
+    raw = (request.GET.get("raw") or "").strip()
+    if not raw:
+        return JsonResponse({"error": "No barcode provided"}, status=400)
+
+    parsed = parse_barcode_data(raw)
+    product, matched_by = resolve_scan_product(raw, parsed)
+    payload = {"raw": raw, "parsed": parsed}
+    if product is None:
+        payload["error"] = "Product not found"
+        return JsonResponse(payload, status=404)
+
+    last_test = LotAcceptanceTest.objects.filter(product_item=OuterRef("pk")).order_by("-created_at", "-pk")
+    items = (ProductItem.objects
+             .filter(product=product)
+             .select_related("location")
+             .annotate(
+                 last_tested=Subquery(last_test.values("created_at")[:1], output_field=DateTimeField()),
+                 last_passed=Subquery(last_test.values("passed")[:1], output_field=BooleanField()),
+                 last_ref=Subquery(last_test.values("test_reference")[:1], output_field=CharField()),
+                 last_signed_by=Subquery(last_test.values("signed_off_by")[:1], output_field=CharField()),
+             )
+             .order_by("expiry_date", "pk"))
+    location_id = request.GET.get("location_id") or ""
+    if location_id.isdigit():
+        items = items.filter(location_id=int(location_id))
+
+    lot_number = (parsed or {}).get("lot_number") or ""
+    expiry = _parse_scan_expiry((parsed or {}).get("expiry_date"))
+    lots = []
+    for item in items:
+        lot = _lot_payload(item, lot_number, expiry)
+        if lot["matches_scan"] or item.current_stock > 0 or item.accumulated_partial:
+            lots.append(lot)
+    payload.update({
+        "product": {
+            "id": product.pk,
+            "product_code": product.product_code,
+            "name": product.name,
+            "matched_by": matched_by,
+        },
+        "lots": lots,
+    })
+    return JsonResponse(payload)
+
+
 # 🌐 Lookup by scanned barcode
 def get_product_by_barcode(request):
     barcode = request.GET.get("barcode", "")
     if not barcode:
         return JsonResponse({"error": "No barcode provided"}, status=400)
 
-    print(barcode)
-    product = Product.objects.filter(product_code=barcode).first()
-
-    if not product and barcode.isdigit():
-        product = Product.objects.filter(product_code=barcode.lstrip("0")).first()
+    product_id = product_code_index.product_id(barcode)
+    product = Product.objects.filter(pk=product_id).first() if product_id else None
 
     if product:
         latest_item = product.items.order_by('-expiry_date').first()
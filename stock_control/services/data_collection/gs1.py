@@ -0,0 +1,206 @@
+"""Table-driven GS1 element string parser.
+
+Each application identifier (AI) in ``AI_TABLE`` has either a fixed data
+length or a variable one ending at a GS (FNC1, ``\\x1d``) separator or the end
+of the string, so a scan is read left to right in one pass. GS1 AIs are
+prefix-free and their length follows from the first two digits, so the AI at
+a position is a single table lookup.
+
+Scanners configured without GS output leave variable fields unterminated. For
+those, a variable field stops at the first point where the rest of the string
+is itself a complete element string starting with a commonly following AI,
+the same boundary the old regex parser guessed, but checked rather than assumed.
+"""
+import datetime
+import re
+from calendar import monthrange
+from functools import lru_cache
+
+GS = "\x1d"
+PARSE_CACHE_SIZE = 4096
+
+# Symbology identifiers some scanners prepend: GS1-128, GS1 DataMatrix, GS1 QR, DataBar
+_SYMBOLOGY_PREFIXES = ("]C1", "]d2", "]Q3", "]e0")
+# AIs that usually follow a lot or serial when the separator was dropped
+_LIKELY_AFTER_VARIABLE = ("01", "11", "15", "17", "21", "30", "37")
+# Fixed-length AIs that only ever hold digits (GTINs and dates)
+_NUMERIC_FIXED = frozenset(("00", "01", "02", "11", "12", "13", "15", "16", "17"))
+_BRACKETED = re.compile(r"\((\d{2,4})\)([^()]*)")
+
+
+def _build_ai_table():
+    # AI -> (fixed data length or None, maximum data length)
+    table = {
+        "00": (18, 18), "01": (14, 14), "02": (14, 14),
+        "10": (None, 20), "11": (6, 6), "12": (6, 6), "13": (6, 6), "15": (6, 6), "16": (6, 6), "17": (6, 6),
+        "20": (2, 2), "21": (None, 20), "22": (None, 20),
+        "235": (None, 28), "240": (None, 30), "241": (None, 30), "242": (None, 6), "243": (None, 20),
+        "250": (None, 30), "251": (None, 30), "253": (None, 30), "254": (None, 20), "255": (None, 25),
+        "30": (None, 8), "37": (None, 8),
+        "400": (None, 30), "401": (None, 30), "402": (17, 17), "403": (None, 30),
+        "420": (None, 20), "421": (None, 12), "422": (3, 3), "423": (None, 15), "424": (3, 3),
+        "425": (None, 15), "426": (3, 3), "427": (None, 3),
+        "7001": (13, 13), "7002": (None, 30), "7003": (10, 10), "7004": (None, 4), "7005": (None, 12),
+        "7006": (6, 6), "7007": (None, 12), "7008": (None, 3), "7009": (None, 10), "7010": (None, 2),
+        "7020": (None, 20), "7021": (None, 20), "7022": (None, 20), "7023": (None, 30),
+        "8001": (14, 14), "8002": (None, 20), "8003": (None, 30), "8004": (None, 30), "8005": (6, 6),
+        "8006": (18, 18), "8007": (None, 34), "8008": (None, 12), "8010": (None, 30), "8011": (None, 12),
+        "8012": (None, 20), "8017": (18, 18), "8018": (18, 18), "8019": (None, 10), "8020": (None, 25),
+        "8200": (None, 70),
+        "90": (None, 30),
+    }
+    for ai in range(410, 418):
+        table[str(ai)] = (13, 13)
+    for ai in range(710, 716):
+        table[str(ai)] = (None, 20)
+    for ai in range(91, 100):
+        table[str(ai)] = (None, 90)
+    # Trade measures: 31nn-36nn carry six digits; the last AI digit is the decimal point position
+    for prefix in list(range(310, 317)) + list(range(320, 330)) + list(range(330, 338)) + \
+            list(range(340, 358)) + list(range(360, 370)):
+        for decimals in range(10):
+            table[f"{prefix}{decimals}"] = (6, 6)
+    for prefix, max_length in (("390", 15), ("391", 18), ("392", 15), ("393", 18)):
+        for decimals in range(10):
+            table[f"{prefix}{decimals}"] = (None, max_length)
+    return table
+
+
+AI_TABLE = _build_ai_table()
+
+
+# GS1 fixes an AI's length by its first two digits
+_AI_LENGTH = {ai[:2]: len(ai) for ai in AI_TABLE}
+
+
+def _ai_at(s, i):
+    ai = s[i:i + _AI_LENGTH.get(s[i:i + 2], 0)]
+    return ai if ai in AI_TABLE else None
+
+
+def _fits(ai, value):
+    """Whether ``value`` has the length (and, for GTINs and dates, the digits) ``ai`` requires."""
+    fixed, max_length = AI_TABLE[ai]
+    if fixed:
+        return len(value) == fixed and (ai not in _NUMERIC_FIXED or value.isdigit())
+    return 0 < len(value) <= max_length
+
+
+def _parse_flat(s, start=0, strict=False):
+    """``{ai: value}`` for the element string ``s[start:]``, or ``None`` if it does not parse.
+
+    Unless ``strict``, unreadable trailing data ends the parse and the AIs read
+    so far are kept, as the regex parser kept whatever it could match.
+    """
+    ais = {}
+    i, n = start, len(s)
+    invalid = None if strict else ais
+    while i < n:
+        if s[i] == GS:
+            i += 1
+            continue
+        ai = _ai_at(s, i)
+        if ai is None:
+            return invalid or None
+        fixed, max_length = AI_TABLE[ai]
+        data_start = i + len(ai)
+        if fixed:
+            end = data_start + fixed
+            if end > n or GS in s[data_start:end] or not _fits(ai, s[data_start:end]):
+                return invalid or None
+        else:
+            end = s.find(GS, data_start)
+            if end == -1:
+                end = n if strict else _unterminated_end(s, data_start, max_length)
+            if end == data_start or (strict and end - data_start > max_length):
+                return invalid or None
+        ais[ai] = s[data_start:end]
+        i = end
+    return ais or None
+
+
+def _unterminated_end(s, data_start, max_length):
+    # Earliest boundary after which the remainder is a complete element string
+    for j in range(data_start + 1, min(len(s), data_start + max_length + 1)):
+        if s.startswith(_LIKELY_AFTER_VARIABLE, j) and _parse_flat(s, j, strict=True) is not None:
+            return j
+    return len(s)
+
+
+def _parse_bracketed(s):
+    # Elements with unknown AIs or values of the wrong shape are skipped, so "(01)ABC" has no GTIN
+    ais = {}
+    for match in _BRACKETED.finditer(s):
+        ai, value = match.group(1), match.group(2).replace(GS, "").strip()
+        if ai in AI_TABLE and _fits(ai, value):
+            ais[ai] = value
+    return ais or None
+
+
+def parse_element_string(raw):
+    """``(format, {ai: value})`` for a GS1 scan, bracketed or not, or ``None``."""
+    # A leading or trailing GS carries nothing, but inner ones end variable fields
+    s = (raw or "").strip()
+    if " " in s:
+        s = s.replace(" ", "")
+    for prefix in _SYMBOLOGY_PREFIXES:
+        if s.startswith(prefix):
+            s = s[len(prefix):]
+            break
+    if "(" in s:
+        ais = _parse_bracketed(s)
+        if ais and "01" in ais:
+            return "GS1", ais
+    s = s.replace("(", "").replace(")", "")
+    ais = _parse_flat(s)
+    if not ais or "01" not in ais:
+        # Tolerate junk before the GTIN (unknown prefixes, stray characters)
+        match = re.search(r"01\d{14}", s)
+        ais = _parse_flat(s, match.start()) if match else None
+    if not ais or "01" not in ais:
+        return None
+    return "GS1_flat", ais
+
+
+@lru_cache(maxsize=1024)
+def format_gs1_date(value):
+    """``YYMMDD`` as ``DD.MM.YYYY``; day ``00`` means the last day of the month."""
+    if len(value) != 6 or not value.isdigit():
+        return ""
+    year, month, day = 2000 + int(value[:2]), int(value[2:4]), int(value[4:6])
+    try:
+        if day == 0:
+            day = monthrange(year, month)[1]
+        datetime.date(year, month, day)
+    except ValueError:
+        return ""
+    return f"{day:02d}.{month:02d}.{year}"
+
+
+def parse_gs1_uncached(raw):
+    """``parse_gs1`` without the cache (benchmarks, one-off parses)."""
+    parsed = parse_element_string(raw)
+    if parsed is None:
+        return None
+    fmt, ais = parsed
+    return {
+        "product_code": ais["01"],
+        "lot_number": ais.get("10", ""),
+        "expiry_date": format_gs1_date(ais.get("17", "")),
+        "format": fmt,
+        "ais": ais,
+    }
+
+
+_parse_gs1_cached = lru_cache(maxsize=PARSE_CACHE_SIZE)(parse_gs1_uncached)
+
+
+def parse_gs1(raw):
+    """The ``parse_barcode_data`` result for a GS1 scan, or ``None``; repeated scans are cache hits.
+
+    Returns a fresh dict each time, so callers may add keys to it.
+    """
+    result = _parse_gs1_cached(raw)
+    if result is None:
+        return None
+    return {**result, "ais": dict(result["ais"])}
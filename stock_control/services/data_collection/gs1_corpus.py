@@ -0,0 +1,26 @@
+"""Scans with known parses, checked by the test suite and timed by ``manage.py benchmark_barcode_parser``."""
+from .gs1 import GS
+
+# (raw scan, expected (product_code, lot_number, expiry_date) or None)
+BARCODE_CORPUS = [
+    ("(01)04012345678901(17)261231(10)LOT123", ("04012345678901", "LOT123", "31.12.2026")),
+    ("(01)04012345678901(10)ABC" + GS + "(17)261231", ("04012345678901", "ABC", "31.12.2026")),
+    ("(01)04012345678901(17)270200(10)X1", ("04012345678901", "X1", "28.02.2027")),
+    ("010401234567890117261231" + "10LOT123", ("04012345678901", "LOT123", "31.12.2026")),
+    ("0104012345678901" + "10LOT123" + GS + "17261231", ("04012345678901", "LOT123", "31.12.2026")),
+    ("010401234567890110LOT12317261231", ("04012345678901", "LOT123", "31.12.2026")),
+    ("0104012345678901" + "10AB-12" + GS + "17270115", ("04012345678901", "AB-12", "15.01.2027")),
+    ("0104012345678901" + "17270115" + "10L01" + GS + "21SN0001", ("04012345678901", "L01", "15.01.2027")),
+    ("0104012345678901" + "10A17B" + GS + "17261231", ("04012345678901", "A17B", "31.12.2026")),
+    ("0104012345678901" + "101712345" + GS + "17261231", ("04012345678901", "1712345", "31.12.2026")),
+    ("0104012345678901" + "3103000250" + "17261231" + "10LOT9", ("04012345678901", "LOT9", "31.12.2026")),
+    ("]d2" + "010401234567890117261231" + "10ABC", ("04012345678901", "ABC", "31.12.2026")),
+    (GS + "0104012345678901" + "11250101" + "17280630" + "10B7" + GS + "21X99", ("04012345678901", "B7", "30.06.2028")),
+    ("01 04012345678901 17 261231 10 LOT7", ("04012345678901", "LOT7", "31.12.2026")),
+    ("0104012345678901", ("04012345678901", "", "")),
+    ("3PR1234**LOT5**31.12.2026", ("3PR1234", "LOT5", "31.12.2026")),
+    ("(01)", None),
+    ("(01)ABC", None),
+    ("4012345678901", None),
+    ("hello", None),
+]
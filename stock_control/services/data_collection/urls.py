@@ -4,11 +4,13 @@ from services.data_collection.data_collection import (
     get_product_by_barcode,
     get_product_by_id,
     search_products,
+    resolve_scan,
 )
 
 urlpatterns = [
     path('get-product-by-barcode/', get_product_by_barcode, name='get_product_by_barcode'),
     path('get-product-by-id/', get_product_by_id, name='get_product_by_id'),
     path("parse-barcode/", parse_barcode, name="parse_barcode"),
+    path("resolve-scan/", resolve_scan, name="resolve_scan"),
     path('search-products/', search_products, name='search_products'),
 ]
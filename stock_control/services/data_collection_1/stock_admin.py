@@ -2,11 +2,15 @@ from decimal import Decimal
 
 from django.shortcuts import render, get_object_or_404
 from django.utils.timezone import now
-from django.db.models import F
+from django.db import transaction
+from django.db.models import F, Exists, OuterRef, Q
 import datetime
 from django.utils import timezone
 from services.data_collection.data_collection import parse_barcode_data
-from services.data_storage.models import Product, ProductItem, Withdrawal
+from services.data_storage.code_index import product_code_index
+from services.data_storage.models import Product, ProductItem, Withdrawal, StockMovement
+from services.data_storage.ledger import record_movement
+from services.data_storage.low_stock import low_stock_products
 from inventory.forms import ProductForm, ProductItemForm
 from django.shortcuts import redirect
 
@@ -24,24 +28,33 @@ def stock_admin(request, product_id=None):
             parsed_expiry = barcode_data.get("expiry_date")
 
             if barcode_parsed_code:
-                editing_product = Product.objects.filter(product_code=barcode_parsed_code.lstrip("0")).first()
+                product_id_for_code = product_code_index.product_id(barcode_parsed_code)
+                if product_id_for_code:
+                    editing_product = Product.objects.filter(pk=product_id_for_code).first()
                 if editing_product:
                     product_id = editing_product.id
                     if parsed_lot:
                         editing_lot_item = ProductItem.objects.filter(product=editing_product, lot_number=parsed_lot).first()
 
-    products = Product.objects.all().prefetch_related('items').order_by('name')
+    products = Product.objects.all().order_by('name')
     product = get_object_or_404(Product, pk=product_id) if product_id else None
 
     if request.method == "POST":
+        previous_stock = editing_lot_item.current_stock if editing_lot_item else Decimal('0')
         product_form = ProductForm(request.POST, instance=product)
         product_item_form = ProductItemForm(request.POST, instance=editing_lot_item)
 
         if product_form.is_valid() and product_item_form.is_valid():
-            saved_product = product_form.save()
-            product_item = product_item_form.save(commit=False)
-            product_item.product = saved_product
-            product_item.save()
+            with transaction.atomic():
+                saved_product = product_form.save()
+                product_item = product_item_form.save(commit=False)
+                product_item.product = saved_product
+                product_item.save()
+                delta = (product_item.current_stock or Decimal('0')) - previous_stock
+                if editing_lot_item is None:
+                    record_movement(product_item, delta, StockMovement.SOURCE_LOT_CREATED, user=request.user)
+                elif delta:
+                    record_movement(product_item, delta, StockMovement.SOURCE_ADJUSTMENT, user=request.user)
             return redirect('data_collection_1:stock_admin')
 
 
@@ -58,35 +71,25 @@ def stock_admin(request, product_id=None):
                 pass
 
     today = timezone.localdate() if hasattr(timezone, 'localdate') else timezone.now().date()
-    attention_lots = []
-    low_stock_products = []
-
-    for product_entry in products:
-        items = list(product_entry.items.all())
-        total_stock = Decimal('0')
-        for item in items:
-            if item.current_stock is not None:
-                total_stock += item.current_stock
-        try:
-            threshold_value = Decimal(product_entry.threshold)
-        except Exception:
-            threshold_value = Decimal('0')
-
-        is_low_stock = total_stock < threshold_value if threshold_value else False
-        if is_low_stock:
-            low_stock_products.append(product_entry)
-
-        for item in items:
-            expiry_date = item.expiry_date
-            is_expired = bool(expiry_date and expiry_date <= today)
-            if not is_expired and not is_low_stock:
-                continue
-            attention_lots.append({
-                'product': product_entry,
-                'item': item,
-                'is_expired': is_expired,
-                'is_low_stock': is_low_stock,
-            })
+    low_stock_products_qs = low_stock_products(include_pending=True).filter(threshold__gt=0)
+    low_stock_ids = low_stock_products_qs.values('pk')
+
+    attention_items = (
+        ProductItem.objects
+        .filter(Q(expiry_date__lte=today) | Q(product__in=low_stock_ids))
+        .annotate(is_low_stock=Exists(low_stock_ids.filter(pk=OuterRef('product_id'))))
+        .select_related('product', 'location')
+        .order_by('product__name', 'lot_number')
+    )
+    attention_lots = [
+        {
+            'product': item.product,
+            'item': item,
+            'is_expired': bool(item.expiry_date and item.expiry_date <= today),
+            'is_low_stock': item.is_low_stock,
+        }
+        for item in attention_items
+    ]
 
     attention_lots.sort(
         key=lambda entry: (
@@ -101,7 +104,7 @@ def stock_admin(request, product_id=None):
         'product_form': product_form,
         'product_item_form': product_item_form,
         'editing_product': editing_product,
-        'low_stock': low_stock_products,
+        'low_stock': low_stock_products_qs,
         'attention_lots': attention_lots,
         'now': now(),
     }
@@ -112,18 +115,26 @@ def stock_admin(request, product_id=None):
 def delete_lot(request, item_id):
     item = get_object_or_404(ProductItem, id=item_id)
     if request.method == "POST":
-        Withdrawal.objects.create(
-            product_item=item,
-            quantity=item.current_stock,
-            withdrawal_type='lot_discard',
-            timestamp=timezone.now(),
-            user=request.user,
-            barcode=None,
-            parts_withdrawn=0,
-            product_code=item.product.product_code,
-            product_name=item.product.name,
-            lot_number=item.lot_number,
-            expiry_date=item.expiry_date,
-        )
-        item.delete()
+        with transaction.atomic():
+            discard = Withdrawal.objects.create(
+                product_item=item,
+                quantity=item.current_stock,
+                withdrawal_type='lot_discard',
+                timestamp=timezone.now(),
+                user=request.user,
+                barcode=None,
+                parts_withdrawn=0,
+                product_code=item.product.product_code,
+                product_name=item.product.name,
+                lot_number=item.lot_number,
+                expiry_date=item.expiry_date,
+            )
+            record_movement(
+                item,
+                -item.current_stock,
+                StockMovement.SOURCE_LOT_DISCARD,
+                user=request.user,
+                reference=f"Withdrawal:{discard.pk}",
+            )
+            item.delete()
         return redirect('data_collection_1:stock_admin')
@@ -0,0 +1,259 @@
+"""Batch scan withdrawals: a tray of scans in one request and one transaction.
+
+Lots are matched exactly as ``create_withdrawal`` matches a single scan, but
+products resolve through the code index and the lots for the whole batch are
+loaded in one query (locked, see ``stock_updates.lock_lots``), the stock
+changes are written with one ``bulk_update`` and the Withdrawal rows with one
+``bulk_create``. ``Withdrawal.save`` and ``ProductItem.save`` are bypassed, so
+the ledger, daily rollups and stock summaries are updated here explicitly.
+"""
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from inventory.access_control import group_required
+from services.data_storage.bulk import bulk_create_with_pks
+from services.data_storage.code_index import product_code_index
+from services.data_storage.ledger import record_movements
+from services.data_storage.models import (
+    DailyConsumption,
+    ProductItem,
+    ProductStockSummary,
+    StockMovement,
+    Withdrawal,
+)
+from services.data_storage.stock_updates import lock_lots, retry_on_lock_conflict
+
+from .create_withdrawal import parse_expiry_date
+
+MAX_BATCH_LINES = 200
+WITHDRAWAL_MODES = ('full', 'part')
+# Withdrawal.quantity is a DecimalField(max_digits=12, decimal_places=2)
+MAX_QUANTITY = Decimal('1e10')
+
+
+class LineError(ValueError):
+    """A scan line that cannot be applied; reported back for that line only."""
+
+
+def _parse_quantity(raw):
+    try:
+        quantity = Decimal(str(raw))
+    except (InvalidOperation, ValueError):
+        raise LineError("quantity must be a number")
+    if (not quantity.is_finite() or quantity <= 0 or quantity >= MAX_QUANTITY
+            or quantity != quantity.quantize(Decimal('0.01'))):
+        raise LineError("quantity must be a positive number with at most two decimal places")
+    return quantity
+
+
+def _parse_line(raw, default_location_id=None):
+    if not isinstance(raw, dict):
+        raise LineError("Each scan must be an object")
+
+    product_id = raw.get('product_id')
+    barcode = str(raw.get('barcode') or '').strip()
+    if product_id not in (None, ''):
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise LineError("product_id must be an integer")
+    else:
+        product_id = None
+        if not barcode:
+            raise LineError("barcode or product_id is required")
+
+    location_id = raw.get('location_id', default_location_id)
+    if location_id in (None, ''):
+        location_id = None
+    else:
+        try:
+            location_id = int(location_id)
+        except (TypeError, ValueError):
+            raise LineError("location_id must be an integer")
+
+    mode = raw.get('mode') or 'full'
+    if mode not in WITHDRAWAL_MODES:
+        raise LineError(f"mode must be one of: {', '.join(WITHDRAWAL_MODES)}")
+
+    # Only full withdrawals and volume lots use the quantity; volume lots check it in _apply
+    quantity = raw.get('quantity', 1)
+    if mode == 'full':
+        quantity = _parse_quantity(quantity)
+    try:
+        parts = int(raw.get('parts_withdrawn') or 0)
+    except (TypeError, ValueError):
+        raise LineError("parts_withdrawn must be an integer")
+    if mode == 'part' and parts <= 0:
+        raise LineError("parts_withdrawn must be positive for a part withdrawal")
+
+    return {
+        'barcode': barcode,
+        'product_id': product_id,
+        'lot_number': str(raw.get('lot_number') or '').strip(),
+        'expiry_date': parse_expiry_date(raw.get('expiry_date')),
+        'location_id': location_id,
+        'mode': mode,
+        'quantity': quantity,
+        'parts': parts,
+    }
+
+
+def _match_lot(line, lots_by_product):
+    """Pick the lot ``create_withdrawal`` would pick for this scan."""
+    if line['product_id'] is not None:
+        candidates = lots_by_product.get(line['product_id'], [])
+        if line['location_id'] is not None:
+            candidates = [item for item in candidates if item.location_id == line['location_id']]
+        # The dropdown path takes the lot with the latest expiry
+        return max(candidates, key=lambda item: item.expiry_date, default=None)
+
+    lot_number = line['lot_number'].lower()
+    for item in lots_by_product.get(line.get('resolved_product_id'), []):
+        if lot_number and item.lot_number.lower() != lot_number:
+            continue
+        if line['expiry_date'] and item.expiry_date != line['expiry_date']:
+            continue
+        if line['location_id'] is not None and item.location_id != line['location_id']:
+            continue
+        return item
+    return None
+
+
+def _apply(item, line):
+    """Apply one scan to the in-memory lot; returns ``(quantity, parts, withdrawal_type)``."""
+    if item.product_feature == 'volume':
+        quantity = _parse_quantity(line['quantity'])
+        item.current_stock -= quantity
+        return quantity, 0, 'volume'
+    if line['mode'] == 'part':
+        total_units = item.accumulated_partial + line['parts']
+        full_items, item.accumulated_partial = divmod(total_units, item.units_per_quantity or 1)
+        item.current_stock -= full_items
+        return Decimal(full_items), line['parts'], 'part'
+    item.current_stock -= line['quantity']
+    return line['quantity'], 0, 'unit'
+
+
+def withdraw_batch(scans, user, default_location_id=None):
+    """Apply a list of scans in one transaction and return one result dict per scan.
+
+    Scans that cannot be matched or are invalid are reported and skipped; the
+    rest are committed together.
+    """
+    results = [None] * len(scans)
+    lines = {}
+    for index, raw in enumerate(scans):
+        try:
+            lines[index] = _parse_line(raw, default_location_id)
+        except LineError as exc:
+            results[index] = {"line": index, "ok": False, "error": str(exc)}
+
+    user = user if getattr(user, 'is_authenticated', False) else None
+    for line in lines.values():
+        if line['product_id'] is None:
+            line['resolved_product_id'] = product_code_index.product_id(line['barcode'])
+    product_ids = {line['product_id'] for line in lines.values() if line['product_id'] is not None}
+    product_ids.update(line['resolved_product_id'] for line in lines.values() if line.get('resolved_product_id'))
+
+    def apply():
+        errors, applied, touched, withdrawals = {}, [], {}, []
+        with transaction.atomic():
+            lots_by_product = {}
+            for item in lock_lots(ProductItem.objects.select_related('product', 'location')
+                                  .filter(product_id__in=product_ids)
+                                  .order_by('pk')):
+                lots_by_product.setdefault(item.product_id, []).append(item)
+
+            for index, line in lines.items():
+                item = _match_lot(line, lots_by_product)
+                if item is None:
+                    errors[index] = "Product item not found. Check barcode, lot number, or expiry date."
+                    continue
+                try:
+                    quantity, parts, withdrawal_type = _apply(item, line)
+                except LineError as exc:
+                    errors[index] = str(exc)
+                    continue
+                touched[item.pk] = item
+                withdrawals.append(Withdrawal(
+                    product_item=item,
+                    quantity=quantity,
+                    withdrawal_type=withdrawal_type,
+                    user=user,
+                    barcode=line['barcode'] or None,
+                    # A scan's location_id only ever matches lots at that location
+                    location=item.location,
+                    parts_withdrawn=parts,
+                    product_code=item.product.product_code,
+                    product_name=item.product.name,
+                    lot_number=item.lot_number,
+                    expiry_date=item.expiry_date,
+                ))
+                applied.append((index, item.current_stock, item.accumulated_partial))
+
+            if withdrawals:
+                ProductItem.objects.bulk_update(list(touched.values()), ['current_stock', 'accumulated_partial'])
+                withdrawals = bulk_create_with_pks(Withdrawal, withdrawals)
+                record_movements([
+                    (w.product_item, -w.quantity, -(w.parts_withdrawn or 0), w.location,
+                     f"Withdrawal:{w.pk}" if w.pk else "Withdrawal")
+                    for w in withdrawals
+                ], StockMovement.SOURCE_WITHDRAWAL, user=user)
+                DailyConsumption.record_withdrawals(withdrawals)
+                ProductStockSummary.refresh_for_products(item.product_id for item in touched.values())
+        return errors, applied, withdrawals
+
+    # The lots are locked before they are read, so the arithmetic above never
+    # works from a stale accumulated_partial; lock conflicts rerun the batch.
+    errors, applied, withdrawals = retry_on_lock_conflict(apply)
+    for index, error in errors.items():
+        results[index] = {"line": index, "ok": False, "error": error}
+    for (index, stock_after, partial_after), withdrawal in zip(applied, withdrawals):
+        results[index] = {
+            "line": index,
+            "ok": True,
+            "withdrawal_id": withdrawal.pk,
+            "product_code": withdrawal.product_code,
+            "product_name": withdrawal.product_name,
+            "lot_number": withdrawal.lot_number,
+            "withdrawal_type": withdrawal.withdrawal_type,
+            "quantity": str(withdrawal.quantity),
+            "parts_withdrawn": withdrawal.parts_withdrawn,
+            "current_stock": str(stock_after),
+            "accumulated_partial": partial_after,
+        }
+    return results
+
+
+@login_required
+@group_required(["Admin", "Staff", "User"])
+@require_POST
+def batch_withdrawal(request):
+    """``POST data2/withdrawals/batch/`` with ``{"location_id": ..., "scans": [...]}``.
+
+    Each scan has ``barcode`` (plus optional ``lot_number``/``expiry_date``) or
+    ``product_id``, and ``mode`` ``full`` (``quantity``) or ``part``
+    (``parts_withdrawn``); volume lots always withdraw ``quantity``.
+    """
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Request body must be JSON"}, status=400)
+    scans = payload.get("scans") if isinstance(payload, dict) else None
+    if not isinstance(scans, list) or not scans:
+        return JsonResponse({"error": "scans must be a non-empty list"}, status=400)
+    if len(scans) > MAX_BATCH_LINES:
+        return JsonResponse({"error": f"At most {MAX_BATCH_LINES} scans per batch"}, status=400)
+
+    results = withdraw_batch(scans, request.user, default_location_id=payload.get("location_id"))
+    withdrawn = sum(1 for result in results if result["ok"])
+    return JsonResponse({
+        "results": results,
+        "withdrawn": withdrawn,
+        "failed": len(results) - withdrawn,
+    })
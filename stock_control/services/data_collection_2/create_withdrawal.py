@@ -1,126 +1,162 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
-from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import require_POST
 import datetime
 
-from services.data_storage.models import Product, ProductItem, Withdrawal
+from services.data_storage.code_index import product_code_index
+from services.data_storage.models import Product, ProductItem
 from services.data_storage.models import Location
+from services.data_storage.stock_updates import withdraw_from_lot
+from inventory.access_control import group_required
 from inventory.forms import WithdrawalForm
 
+ITEM_NOT_FOUND = "Product item not found. Check barcode, lot number, or expiry date."
+
+
+def parse_expiry_date(value):
+    """Accept ``DD.MM.YYYY`` (as scanned) or ``YYYY-MM-DD``; anything else is ``None``."""
+    if not value:
+        return None
+    if not isinstance(value, str):
+        return value
+    try:
+        if '.' in value:
+            return datetime.datetime.strptime(value, "%d.%m.%Y").date()
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _posted_id(post, name):
+    """``post[name]`` as an integer, ``None`` if blank; raises ``ValueError`` for anything else."""
+    value = (post.get(name) or "").strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+def _find_item(post, barcode, location_id=None):
+    """Pick the lot a posted withdrawal applies to, or ``None``."""
+    product_dropdown = _posted_id(post, "product_dropdown")
+    lot_number = post.get("lot_number")
+    # ✅ Normalize expiry string to a date object
+    expiry_date = parse_expiry_date(post.get("expiry_date"))
+
+    if product_dropdown is not None:
+        product = Product.objects.filter(id=product_dropdown).first()
+        item_qs = ProductItem.objects.filter(product=product)
+        if location_id is not None:
+            item_qs = item_qs.filter(location_id=location_id)
+        return item_qs.order_by('-expiry_date').first()
+
+    # Start with matching product
+    product_id = product_code_index.product_id(barcode)
+    if not product_id:
+        return None
+
+    item_qs = ProductItem.objects.filter(product_id=product_id)
+    if lot_number:
+        item_qs = item_qs.filter(lot_number__iexact=lot_number.strip())
+    if expiry_date:
+        item_qs = item_qs.filter(expiry_date=expiry_date)
+    if location_id is not None:
+        item_qs = item_qs.filter(location_id=location_id)
+    return item_qs.first()
+
+
+def _withdraw(request, form):
+    """Apply a valid WithdrawalForm; returns the saved Withdrawal, or ``None`` if no lot matched.
+
+    Raises ``ValueError`` if a posted product or location id is not an integer.
+    """
+    withdrawal = form.save(commit=False)
+    location_id = _posted_id(request.POST, "location_id")
+
+    # ✅ Parse relevant fields
+    barcode = (
+        request.POST.get("product_code_from_barcode") or
+        form.cleaned_data.get("barcode") or
+        request.POST.get("barcode_manual")
+    )
+    item = _find_item(request.POST, barcode, location_id)
+    if not item:
+        return None
+
+    # Persist chosen location on the withdrawal
+    withdrawal_location_id = location_id if location_id is not None else item.location_id
+
+    # ✅ Stock arithmetic runs against the locked lot, not this stale read
+    return withdraw_from_lot(
+        item.pk,
+        mode=request.POST.get("withdrawal_mode", "full"),
+        quantity=form.cleaned_data.get("quantity") or 0,
+        # The form has checked it is a whole number >= 0 ("3.0" included)
+        parts=form.cleaned_data.get("parts_withdrawn") or 0,
+        user=request.user,
+        withdrawal_type=withdrawal.withdrawal_type,
+        barcode=barcode,
+        location_id=withdrawal_location_id,
+    )
+
+
+@login_required
+@group_required(["Admin", "Staff", "User"])
+@require_POST
+def create_withdrawal_scan(request):
+    """``POST data2/create_withdrawal/scan/``: the withdrawal form's fields in, JSON out.
+
+    Answers with the Withdrawal and the lot's new state in one response, so the
+    scanner page can stay put instead of redirecting and re-rendering.
+    """
+    form = WithdrawalForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({"error": "Invalid withdrawal", "errors": form.errors}, status=400)
+    try:
+        withdrawal = _withdraw(request, form)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    if withdrawal is None:
+        return JsonResponse({"error": ITEM_NOT_FOUND}, status=404)
+
+    item = withdrawal.product_item
+    return JsonResponse({
+        "withdrawal": {
+            "id": withdrawal.pk,
+            "timestamp": timezone.localtime(withdrawal.timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+            "barcode": withdrawal.barcode,
+            "withdrawal_type": withdrawal.withdrawal_type,
+            "quantity": str(withdrawal.quantity),
+            "parts_withdrawn": withdrawal.parts_withdrawn,
+            "location_name": getattr(withdrawal.location, "name", ""),
+        },
+        "lot": {
+            "id": item.pk,
+            "product_code": item.product.product_code,
+            "product_name": item.product.name,
+            "lot_number": item.lot_number,
+            "expiry_date": item.expiry_date.isoformat() if item.expiry_date else "",
+            "current_stock": str(item.current_stock),
+            "accumulated_partial": item.accumulated_partial,
+            "units_per_quantity": item.units_per_quantity,
+        },
+    })
+
 
 def create_withdrawal(request):
     if request.method == 'POST':
         form = WithdrawalForm(request.POST)
         if form.is_valid():
-            withdrawal = form.save(commit=False)
-            withdrawal.user = request.user
-
-            # ✅ Parse relevant fields
-            barcode = (
-                request.POST.get("product_code_from_barcode") or
-                form.cleaned_data.get("barcode") or
-                request.POST.get("barcode_manual")
-            )
-            product_dropdown = request.POST.get("product_dropdown")
-            location_id = request.POST.get("location_id")
-            lot_number = request.POST.get("lot_number")
-            expiry_date_raw = request.POST.get("expiry_date")
-            expiry_date = None
-            # ✅ Normalize expiry string to a date object
-            if expiry_date_raw:
-                if isinstance(expiry_date_raw, str):
-                    try:
-                        if '.' in expiry_date_raw:
-                            expiry_date = datetime.datetime.strptime(expiry_date_raw, "%d.%m.%Y").date()
-                        else:
-                            expiry_date = datetime.datetime.strptime(expiry_date_raw, "%Y-%m-%d").date()
-                    except ValueError:
-                        expiry_date = None
-                else:
-                    expiry_date = expiry_date_raw
-
-            print("🔍 DEBUG Withdrawal:")
-            print("Product code:", barcode)
-            print("Lot:", lot_number)
-            print("Expiry:", expiry_date)
-            print("Dropdown:", product_dropdown)
-
-            # ✅ Lookup product item
-            item = None
-            if product_dropdown:
-                product = Product.objects.filter(id=product_dropdown).first()
-                item_qs = ProductItem.objects.filter(product=product)
-                if location_id:
-                    item_qs = item_qs.filter(location_id=location_id)
-                item = item_qs.order_by('-expiry_date').first()
-            else:
-                # Validate lot_number and expiry_date before querying
-                # Normalize barcode
-                normalized_code = barcode.lstrip("0") if barcode else ""
-
-                # Start with matching product
-                product = Product.objects.filter(product_code__iexact=normalized_code).first()
-
-                if product:
-                    item_qs = ProductItem.objects.filter(product=product)
-
-                    if lot_number:
-                        item_qs = item_qs.filter(lot_number__iexact=lot_number.strip())
-
-                    if expiry_date:
-                        item_qs = item_qs.filter(expiry_date=expiry_date)
-
-                    if location_id:
-                        item_qs = item_qs.filter(location_id=location_id)
-                    item = item_qs.first()
-
-
-            if item:
-                withdrawal.product_item = item
-                withdrawal.barcode = barcode
-                # Persist chosen location on the withdrawal
-                if location_id:
-                    try:
-                        withdrawal.location_id = int(location_id)
-                    except (TypeError, ValueError):
-                        withdrawal.location = getattr(item, 'location', None)
-                else:
-                    withdrawal.location = getattr(item, 'location', None)
-
-                if item.product_feature == 'volume':
-                    volume_qty = form.cleaned_data.get('quantity', 0)
-                    withdrawal.quantity = volume_qty
-                    item.current_stock = F('current_stock') - volume_qty
-
-                else:
-                    withdrawal_mode = request.POST.get("withdrawal_mode", "full")
-
-                    if withdrawal_mode == "part":
-                        parts_withdrawn = int(request.POST.get("parts_withdrawn") or 0)
-                        units_per_item = item.units_per_quantity
-                        current_partial = item.accumulated_partial
-                        total_units = current_partial + parts_withdrawn
-
-                        full_items = total_units // units_per_item
-                        remaining_partial = total_units % units_per_item
-
-                        if full_items > 0:
-                            item.current_stock = F('current_stock') - full_items
-                        item.accumulated_partial = remaining_partial
-
-                        withdrawal.quantity = full_items
-                        withdrawal.parts_withdrawn = parts_withdrawn
-
-                    else:
-                        full_items = form.cleaned_data.get("quantity", 0)
-                        withdrawal.quantity = full_items
-                        item.current_stock = F('current_stock') - full_items
-
-                item.save()
-                item.refresh_from_db()
-                withdrawal.save()
-                return redirect('inventory:dashboard')
-            else:
-                form.add_error(None, "Product item not found. Check barcode, lot number, or expiry date.")
+            try:
+                if _withdraw(request, form):
+                    return redirect('inventory:dashboard')
+                form.add_error(None, ITEM_NOT_FOUND)
+            except ValueError as exc:
+                form.add_error(None, str(exc))
         else:
             print("❌ Form Errors:", form.errors)
 
@@ -1,8 +1,11 @@
 from django.urls import path
-from .create_withdrawal import create_withdrawal
+from .create_withdrawal import create_withdrawal, create_withdrawal_scan
+from .batch_withdrawal import batch_withdrawal
 
 app_name = 'data_collection_2'
 
 urlpatterns = [
     path('create_withdrawal/', create_withdrawal, name='create_withdrawal'),
+    path('create_withdrawal/scan/', create_withdrawal_scan, name='create_withdrawal_scan'),
+    path('withdrawals/batch/', batch_withdrawal, name='batch_withdrawal'),
 ]
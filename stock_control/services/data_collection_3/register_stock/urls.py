@@ -1,8 +1,9 @@
 from django.urls import path
 
-from .views import register_stock
+from .views import register_stock, register_stock_scan
 
 register_stock_urlpatterns = [
     path("register-stock/", register_stock, name="register-stock"),
+    path("register-stock/scan/", register_stock_scan, name="register-stock-scan"),
 ]
 
@@ -1,28 +1,28 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime, date
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from typing import Any, Dict, Optional
 
 from django.contrib.auth.decorators import login_required
-from django.db.models import F
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 
 from services.data_collection.data_collection import parse_barcode_data
-from services.data_storage.models import Product, ProductItem, StockRegistrationLog, Location
+from services.data_storage.code_index import product_code_index
+from services.data_storage.models import Product, ProductItem, Location
+from services.data_storage.stock_updates import register_to_lot, register_to_lots
 
 SESSION_HISTORY_KEY = "register_stock_history"
 SESSION_FEEDBACK_KEY = "register_stock_feedback"
 SESSION_FORM_STATE_KEY = "register_stock_form_state"
 HISTORY_LIMIT = 10
-
-
-def _normalize_product_code(raw: str) -> str:
-    code = (raw or "").strip()
-    if not code:
-        return ""
-    return code.lstrip("0") or "0" if code.isdigit() else code
+MAX_BATCH_SCANS = 500
+# StockRegistrationLog.quantity is a DecimalField(max_digits=12, decimal_places=2)
+MAX_QUANTITY = Decimal("1e10")
 
 
 def _parse_expiry_date(raw: Optional[str]) -> Optional[date]:
@@ -81,6 +81,7 @@ def _prepare_history_entry(item: ProductItem, barcode: str, delivery_dt: Optiona
     scan_time = timezone.localtime()
     product = item.product
     return {
+        "item_id": item.pk,
         "timestamp": scan_time.strftime("%Y-%m-%d %H:%M:%S"),
         "barcode": barcode,
         "product_code": product.product_code,
@@ -109,106 +110,208 @@ def _append_history(request, entry: Dict[str, Any]) -> None:
     request.session.modified = True
 
 
-@login_required
-def register_stock(request):
-    if request.method == "POST":
-        barcode = (request.POST.get("barcode") or "").strip()
-        use_now_selected = bool(request.POST.get("use_now"))
-        delivery_raw = request.POST.get("delivery_datetime") or ""
-        delivery_dt = timezone.localtime() if use_now_selected else _parse_delivery_datetime(delivery_raw)
-
-        location_id = (request.POST.get("location_id") or "").strip()
-        selected_location = None
-        if location_id:
-            try:
-                selected_location = Location.objects.get(pk=int(location_id))
-            except (Location.DoesNotExist, TypeError, ValueError):
-                selected_location = None
-                location_id = ""
+def _parse_quantity(raw) -> Optional[Decimal]:
+    try:
+        quantity = Decimal(str(raw).strip() or "1")
+    except (InvalidOperation, ValueError):
+        return None
+    # Checked before quantize, which raises InvalidOperation past the context precision
+    if not quantity.is_finite() or quantity <= 0 or quantity >= MAX_QUANTITY:
+        return None
+    if quantity != quantity.quantize(Decimal("0.01")):
+        return None
+    return quantity
 
-        _store_form_state(request, use_now_selected, delivery_dt, delivery_raw, location_id)
 
-        if not barcode:
-            _record_feedback(request, "error", "Please scan a barcode before submitting.")
-            return redirect("data_collection_3:register-stock")
-
-        if not use_now_selected and delivery_dt is None:
-            _record_feedback(request, "error", "Enter a valid delivery date or select \"Use current date & time\".")
-            return redirect("data_collection_3:register-stock")
-
-        if delivery_dt is None:
-            delivery_dt = timezone.localtime()
-
-        parsed = parse_barcode_data(barcode)
-        product = None
-        lot_number = None
-        expiry_date = None
-
-        if parsed:
-            product_code = parsed.get("product_code") or ""
-            lot_number = parsed.get("lot_number") or None
-            expiry_date = _parse_expiry_date(parsed.get("expiry_date"))
-
-            normalized = _normalize_product_code(product_code)
-            if normalized:
-                product = Product.objects.filter(product_code__iexact=normalized).first()
-            if not product and product_code:
-                product = Product.objects.filter(product_code__iexact=product_code).first()
-        else:
-            normalized = _normalize_product_code(barcode)
-            if normalized:
-                product = Product.objects.filter(product_code__iexact=normalized).first()
-            if not product:
-                product = Product.objects.filter(product_code__iexact=barcode).first()
-
-        if not product:
-            _record_feedback(request, "error", "No product found for the scanned barcode.")
-            return redirect("data_collection_3:register-stock")
-
-        item_qs = ProductItem.objects.filter(product=product)
-        if selected_location:
-            item_qs = item_qs.filter(location=selected_location)
-        if lot_number:
-            item_qs = item_qs.filter(lot_number__iexact=lot_number)
-        if expiry_date:
-            item_qs = item_qs.filter(expiry_date=expiry_date)
-
-        item = item_qs.order_by("expiry_date").first()
-        if not item:
-            item = product.items.order_by("expiry_date").first()
-            if item and not selected_location:
-                selected_location = getattr(item, 'location', None)
-        elif not selected_location:
+def _parse_batch(raw: str):
+    """``[{"barcode": ..., "quantity": ...}, ...]`` from the batch field, or None if malformed."""
+    try:
+        scans = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(scans, list) or not scans or len(scans) > MAX_BATCH_SCANS:
+        return None
+    parsed = []
+    for scan in scans:
+        if not isinstance(scan, dict):
+            return None
+        barcode = str(scan.get("barcode") or "").strip()
+        quantity = _parse_quantity(scan.get("quantity", 1))
+        if not barcode or quantity is None:
+            return None
+        parsed.append((barcode, quantity))
+    return parsed
+
+
+def _resolve_lot(barcode: str, selected_location=None):
+    """Find the lot a scan registers to; returns ``(item, location, error)``."""
+    parsed = parse_barcode_data(barcode)
+    lot_number = None
+    expiry_date = None
+    product_id = None
+
+    if parsed:
+        lot_number = parsed.get("lot_number") or None
+        expiry_date = _parse_expiry_date(parsed.get("expiry_date"))
+        product_id = product_code_index.product_id(parsed.get("product_code"))
+    if product_id is None:
+        product_id = product_code_index.product_id(barcode)
+    product = Product.objects.filter(pk=product_id).first() if product_id else None
+
+    if not product:
+        return None, selected_location, "No product found for the scanned barcode."
+
+    item_qs = ProductItem.objects.filter(product=product)
+    if selected_location:
+        item_qs = item_qs.filter(location=selected_location)
+    if lot_number:
+        item_qs = item_qs.filter(lot_number__iexact=lot_number)
+    if expiry_date:
+        item_qs = item_qs.filter(expiry_date=expiry_date)
+
+    item = item_qs.order_by("expiry_date").first()
+    if not item:
+        item = product.items.order_by("expiry_date").first()
+        if item and not selected_location:
             selected_location = getattr(item, 'location', None)
+    elif not selected_location:
+        selected_location = getattr(item, 'location', None)
 
-        if not item:
-            _record_feedback(request, "error", "The product has no lot available to update.")
-            return redirect("data_collection_3:register-stock")
+    if not item:
+        return None, selected_location, "The product has no lot available to update."
+    return item, selected_location or getattr(item, 'location', None), None
 
-        ProductItem.objects.filter(pk=item.pk).update(current_stock=F("current_stock") + Decimal("1"))
-        item.refresh_from_db(fields=["current_stock"])
 
-        log_location = selected_location or getattr(item, 'location', None)
-        StockRegistrationLog.objects.create(
-            product_item=item,
-            quantity=Decimal('1.00'),
-            user=request.user if request.user.is_authenticated else None,
+def _result(level: str, message: str, entries=None, status: int = 200) -> Dict[str, Any]:
+    return {"level": level, "message": message, "entries": entries or [], "status": status}
+
+
+def _register_batch(request, scans, selected_location, delivery_dt):
+    """Commit buffered scans: each distinct barcode is resolved once, quantities are summed per lot."""
+    per_barcode: Dict[str, Decimal] = {}
+    for barcode, quantity in scans:
+        per_barcode[barcode] = per_barcode.get(barcode, Decimal("0")) + quantity
+
+    quantities: Dict[int, Decimal] = {}
+    barcodes: Dict[int, str] = {}
+    unmatched = []
+    for barcode, quantity in per_barcode.items():
+        item, _, error = _resolve_lot(barcode, selected_location)
+        if error:
+            unmatched.append(barcode)
+            continue
+        quantities[item.pk] = quantities.get(item.pk, Decimal("0")) + quantity
+        barcodes.setdefault(item.pk, barcode)
+
+    # Without a chosen location each lot's log falls back to the lot's own location
+    logs = register_to_lots(
+        quantities,
+        user=request.user,
+        barcodes=barcodes,
+        delivery_datetime=delivery_dt,
+        location=selected_location,
+    )
+
+    entries = [_prepare_history_entry(log.product_item, log.barcode, delivery_dt, log.location) for log in logs]
+    units = sum((log.quantity for log in logs), Decimal("0"))
+    message = f"Registered {units.normalize():f} unit(s) across {len(logs)} lot(s)."
+    if unmatched:
+        message += f" Not registered, no matching lot: {', '.join(unmatched)}."
+    if not logs:
+        return _result("error", message, status=404)
+    return _result("success", message, entries)
+
+
+def _handle_scan(request) -> Dict[str, Any]:
+    """Apply a posted scan (or scan batch) and return its outcome.
+
+    History and form state are kept in the session either way, so the page
+    shows the same thing after a reload whichever endpoint took the scan.
+    """
+    barcode = (request.POST.get("barcode") or "").strip()
+    use_now_selected = bool(request.POST.get("use_now"))
+    delivery_raw = request.POST.get("delivery_datetime") or ""
+    delivery_dt = timezone.localtime() if use_now_selected else _parse_delivery_datetime(delivery_raw)
+
+    location_id = (request.POST.get("location_id") or "").strip()
+    selected_location = None
+    if location_id:
+        try:
+            selected_location = Location.objects.get(pk=int(location_id))
+        except (Location.DoesNotExist, TypeError, ValueError):
+            selected_location = None
+            location_id = ""
+
+    _store_form_state(request, use_now_selected, delivery_dt, delivery_raw, location_id)
+
+    batch_raw = (request.POST.get("batch_scans") or "").strip()
+    quantity = _parse_quantity(request.POST.get("quantity") or "1")
+    if batch_raw:
+        scans = _parse_batch(batch_raw)
+        if scans is None:
+            return _result(
+                "error",
+                f"The scan batch could not be read. Send 1 to {MAX_BATCH_SCANS} scans with positive quantities.",
+                status=400,
+            )
+    elif not barcode:
+        return _result("error", "Please scan a barcode before submitting.", status=400)
+    elif quantity is None:
+        return _result("error", "Quantity must be a positive number with at most two decimals.", status=400)
+
+    if not use_now_selected and delivery_dt is None:
+        return _result("error", "Enter a valid delivery date or select \"Use current date & time\".", status=400)
+
+    if delivery_dt is None:
+        delivery_dt = timezone.localtime()
+
+    if batch_raw:
+        result = _register_batch(request, scans, selected_location, delivery_dt)
+    else:
+        item, log_location, error = _resolve_lot(barcode, selected_location)
+        if error:
+            return _result("error", error, status=404)
+
+        registration = register_to_lot(
+            item.pk,
+            quantity,
+            user=request.user,
             barcode=barcode,
             delivery_datetime=delivery_dt,
             location=log_location,
         )
-
+        item = registration.product_item
         location_id = str(log_location.id) if log_location else ""
         _store_form_state(request, use_now_selected, delivery_dt, delivery_raw, location_id)
-
         entry = _prepare_history_entry(item, barcode, delivery_dt, log_location)
+        result = _result("success", f"Registered {quantity.normalize():f} unit(s) for {item.product.name}.", [entry])
+
+    for entry in result["entries"]:
         _append_history(request, entry)
-        _record_feedback(
-            request,
-            "success",
-            f"Registered 1 unit for {item.product.name}.",
-            details=entry,
-        )
+    return result
+
+
+@login_required
+@require_POST
+def register_stock_scan(request):
+    """``POST register-stock/scan/``: the form's fields in, ``{"ok", "message", "entries"}`` out.
+
+    Each entry is the lot's new state as shown in the history table, so the
+    scanner page updates in place instead of redirecting and re-rendering.
+    """
+    result = _handle_scan(request)
+    return JsonResponse(
+        {"ok": result["level"] == "success", "message": result["message"], "entries": result["entries"]},
+        status=result["status"],
+    )
+
+
+@login_required
+def register_stock(request):
+    if request.method == "POST":
+        result = _handle_scan(request)
+        details = result["entries"][0] if len(result["entries"]) == 1 else None
+        _record_feedback(request, result["level"], result["message"], details=details)
         return redirect("data_collection_3:register-stock")
 
     feedback = request.session.pop(SESSION_FEEDBACK_KEY, None)
@@ -235,6 +338,8 @@ def register_stock(request):
             "initial_use_now": initial_use_now,
             "locations": locations,
             "initial_location_id": initial_location_id,
+            "max_batch_scans": MAX_BATCH_SCANS,
+            "history_limit": HISTORY_LIMIT,
         },
     )
 
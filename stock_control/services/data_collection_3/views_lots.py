@@ -1,8 +1,10 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 from django.utils import timezone
+from django.db import transaction
 
-from services.data_storage.models import ProductItem
+from services.data_storage.models import ProductItem, StockMovement
+from services.data_storage.ledger import record_movement
 from services.data_storage.models import Location
 from services.data_storage.models_acceptance import LotAcceptanceTest
 from .lot_queries import lots_for_product, lot_rollup_for_product, _get_product_by_code
@@ -125,13 +127,15 @@ def create_lot_instance_form(request, code):
 
         # Proceed to create record
         product = _get_product_by_code(code)
-        ProductItem.objects.create(
-            product=product,
-            lot_number=lot_number,
-            expiry_date=expiry_date_val or _date.today(),
-            current_stock=stock_units_val,
-            location=Location.get_default(),
-        )
+        with transaction.atomic():
+            item = ProductItem.objects.create(
+                product=product,
+                lot_number=lot_number,
+                expiry_date=expiry_date_val or _date.today(),
+                current_stock=stock_units_val,
+                location=Location.get_default(),
+            )
+            record_movement(item, stock_units_val, StockMovement.SOURCE_LOT_CREATED, user=request.user)
         return redirect(reverse("data_collection_3:product-lots-instances", kwargs={"code": code}))
 
     return render(request, "inventory/create_lot_instance.html", {
@@ -5,6 +5,9 @@ class DataStorageConfig(AppConfig):
     name = 'services.data_storage'
     label = 'data_storage'
 
+    def ready(self):
+        from . import signals  # noqa: F401
+
     # def ready(self):
     #     # Ensure acceptance models are registered at startup (so makemigrations sees them)
     #     from . import models_acceptance
@@ -0,0 +1,22 @@
+"""``bulk_create`` that always leaves primary keys on the created objects."""
+from django.db import connections, router
+
+
+def bulk_create_with_pks(model, objs, batch_size=None):
+    """``model.objects.bulk_create(objs)``, filling in ``pk`` where the backend does not.
+
+    Django 3.2 cannot read ids back from a SQLite bulk insert. SQLite allows a
+    single writer, so inside the caller's transaction the newest ``len(objs)``
+    ids are the ones just inserted, in insertion order. Call this inside
+    ``transaction.atomic()``.
+    """
+    objs = list(objs)
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    if not objs or objs[0].pk is not None:
+        return objs
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor == 'sqlite':
+        pks = list(model.objects.order_by('-pk').values_list('pk', flat=True)[:len(objs)])
+        for obj, pk in zip(objs, reversed(pks)):
+            obj.pk = pk
+    return objs
@@ -0,0 +1,106 @@
+"""Per-process index from scanned codes to product ids.
+
+Product codes, the GTINs they are printed as (zero padded to 14 digits) and
+the barcodes, new codes and old codes of ``ProductCodeMapping`` all resolve
+through one dict, so a scan costs a dict lookup instead of a case-insensitive
+query per spelling. The index is built on first use with two queries.
+
+``post_save``/``post_delete`` on Product and ProductCodeMapping (see
+``signals.py``) drop this process's copy and bump a version stamp in the
+cache. That must be a cache every worker shares (settings use a file cache);
+other processes compare the stamp at most every ``VERSION_CHECK_SECONDS`` and
+rebuild when it moved. Writes that skip signals (``QuerySet.update``, raw
+imports) are picked up after ``MAX_AGE_SECONDS``.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+VERSION_CACHE_KEY = "data_storage:product-code-index:version"
+VERSION_CHECK_SECONDS = 1.0
+MAX_AGE_SECONDS = 300
+
+# How a code resolved, best first
+MATCH_PRODUCT_CODE = "product_code"
+MATCH_MAPPING_BARCODE = "mapping_barcode"
+MATCH_MAPPING_NEW_CODE = "mapping_new_code"
+MATCH_MAPPING_OLD_CODE = "mapping_old_code"
+
+
+def normalize_code(code):
+    """Case-folded code with leading zeros dropped from all-digit codes (GTIN-14 == stored code)."""
+    code = (code or "").strip().lower()
+    if code.isdigit():
+        return code.lstrip("0") or "0"
+    return code
+
+
+class ProductCodeIndex:
+    def __init__(self):
+        self._codes = None
+        self._version = None
+        self._built_at = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def resolve(self, code):
+        """``(product_id, matched_by)`` for a scanned or typed code, or ``(None, None)``."""
+        key = normalize_code(code)
+        if not key:
+            return None, None
+        return self._current().get(key, (None, None))
+
+    def product_id(self, code):
+        return self.resolve(code)[0]
+
+    def invalidate(self):
+        """Forget this process's index and tell the other processes to rebuild theirs."""
+        version = time.time_ns()
+        cache.set(VERSION_CACHE_KEY, version, None)
+        with self._lock:
+            self._codes = None
+
+    def _current(self):
+        now = time.monotonic()
+        codes = self._codes
+        if codes is not None and now - self._checked_at < VERSION_CHECK_SECONDS:
+            return codes
+        with self._lock:
+            version = cache.get(VERSION_CACHE_KEY)
+            if (self._codes is None or version != self._version
+                    or now - self._built_at >= MAX_AGE_SECONDS):
+                self._codes = self._build()
+                self._version = version
+                self._built_at = now
+            self._checked_at = now
+            return self._codes
+
+    @staticmethod
+    def _build():
+        from .models import Product, ProductCodeMapping
+
+        codes = {}
+        for pk, product_code in Product.objects.order_by("pk").values_list("pk", "product_code"):
+            codes.setdefault(normalize_code(product_code), (pk, MATCH_PRODUCT_CODE))
+        by_product_code = dict(codes)
+
+        mappings = list(ProductCodeMapping.objects
+                        .values_list("product_id", "barcode", "new_product_code", "old_product_code"))
+        # A mapped barcode beats a new code, which beats a retired one; newest mapping first within each
+        for position, matched_by in ((1, MATCH_MAPPING_BARCODE), (2, MATCH_MAPPING_NEW_CODE),
+                                     (3, MATCH_MAPPING_OLD_CODE)):
+            for mapping in mappings:
+                key = normalize_code(mapping[position])
+                if not key:
+                    continue
+                product_id = mapping[0]
+                if product_id is None:
+                    # Unlinked mappings still point at whatever product owns the new code
+                    product_id = by_product_code.get(normalize_code(mapping[2]), (None,))[0]
+                if product_id is not None:
+                    codes.setdefault(key, (product_id, matched_by))
+        return codes
+
+
+product_code_index = ProductCodeIndex()
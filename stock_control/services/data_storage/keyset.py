@@ -0,0 +1,123 @@
+"""Keyset (seek) pagination over ``(timestamp, id)`` for append-only logs.
+
+Pages are addressed by an opaque cursor holding the boundary row's sort key, so
+fetching any page is one index range scan of ``per_page + 1`` rows, however
+deep the page is and however large the table grows.
+"""
+import base64
+import datetime
+import json
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+KEYSET_PAGE_SIZE = 50
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of ``encode_cursor``; raises ``ValueError`` for anything malformed."""
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Malformed cursor") from exc
+    if not isinstance(values, list):
+        raise ValueError("Malformed cursor")
+    return values
+
+
+def _decode_position(token):
+    try:
+        timestamp, pk = decode_cursor(token)
+        timestamp = parse_datetime(timestamp) if isinstance(timestamp, str) else None
+        pk = int(pk)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Malformed cursor") from exc
+    if timestamp is None:
+        raise ValueError("Malformed cursor")
+    return timestamp, pk
+
+
+class KeysetPage:
+    """One page of rows plus the cursors for its neighbours (``None`` at either end)."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def keyset_page(queryset, after=None, before=None, per_page=KEYSET_PAGE_SIZE, field='timestamp'):
+    """Newest-first page of ``queryset`` ordered by ``(field, id)``.
+
+    ``after`` returns the rows older than that cursor, ``before`` the rows newer
+    than it; with neither, the newest page is returned. Invalid cursors raise
+    ``ValueError``.
+    """
+    def position(row):
+        return encode_cursor([getattr(row, field).isoformat(), row.pk])
+
+    if before:
+        timestamp, pk = _decode_position(before)
+        # (field, id) > (timestamp, pk), written as a range for the index
+        rows = list(queryset
+                    .filter(**{f"{field}__gte": timestamp})
+                    .exclude(**{field: timestamp, "id__lte": pk})
+                    .order_by(field, 'id')[:per_page + 1])
+        if len(rows) <= per_page:
+            # Back at the newest rows: serve the regular first page so it is full.
+            return keyset_page(queryset, per_page=per_page, field=field)
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, next_cursor=position(rows[-1]), previous_cursor=position(rows[0]))
+
+    qs = queryset
+    if after:
+        timestamp, pk = _decode_position(after)
+        # (field, id) < (timestamp, pk)
+        qs = qs.filter(**{f"{field}__lte": timestamp}).exclude(**{field: timestamp, "id__gte": pk})
+    rows = list(qs.order_by(f"-{field}", '-id')[:per_page + 1])
+    has_older = len(rows) > per_page
+    rows = rows[:per_page]
+    return KeysetPage(
+        rows,
+        next_cursor=position(rows[-1]) if has_older else None,
+        previous_cursor=position(rows[0]) if after and rows else None,
+    )
+
+
+def local_day_bounds(date_from=None, date_to=None):
+    """Parse optional ``YYYY-MM-DD`` strings into an aware ``[start, end)`` range of whole local days.
+
+    Either bound may be ``None``; unparseable values are ignored.
+    """
+    tz = timezone.get_current_timezone()
+
+    def parse(value):
+        try:
+            return datetime.datetime.strptime(value, "%Y-%m-%d").date() if value else None
+        except ValueError:
+            return None
+
+    first, last = parse(date_from), parse(date_to)
+    start = timezone.make_aware(datetime.datetime.combine(first, datetime.time.min), tz) if first else None
+    end = (timezone.make_aware(datetime.datetime.combine(last + datetime.timedelta(days=1), datetime.time.min), tz)
+           if last else None)
+    return start, end
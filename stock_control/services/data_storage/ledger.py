@@ -0,0 +1,184 @@
+"""Stock movement ledger: record every lot delta and answer point-in-time stock queries."""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .bulk import bulk_create_with_pks
+from .models import ProductItem, StockMovement, StockSnapshot
+
+# A checkpoint is written once this many movements have accumulated on a lot
+# since its last snapshot, bounding the tail scan in ``stock_at``.
+SNAPSHOT_INTERVAL = 50
+
+
+def _latest_snapshot(product_item_id, at=None):
+    qs = StockSnapshot.objects.filter(product_item_id=product_item_id)
+    if at is not None:
+        qs = qs.filter(taken_at__lte=at)
+    return qs.order_by('-taken_at', '-id').first()
+
+
+def _movements_after(product_item_id, snapshot):
+    qs = StockMovement.objects.filter(product_item_id=product_item_id)
+    if snapshot is not None and snapshot.movement_id is not None:
+        qs = qs.filter(id__gt=snapshot.movement_id)
+    return qs
+
+
+def record_movement(product_item, quantity_delta, source, user=None, location=None,
+                    parts_delta=0, reference="", timestamp=None):
+    """Append a ledger row for a change already applied to ``product_item``.
+
+    Call this in the same transaction as the stock update. The first movement
+    on a lot writes an opening snapshot, and every ``SNAPSHOT_INTERVAL``
+    movements a new checkpoint is taken from the lot's current stock.
+    """
+    if user is not None and not getattr(user, 'is_authenticated', False):
+        user = None
+    if location is None:
+        location = getattr(product_item, 'location', None)
+    quantity_delta = Decimal(str(quantity_delta or 0))
+    timestamp = timestamp or timezone.now()
+
+    with transaction.atomic():
+        balance = (ProductItem.objects
+                   .filter(pk=product_item.pk)
+                   .values_list('current_stock', flat=True)
+                   .first()) or Decimal('0')
+        last_snapshot = _latest_snapshot(product_item.pk)
+        if last_snapshot is None:
+            StockSnapshot.objects.create(
+                product_item_id=product_item.pk,
+                movement=None,
+                balance=balance - quantity_delta,
+                taken_at=timestamp,
+            )
+
+        movement = StockMovement.objects.create(
+            product_item_id=product_item.pk,
+            location=location,
+            user=user,
+            source=source,
+            quantity_delta=quantity_delta,
+            parts_delta=parts_delta or 0,
+            reference=reference or "",
+            timestamp=timestamp,
+            product_code=product_item.product.product_code,
+            lot_number=product_item.lot_number,
+        )
+
+        if last_snapshot is not None:
+            tail = _movements_after(product_item.pk, last_snapshot).count()
+            if tail >= SNAPSHOT_INTERVAL:
+                StockSnapshot.objects.create(
+                    product_item_id=product_item.pk,
+                    movement=movement,
+                    balance=balance,
+                    taken_at=timestamp,
+                )
+    return movement
+
+
+def record_movements(entries, source, user=None, timestamp=None):
+    """Bulk ``record_movement`` for changes already applied to several lots.
+
+    ``entries`` is a list of ``(product_item, quantity_delta, parts_delta,
+    location, reference)`` in the order the changes were applied. Opening
+    snapshots and checkpoints follow the same rules, but a lot that crosses
+    ``SNAPSHOT_INTERVAL`` during the batch is checkpointed once, at its last
+    movement. Costs a fixed number of queries however many lots are involved.
+    """
+    if not entries:
+        return []
+    if user is not None and not getattr(user, 'is_authenticated', False):
+        user = None
+    timestamp = timestamp or timezone.now()
+    lot_ids = {item.pk for item, *_ in entries}
+    batch_delta = defaultdict(Decimal)
+    for item, quantity_delta, *_ in entries:
+        batch_delta[item.pk] += Decimal(str(quantity_delta or 0))
+
+    with transaction.atomic():
+        balances = dict(ProductItem.objects.filter(pk__in=lot_ids).values_list('pk', 'current_stock'))
+        # Lot id -> movement id of its newest checkpoint (None if it only has an opening balance)
+        snapshot_from = dict(StockSnapshot.objects
+                             .filter(product_item_id__in=lot_ids)
+                             .values('product_item_id').annotate(last=Max('movement_id')).order_by()
+                             .values_list('product_item_id', 'last'))
+        tail_filter = Q()
+        for lot_id, movement_id in snapshot_from.items():
+            lot_q = Q(product_item_id=lot_id)
+            if movement_id is not None:
+                lot_q &= Q(id__gt=movement_id)
+            tail_filter |= lot_q
+        tails = {}
+        if snapshot_from:
+            tails = dict(StockMovement.objects.filter(tail_filter)
+                         .values('product_item_id').annotate(n=Count('id')).order_by()
+                         .values_list('product_item_id', 'n'))
+
+        StockSnapshot.objects.bulk_create([
+            StockSnapshot(product_item_id=lot_id, movement=None,
+                          balance=(balances.get(lot_id) or Decimal('0')) - batch_delta[lot_id],
+                          taken_at=timestamp)
+            for lot_id in lot_ids if lot_id not in snapshot_from
+        ])
+
+        movements = bulk_create_with_pks(StockMovement, [
+            StockMovement(
+                product_item_id=item.pk,
+                location=location if location is not None else getattr(item, 'location', None),
+                user=user,
+                source=source,
+                quantity_delta=Decimal(str(quantity_delta or 0)),
+                parts_delta=parts_delta or 0,
+                reference=reference or "",
+                timestamp=timestamp,
+                product_code=item.product.product_code,
+                lot_number=item.lot_number,
+            )
+            for item, quantity_delta, parts_delta, location, reference in entries
+        ])
+
+        last_movement = {}
+        added = defaultdict(int)
+        for movement in movements:
+            last_movement[movement.product_item_id] = movement
+            added[movement.product_item_id] += 1
+        StockSnapshot.objects.bulk_create([
+            StockSnapshot(product_item_id=lot_id, movement=last_movement[lot_id],
+                          balance=balances.get(lot_id) or Decimal('0'), taken_at=timestamp)
+            for lot_id in snapshot_from
+            if tails.get(lot_id, 0) + added[lot_id] >= SNAPSHOT_INTERVAL
+        ])
+    return movements
+
+
+def stock_at(product_item, at):
+    """Return the lot's stock at ``at``, or ``None`` if the ledger starts later.
+
+    Costs one snapshot read plus a sum over at most ``SNAPSHOT_INTERVAL``
+    movements recorded after that snapshot.
+    """
+    snapshot = _latest_snapshot(product_item.pk, at=at)
+    if snapshot is None:
+        return None
+    tail_total = (_movements_after(product_item.pk, snapshot)
+                  .filter(timestamp__lte=at)
+                  .aggregate(total=Sum('quantity_delta'))['total']) or Decimal('0')
+    return snapshot.balance + tail_total
+
+
+def lot_history(product_item_id=None, start=None, end=None):
+    """Ledger rows (newest first), optionally limited to a lot and a time window."""
+    qs = StockMovement.objects.select_related('location', 'user')
+    if product_item_id is not None:
+        qs = qs.filter(product_item_id=product_item_id)
+    if start is not None:
+        qs = qs.filter(timestamp__gte=start)
+    if end is not None:
+        qs = qs.filter(timestamp__lte=end)
+    return qs.order_by('-timestamp', '-id')
@@ -0,0 +1,57 @@
+"""Set-based low stock queries shared by the dashboard, PO and stock admin views."""
+from decimal import Decimal
+
+from django.core.paginator import Paginator
+from django.db.models import DecimalField, Exists, F, OuterRef, Value
+from django.db.models.functions import Coalesce
+
+from .models import Product, PurchaseOrder
+
+PENDING_PO_STATUSES = ("Ordered", "Delayed")
+LOW_STOCK_PAGE_SIZE = 50
+
+
+def pending_po_exists():
+    """Correlated ``EXISTS`` for an open purchase order on the outer product."""
+    return Exists(
+        PurchaseOrder.objects.filter(
+            product_code=OuterRef("product_code"),
+            status__in=PENDING_PO_STATUSES,
+        )
+    )
+
+
+def with_stock_totals(queryset=None):
+    """Annotate products with ``total_stock`` and ``has_pending_po`` in one query.
+
+    Totals come from the ``ProductStockSummary`` row, so no lots are joined.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.annotate(
+        total_stock=Coalesce(
+            F("stock_summary__total_stock"),
+            Value(Decimal("0")),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        has_pending_po=pending_po_exists(),
+    )
+
+
+def low_stock_products(queryset=None, include_pending=False):
+    """Products whose summed lot stock is below their threshold.
+
+    Products with an outstanding (Ordered/Delayed) purchase order are left out
+    unless ``include_pending`` is set. The result is a lazy queryset ordered by
+    name, so callers can ``exists()``, slice or paginate it without loading
+    every product.
+    """
+    qs = with_stock_totals(queryset).filter(total_stock__lt=F("threshold"))
+    if not include_pending:
+        qs = qs.filter(has_pending_po=False)
+    return qs.order_by("name", "pk")
+
+
+def paginate_low_stock(queryset, page_number, per_page=LOW_STOCK_PAGE_SIZE):
+    """Return a single page of ``queryset``; only that page is fetched."""
+    return Paginator(queryset, per_page).get_page(page_number)
@@ -0,0 +1,102 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.data_collection import gs1
+from services.data_collection.gs1_corpus import BARCODE_CORPUS as CORPUS
+from services.data_collection.data_collection import parse_barcode_data
+
+
+def _legacy_format_gs1_date(raw_date):
+    return f"{raw_date[4:6]}.{raw_date[2:4]}.20{raw_date[:2]}"
+
+
+def legacy_parse_barcode_data(raw):
+    """The regex GS1 parser ``parse_barcode_data`` used before the AI table, kept as the baseline."""
+    if not raw:
+        return None
+    if "**" in raw and "3PR" in raw:
+        # The 3PR branch did not change
+        return parse_barcode_data(raw)
+
+    raw = raw.replace(gs1.GS, "")
+    product_code = re.search(r"\(01\)(\d{14})", raw)
+    if product_code:
+        expiry = re.search(r"\(17\)(\d{6})", raw)
+        lot = re.search(r"\(10\)([^\(\)]+)", raw)
+        return {
+            "product_code": product_code.group(1),
+            "lot_number": lot.group(1) if lot else "",
+            "expiry_date": _legacy_format_gs1_date(expiry.group(1)) if expiry else "",
+            "format": "GS1",
+        }
+
+    s = re.sub(r"[^A-Za-z0-9]+", "", raw)
+    m01 = re.search(r"01(\d{14})", s)
+    if not m01:
+        return None
+    after01 = s[m01.end():]
+    m17 = re.search(r"17(\d{6})", after01)
+    m10 = re.search(r"10([A-Za-z0-9]+?)(?=(?:01|17|21|15|11|30|37)\d|$)", after01)
+    return {
+        "product_code": m01.group(1),
+        "lot_number": m10.group(1) if m10 else "",
+        "expiry_date": _legacy_format_gs1_date(m17.group(1)) if m17 else "",
+        "format": "GS1_flat",
+    }
+
+
+def _summary(result):
+    if result is None:
+        return None
+    return result.get("product_code"), result.get("lot_number"), result.get("expiry_date")
+
+
+def _throughput(parse, scans, seconds):
+    parses = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for raw in scans:
+            parse(raw)
+        parses += len(scans)
+    return parses / (time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    help = ("Check the barcode parser against a corpus of GS1 and house-label scans and compare its "
+            "throughput with the regex parser it replaced.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=1.0, help="Time spent per timing run (default 1).")
+
+    def handle(self, *args, **options):
+        if options["seconds"] <= 0:
+            raise CommandError("--seconds must be positive.")
+
+        failures = 0
+        for name, parse in (("regex (previous)", legacy_parse_barcode_data), ("AI table", parse_barcode_data)):
+            wrong = [(raw, _summary(parse(raw)), expected) for raw, expected in CORPUS
+                     if _summary(parse(raw)) != expected]
+            self.stdout.write(f"{name}: {len(CORPUS) - len(wrong)}/{len(CORPUS)} corpus scans correct")
+            for raw, got, expected in wrong:
+                self.stdout.write(f"    {raw!r}: got {got}, expected {expected}")
+            if parse is parse_barcode_data:
+                failures = len(wrong)
+
+        scans = [raw for raw, _ in CORPUS]
+        gs1._parse_gs1_cached.cache_clear()
+        runs = (
+            ("regex (previous)", legacy_parse_barcode_data),
+            ("AI table, uncached", lambda raw: parse_barcode_data(raw) if "**" in raw else gs1.parse_gs1_uncached(raw)),
+            ("AI table, LRU cache", parse_barcode_data),
+        )
+        for name, parse in runs:
+            rate = _throughput(parse, scans, options["seconds"])
+            self.stdout.write(f"{name:>22}: {rate:,.0f} parses/sec")
+        self.stdout.write(f"cache: {gs1._parse_gs1_cached.cache_info()}")
+
+        if failures:
+            raise CommandError(f"The parser got {failures} corpus scan(s) wrong.")
+        self.stdout.write(self.style.SUCCESS("Parser matches the whole corpus."))
@@ -0,0 +1,155 @@
+import io
+import multiprocessing
+import resource
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from services.data_storage.models import Location, Product, ProductItem, Withdrawal
+from services.reporting.exports import (
+    MODEL_DEFINITIONS,
+    export_columns,
+    report_meta_rows,
+    report_queryset,
+    xlsx_export_file,
+)
+
+DEFAULT_ROW_COUNTS = [100_000, 500_000, 1_000_000]
+SEED_BATCH_SIZE = 5000
+
+
+def _export_queryset(product, count):
+    """The Withdrawal report queryset, narrowed to the first ``count`` seeded rows."""
+    qs = report_queryset(MODEL_DEFINITIONS["Withdrawal"]).filter(product_item__product=product)
+    last_pk = qs.order_by("pk").values_list("pk", flat=True)[count - 1]
+    return qs.filter(pk__lte=last_pk)
+
+
+def _write_only(qs):
+    # What download_report does for download=excel
+    export_file = xlsx_export_file(qs, export_columns(Withdrawal), "Withdrawal", report_meta_rows("benchmark"))
+    with export_file:
+        export_file.seek(0, io.SEEK_END)
+        return export_file.tell()
+
+
+def _legacy(qs):
+    # download_report's Excel branch before the write-only export
+    fields = [f.name for f in Withdrawal._meta.fields]
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Withdrawal"
+    bold = Font(bold=True)
+    for meta in report_meta_rows("benchmark"):
+        ws.append(meta)
+    for cell in ws[1] + ws[2] + ws[3]:
+        cell.font = bold
+    ws.append([])
+    ws.append(fields)
+    for cell in ws[5]:
+        cell.font = bold
+    for obj in qs:
+        ws.append([str(getattr(obj, field, '')) for field in fields])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.tell()
+
+
+WRITERS = {"write-only": _write_only, "legacy": _legacy}
+
+
+def _measure(name, product, count, results):
+    # Runs in a fresh child process so ru_maxrss is the peak of this export alone.
+    connections.close_all()
+    qs = _export_queryset(product, count)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    size = WRITERS[name](qs)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    connections.close_all()
+    results.put((baseline, peak, elapsed, size))
+
+
+class Command(BaseCommand):
+    help = ("Seed throwaway withdrawals and measure peak RSS and time of the Excel report export "
+            "on them, optionally against the previous in-memory workbook.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROW_COUNTS,
+                            help="Row counts to benchmark (default: 100000 500000 1000000).")
+        parser.add_argument("--legacy", action="store_true",
+                            help="Also run the old in-memory Workbook export (slow and memory hungry).")
+        parser.add_argument("--keep", action="store_true", help="Keep the throwaway product and its withdrawals.")
+
+    def handle(self, *args, **options):
+        if any(count < 1 for count in options["rows"]):
+            raise CommandError("--rows values must be positive.")
+        writers = ["write-only"] + (["legacy"] if options["legacy"] else [])
+
+        started = time.perf_counter()
+        product = self._seed(max(options["rows"]))
+        self.stdout.write(f"seeded {max(options['rows'])} withdrawals in {time.perf_counter() - started:.1f}s")
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+
+        try:
+            self.stdout.write(f"{'writer':<12}{'rows':>10}{'base MiB':>10}{'peak MiB':>10}"
+                              f"{'seconds':>10}{'file MiB':>10}")
+            for count in options["rows"]:
+                for name in writers:
+                    results = context.Queue()
+                    child = context.Process(target=_measure, args=(name, product, count, results))
+                    child.start()
+                    child.join()
+                    if results.empty():
+                        # Killed before reporting, usually by the OOM killer
+                        self.stdout.write(f"{name:<12}{count:>10}  failed (exit code {child.exitcode})")
+                        continue
+                    baseline, peak, elapsed, size = results.get()
+                    # ru_maxrss is reported in KiB on Linux.
+                    self.stdout.write(
+                        f"{name:<12}{count:>10}{baseline / 1024:>10.1f}{peak / 1024:>10.1f}"
+                        f"{elapsed:>10.1f}{size / 2**20:>10.1f}"
+                    )
+        finally:
+            if not options["keep"]:
+                self._cleanup(product)
+
+    def _seed(self, count):
+        code = f"XLSX-BENCH-{timezone.now():%Y%m%d%H%M%S%f}"
+        location = Location.objects.order_by("pk").first()
+        with transaction.atomic():
+            product = Product.objects.create(product_code=code, name="Excel export benchmark", threshold=0)
+            lots = [
+                ProductItem.objects.create(product=product, lot_number=f"L{lot:04d}", location=location)
+                for lot in range(20)
+            ]
+            for offset in range(0, count, SEED_BATCH_SIZE):
+                # bulk_create skips Withdrawal.save, so no stock, ledger or rollup changes
+                Withdrawal.objects.bulk_create([
+                    Withdrawal(
+                        product_item=lots[i % len(lots)],
+                        quantity=Decimal("1.00"),
+                        withdrawal_type="unit" if i % 4 else "part",
+                        barcode=f"0104{i:012d}",
+                        location=location,
+                        parts_withdrawn=i % 3,
+                        product_code=code,
+                        product_name=product.name,
+                        lot_number=lots[i % len(lots)].lot_number,
+                    )
+                    for i in range(offset, min(offset + SEED_BATCH_SIZE, count))
+                ])
+        return product
+
+    def _cleanup(self, product):
+        with transaction.atomic():
+            items = ProductItem.objects.filter(product=product)
+            Withdrawal.objects.filter(product_item__in=items).delete()
+            product.delete()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from services.analysis.forecasting import DEFAULT_HISTORY_DAYS, DEFAULT_HORIZON_DAYS, compute_forecasts
+
+
+class Command(BaseCommand):
+    help = "Fit a demand forecast per product in a process pool and store the results for the analysis page."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--history", type=int, default=DEFAULT_HISTORY_DAYS,
+                            help=f"Days of withdrawal history to fit on (default {DEFAULT_HISTORY_DAYS}).")
+        parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON_DAYS,
+                            help=f"Days to forecast ahead (default {DEFAULT_HORIZON_DAYS}).")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes; 1 fits in-process. Defaults to the CPU count.")
+
+    def handle(self, *args, **options):
+        if options["history"] < 1 or options["horizon"] < 1:
+            raise CommandError("--history and --horizon must be positive.")
+        if options["workers"] is not None and options["workers"] < 1:
+            raise CommandError("--workers must be at least 1.")
+        results = compute_forecasts(
+            history_days=options["history"],
+            horizon_days=options["horizon"],
+            workers=options["workers"],
+        )
+        failed = sum(1 for r in results if r.error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {len(results)} forecast(s); {failed} fell back to the mean after a failed fit."
+        ))
@@ -0,0 +1,28 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.data_storage.models import DailyConsumption
+
+
+def _parse_day(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Recompute DailyConsumption rollup rows from withdrawals, optionally for a date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First day to rebuild (YYYY-MM-DD). Defaults to the earliest withdrawal.")
+        parser.add_argument("--end", help="Last day to rebuild (YYYY-MM-DD). Defaults to the latest withdrawal.")
+
+    def handle(self, *args, **options):
+        start = _parse_day(options["start"]) if options.get("start") else None
+        end = _parse_day(options["end"]) if options.get("end") else None
+        if start and end and start > end:
+            raise CommandError("--start must be on or before --end.")
+        count = DailyConsumption.rebuild(start=start, end=end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily consumption row(s)."))
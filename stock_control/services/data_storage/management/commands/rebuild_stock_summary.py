@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from services.data_storage.models import ProductStockSummary
+
+
+class Command(BaseCommand):
+    help = "Recompute every ProductStockSummary row from the current lot data."
+
+    def handle(self, *args, **options):
+        count = ProductStockSummary.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stock summaries for {count} product(s)."))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from services.reporting.jobs import requeue_stale_jobs, run_next_job
+
+
+class Command(BaseCommand):
+    help = "Run queued report export jobs, polling for new ones until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty (default 2).")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once the queue is empty instead of polling.")
+        parser.add_argument("--stale-after", type=int, default=3600,
+                            help="Requeue jobs that have been running longer than this many seconds at startup "
+                                 "(default 3600).")
+
+    def handle(self, *args, **options):
+        if options["poll"] <= 0:
+            raise CommandError("--poll must be positive.")
+        requeued = requeue_stale_jobs(options["stale_after"])
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale export job(s)."))
+
+        try:
+            while True:
+                close_old_connections()
+                result = run_next_job()
+                if result is None:
+                    if options["once"]:
+                        return
+                    time.sleep(options["poll"])
+                    continue
+                job, seconds = result
+                if job.error:
+                    self.stderr.write(f"Export job {job.pk} failed after {seconds:.1f}s: {job.error}")
+                else:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Export job {job.pk}: {job.rows_written} {job.model_name} row(s) in {seconds:.1f}s "
+                        f"-> {job.file_path}"
+                    ))
+        except KeyboardInterrupt:
+            self.stdout.write("Export worker stopped.")
@@ -0,0 +1,156 @@
+import multiprocessing
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from services.data_collection_2.batch_withdrawal import withdraw_batch
+from services.data_storage.ledger import stock_at
+from services.data_storage.models import (
+    DailyConsumption,
+    Product,
+    ProductItem,
+    ProductStockSummary,
+    StockMovement,
+    StockRegistrationLog,
+    StockSnapshot,
+    Withdrawal,
+)
+from services.data_storage.stock_updates import register_to_lot, withdraw_from_lot
+
+
+def _worker(item_pk, product_id, options, worker_index, results):
+    # Forked children must not share the parent's database connection.
+    connections.close_all()
+    withdrawals = parts = registrations = failures = 0
+    try:
+        for i in range(options["iterations"]):
+            try:
+                if options["register_every"] and (i + 1) % options["register_every"] == 0:
+                    register_to_lot(item_pk, Decimal("1"), barcode=f"stress-{worker_index}")
+                    registrations += 1
+                elif options["batch_size"] > 1:
+                    scans = [{"product_id": product_id, "mode": "part", "parts_withdrawn": options["parts"]}]
+                    batch = withdraw_batch(scans * options["batch_size"], None)
+                    done = sum(1 for line in batch if line["ok"])
+                    withdrawals += done
+                    parts += done * options["parts"]
+                else:
+                    withdraw_from_lot(item_pk, mode="part", parts=options["parts"], withdrawal_type="part",
+                                      barcode=f"stress-{worker_index}")
+                    withdrawals += 1
+                    parts += options["parts"]
+            except Exception as exc:
+                failures += 1
+                results.put(("error", f"worker {worker_index}: {type(exc).__name__}: {exc}"))
+    finally:
+        connections.close_all()
+        results.put(("done", (withdrawals, parts, registrations, failures)))
+
+
+class Command(BaseCommand):
+    help = ("Fire parallel part withdrawals (and optional registrations) at one throwaway lot "
+            "from several processes, then verify the lot, ledger, summary and rollups add up.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Parallel processes (default 8).")
+        parser.add_argument("--iterations", type=int, default=50, help="Operations per worker (default 50).")
+        parser.add_argument("--parts", type=int, default=1, help="Parts per withdrawal (default 1).")
+        parser.add_argument("--units-per-item", type=int, default=4, help="Parts per full item on the lot (default 4).")
+        parser.add_argument("--register-every", type=int, default=0,
+                            help="Every Nth operation registers one unit instead of withdrawing (default off).")
+        parser.add_argument("--batch-size", type=int, default=1,
+                            help="Send withdrawals through the batch endpoint's code path, this many per call.")
+        parser.add_argument("--keep", action="store_true", help="Keep the throwaway product and its history.")
+
+    def handle(self, *args, **options):
+        for name in ("workers", "iterations", "parts", "units_per_item", "batch_size"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive.")
+        if options["register_every"] < 0:
+            raise CommandError("--register-every cannot be negative.")
+
+        start_stock = Decimal(options["workers"] * options["iterations"] * options["batch_size"] * options["parts"])
+        code = f"STRESS-{timezone.now():%Y%m%d%H%M%S%f}"
+        product = Product.objects.create(product_code=code, name="Concurrency stress test", threshold=0)
+        item = ProductItem.objects.create(product=product, lot_number="STRESS", current_stock=start_stock,
+                                          units_per_quantity=options["units_per_item"])
+        connections.close_all()
+
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        started = time.perf_counter()
+        processes = [
+            context.Process(target=_worker, args=(item.pk, product.pk, options, index, results))
+            for index in range(options["workers"])
+        ]
+        for process in processes:
+            process.start()
+        withdrawals = parts = registrations = failures = 0
+        finished = 0
+        while finished < len(processes):
+            kind, payload = results.get()
+            if kind == "error":
+                self.stderr.write(payload)
+                continue
+            finished += 1
+            withdrawals += payload[0]
+            parts += payload[1]
+            registrations += payload[2]
+            failures += payload[3]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            problems = self._verify(item, start_stock, withdrawals, parts, registrations)
+        finally:
+            if not options["keep"]:
+                self._cleanup(product)
+
+        self.stdout.write(
+            f"{options['workers']} workers: {withdrawals} withdrawals ({parts} parts), {registrations} registrations, "
+            f"{failures} failed, in {elapsed:.2f}s"
+        )
+        if problems:
+            raise CommandError("Stock corrupted:\n  " + "\n  ".join(problems))
+        if failures:
+            raise CommandError(f"Stock is consistent, but {failures} operation(s) failed after retries.")
+        self.stdout.write(self.style.SUCCESS("Final stock, partial units, ledger, summary and rollups all agree."))
+
+    def _verify(self, item, start_stock, withdrawals, parts, registrations):
+        item.refresh_from_db()
+        full_items, partial = divmod(parts, item.units_per_quantity)
+        expected_stock = start_stock - full_items + registrations
+        problems = []
+
+        def check(label, actual, expected):
+            if actual != expected:
+                problems.append(f"{label}: expected {expected}, got {actual}")
+
+        check("lot current_stock", item.current_stock, expected_stock)
+        check("lot accumulated_partial", item.accumulated_partial, partial)
+        logged = Withdrawal.objects.filter(product_item=item).aggregate(n=Count("id"), parts=Sum("parts_withdrawn"))
+        check("withdrawal rows", logged["n"], withdrawals)
+        check("parts withdrawn", logged["parts"] or 0, parts)
+        check("registration rows", StockRegistrationLog.objects.filter(product_item=item).count(), registrations)
+        ledger_total = StockMovement.objects.filter(product_item=item).aggregate(total=Sum("quantity_delta"))["total"]
+        check("ledger total", ledger_total or Decimal("0"), expected_stock - start_stock)
+        check("ledger stock_at(now)", stock_at(item, timezone.now()), expected_stock)
+        check("stock summary", ProductStockSummary.objects.get(product_id=item.product_id).total_stock, expected_stock)
+        rollup = DailyConsumption.objects.filter(product_code=item.product.product_code).aggregate(n=Sum("count"))
+        check("daily rollup count", rollup["n"] or 0, withdrawals)
+        return problems
+
+    def _cleanup(self, product):
+        with transaction.atomic():
+            items = ProductItem.objects.filter(product=product)
+            Withdrawal.objects.filter(product_item__in=items).delete()
+            StockRegistrationLog.objects.filter(product_item__in=items).delete()
+            StockSnapshot.objects.filter(product_item__in=items).delete()
+            StockMovement.objects.filter(product_item__in=items).delete()
+            DailyConsumption.objects.filter(product_code=product.product_code).delete()
+            product.delete()
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:46
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_stock_summaries(apps, schema_editor):
+    Product = apps.get_model('data_storage', 'Product')
+    ProductStockSummary = apps.get_model('data_storage', 'ProductStockSummary')
+    rows = Product.objects.values('id').annotate(
+        total_stock=models.Sum('items__current_stock'),
+        lot_count=models.Count('items__id'),
+        earliest_expiry=models.Min('items__expiry_date'),
+        partial_units=models.Sum('items__accumulated_partial'),
+    )
+    ProductStockSummary.objects.bulk_create([
+        ProductStockSummary(
+            product_id=row['id'],
+            total_stock=row['total_stock'] or Decimal('0.00'),
+            lot_count=row['lot_count'] or 0,
+            earliest_expiry=row['earliest_expiry'],
+            partial_units=row['partial_units'] or 0,
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0007_productcodemapping'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStockSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_stock', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('lot_count', models.PositiveIntegerField(default=0)),
+                ('earliest_expiry', models.DateField(blank=True, null=True)),
+                ('partial_units', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summary', to='data_storage.product')),
+            ],
+        ),
+        migrations.RunPython(populate_stock_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_opening_snapshots(apps, schema_editor):
+    ProductItem = apps.get_model('data_storage', 'ProductItem')
+    StockSnapshot = apps.get_model('data_storage', 'StockSnapshot')
+    taken_at = django.utils.timezone.now()
+    StockSnapshot.objects.bulk_create([
+        StockSnapshot(product_item_id=item_id, balance=stock, taken_at=taken_at)
+        for item_id, stock in ProductItem.objects.values_list('id', 'current_stock')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('data_storage', '0008_productstocksummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('withdrawal', 'Withdrawal'), ('registration', 'Stock Registration'), ('po_delivery', 'Purchase Order Delivery'), ('lot_discard', 'Lot Discarded'), ('lot_created', 'Lot Created'), ('adjustment', 'Manual Adjustment')], max_length=20)),
+                ('quantity_delta', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('parts_delta', models.IntegerField(default=0, help_text='Partial units withdrawn alongside the full-item delta')),
+                ('reference', models.CharField(blank=True, default='', max_length=100)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product_code', models.CharField(default='N/A', max_length=50)),
+                ('lot_number', models.CharField(default='UNKNOWN', max_length=50)),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='data_storage.location')),
+                ('product_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='data_storage.productitem')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('movement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='data_storage.stockmovement')),
+                ('product_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='data_storage.productitem')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['product_item', 'taken_at'], name='data_storag_product_8e061e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product_item', 'timestamp'], name='data_storag_product_5016e9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['timestamp'], name='data_storag_timesta_84af16_idx'),
+        ),
+        migrations.RunPython(create_opening_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:50
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import TruncDate
+
+
+def populate_daily_consumption(apps, schema_editor):
+    Withdrawal = apps.get_model('data_storage', 'Withdrawal')
+    DailyConsumption = apps.get_model('data_storage', 'DailyConsumption')
+    rows = (Withdrawal.objects
+            .annotate(day=TruncDate('timestamp'))
+            .values('product_code', 'location_id', 'day', 'withdrawal_type')
+            .annotate(
+                name=models.Max('product_name'),
+                total_quantity=models.Sum('quantity'),
+                total_parts=models.Sum('parts_withdrawn'),
+                total_count=models.Count('id'),
+            )
+            .order_by())
+    DailyConsumption.objects.bulk_create([
+        DailyConsumption(
+            product_code=row['product_code'],
+            product_name=row['name'],
+            location_id=row['location_id'],
+            day=row['day'],
+            withdrawal_type=row['withdrawal_type'],
+            quantity=row['total_quantity'] or Decimal('0.00'),
+            parts=row['total_parts'] or 0,
+            count=row['total_count'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0009_stockmovement_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyConsumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_code', models.CharField(max_length=50)),
+                ('product_name', models.CharField(default='Unnamed Product', max_length=100)),
+                ('day', models.DateField()),
+                ('withdrawal_type', models.CharField(default='unit', max_length=20)),
+                ('quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('parts', models.PositiveIntegerField(default=0)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_consumption', to='data_storage.location')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailyconsumption',
+            index=models.Index(fields=['day'], name='data_storag_day_68167b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyconsumption',
+            index=models.Index(fields=['product_code', 'day'], name='data_storag_product_0aed2b_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyconsumption',
+            unique_together={('product_code', 'location', 'day', 'withdrawal_type')},
+        ),
+        migrations.RunPython(populate_daily_consumption, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0010_dailyconsumption'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['status', 'expected_delivery'], name='data_storag_status_636eb8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['product_code', 'status'], name='data_storag_product_4a65a3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['timestamp'], name='data_storag_timesta_af6781_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:51
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0011_analysis_range_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('method', models.CharField(max_length=30)),
+                ('history_days', models.PositiveIntegerField()),
+                ('horizon_days', models.PositiveIntegerField()),
+                ('daily_forecast', models.JSONField(default=list, help_text='Forecast demand per day, starting tomorrow')),
+                ('avg_daily_demand', models.FloatField(default=0)),
+                ('stock_at_forecast', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('run_out_date', models.DateField(blank=True, null=True)),
+                ('reorder_date', models.DateField(blank=True, null=True)),
+                ('fit_seconds', models.FloatField(default=0)),
+                ('aic', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='data_storage.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='forecastresult',
+            index=models.Index(fields=['computed_at'], name='data_storag_compute_78a126_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forecastresult',
+            index=models.Index(fields=['run_out_date'], name='data_storag_run_out_dedefd_idx'),
+        ),
+    ]
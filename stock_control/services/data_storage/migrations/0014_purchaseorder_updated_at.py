@@ -0,0 +1,22 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0013_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['updated_at', 'id'], name='data_storag_updated_53a7ed_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0014_purchaseorder_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='withdrawal',
+            name='data_storag_timesta_af6781_idx',
+        ),
+        migrations.AddIndex(
+            model_name='stockregistrationlog',
+            index=models.Index(fields=['timestamp', 'id'], name='data_storag_timesta_7a2ad6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockregistrationlog',
+            index=models.Index(fields=['location', 'timestamp', 'id'], name='data_storag_locatio_c02334_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockregistrationlog',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='data_storag_user_id_4143db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['timestamp', 'id'], name='data_storag_timesta_b12358_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['location', 'timestamp', 'id'], name='data_storag_locatio_1e10e1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='data_storag_user_id_5d71b9_idx'),
+        ),
+    ]
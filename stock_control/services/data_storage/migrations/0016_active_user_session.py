@@ -0,0 +1,54 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_active_sessions(apps, schema_editor):
+    # One last decode of the live sessions; from here on the table is kept by signals.
+    from django.contrib.sessions.backends.db import SessionStore
+
+    Session = apps.get_model('sessions', 'Session')
+    ActiveUserSession = apps.get_model('data_storage', 'ActiveUserSession')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    now = django.utils.timezone.now()
+    store = SessionStore()
+    rows = []
+    for session in Session.objects.filter(expire_date__gte=now).iterator():
+        try:
+            user_id = int(store.decode(session.session_data).get('_auth_user_id'))
+        except (TypeError, ValueError):
+            continue
+        rows.append(ActiveUserSession(session_key=session.session_key, user_id=user_id,
+                                      expire_date=session.expire_date, last_seen=now))
+    existing = set(User.objects.filter(id__in={row.user_id for row in rows}).values_list('id', flat=True))
+    ActiveUserSession.objects.bulk_create([row for row in rows if row.user_id in existing], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('data_storage', '0015_log_keyset_indexes'),
+        ('sessions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveUserSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True)),
+                ('expire_date', models.DateTimeField()),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='active_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='activeusersession',
+            index=models.Index(fields=['expire_date', 'user'], name='data_storag_expire__4ecbed_idx'),
+        ),
+        migrations.RunPython(backfill_active_sessions, migrations.RunPython.noop),
+    ]
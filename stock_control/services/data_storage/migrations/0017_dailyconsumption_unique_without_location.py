@@ -0,0 +1,35 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    # unique_together let rows without a location repeat; fold each repeat into the first row
+    DailyConsumption = apps.get_model('data_storage', 'DailyConsumption')
+    kept = {}
+    for row in DailyConsumption.objects.filter(location__isnull=True).order_by('pk'):
+        key = (row.product_code, row.day, row.withdrawal_type)
+        first = kept.get(key)
+        if first is None:
+            kept[key] = row
+            continue
+        first.quantity += row.quantity
+        first.parts += row.parts
+        first.count += row.count
+        first.save(update_fields=['quantity', 'parts', 'count'])
+        row.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0016_active_user_session'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyconsumption',
+            constraint=models.UniqueConstraint(condition=models.Q(('location__isnull', True)), fields=('product_code', 'day', 'withdrawal_type'), name='daily_consumption_unique_row_no_location'),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
 from django.contrib.auth.models import User
 from decimal import Decimal
 from datetime import date, timedelta
@@ -41,11 +43,18 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.product_code} - {self.name}"
 
+    def get_stock_summary(self):
+        """Return the denormalized stock summary, or an unsaved zeroed one if none exists yet."""
+        try:
+            return self.stock_summary
+        except ProductStockSummary.DoesNotExist:
+            return ProductStockSummary(product=self)
+
     def get_full_items_in_stock(self):
-        return int(sum(item.current_stock for item in self.items.all()))
+        return int(self.get_stock_summary().total_stock)
 
     def get_remaining_parts(self):
-        return sum(item.accumulated_partial for item in self.items.all())
+        return self.get_stock_summary().partial_units
 
 
 class ProductCodeMapping(models.Model):
@@ -108,7 +117,137 @@ class ProductItem(models.Model):
                 self.location = Location.get_default()
             except Exception:
                 pass
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous_product_id = None
+            if not self._state.adding:
+                previous_product_id = (ProductItem.objects.filter(pk=self.pk)
+                                       .values_list('product_id', flat=True).first())
+            super().save(*args, **kwargs)
+            if previous_product_id not in (None, self.product_id):
+                # The lot moved to another product: its stock leaves the old summary
+                ProductStockSummary.refresh_for_products({previous_product_id, self.product_id})
+            else:
+                ProductStockSummary.refresh_for_product(self.product_id)
+
+    def delete(self, *args, **kwargs):
+        product_id = self.product_id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ProductStockSummary.refresh_for_product(product_id)
+        return result
+
+
+class ProductStockSummary(models.Model):
+    """Per-product stock totals kept in step with ProductItem writes.
+
+    Rows are refreshed in the same transaction as every lot save/delete (and
+    explicitly after queryset ``update()`` calls that bypass ``save()``), so
+    stock reads are a single row fetch instead of summing every lot. Run
+    ``manage.py rebuild_stock_summary`` to recompute all rows from scratch.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="stock_summary")
+    total_stock = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    lot_count = models.PositiveIntegerField(default=0)
+    earliest_expiry = models.DateField(null=True, blank=True)
+    partial_units = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stock summary for product {self.product_id}: {self.total_stock}"
+
+    @staticmethod
+    def _totals(queryset, prefix=""):
+        return queryset.annotate(
+            total_stock_sum=Sum(f"{prefix}current_stock"),
+            lot_count_sum=Count(f"{prefix}id"),
+            earliest_expiry_min=Min(f"{prefix}expiry_date"),
+            partial_units_sum=Sum(f"{prefix}accumulated_partial"),
+        )
+
+    @staticmethod
+    def _defaults(row):
+        return {
+            "total_stock": row["total_stock_sum"] or Decimal('0.00'),
+            "lot_count": row["lot_count_sum"] or 0,
+            "earliest_expiry": row["earliest_expiry_min"],
+            "partial_units": row["partial_units_sum"] or 0,
+        }
+
+    @classmethod
+    def refresh_for_product(cls, product_id):
+        """Recompute the summary for one product from its lots.
+
+        The summary row is locked before the lots are summed, so two workers
+        changing different lots of one product cannot each write a total that
+        misses the other's change.
+        """
+        if product_id is None:
+            return None
+        with transaction.atomic():
+            summary = cls.objects.select_for_update().filter(product_id=product_id).first()
+            if summary is None:
+                cls.objects.get_or_create(product_id=product_id)
+                summary = cls.objects.select_for_update().get(product_id=product_id)
+            rows = cls._totals(ProductItem.objects.filter(product_id=product_id).values("product_id"))
+            row = next(iter(rows), None)
+            if row is None:
+                defaults = {"total_stock": Decimal('0.00'), "lot_count": 0, "earliest_expiry": None, "partial_units": 0}
+            else:
+                defaults = cls._defaults(row)
+            for field, value in defaults.items():
+                setattr(summary, field, value)
+            summary.save()
+        return summary
+
+    @classmethod
+    def refresh_for_products(cls, product_ids):
+        """Recompute several summaries with one grouped query and two bulk writes."""
+        product_ids = {product_id for product_id in product_ids if product_id is not None}
+        if not product_ids:
+            return
+        with transaction.atomic():
+            # Lock existing rows (in a fixed order) before summing, as in refresh_for_product.
+            existing = {
+                summary.product_id: summary
+                for summary in cls.objects.select_for_update().filter(product_id__in=product_ids).order_by("product_id")
+            }
+            totals = {
+                row["product_id"]: cls._defaults(row)
+                for row in cls._totals(ProductItem.objects.filter(product_id__in=product_ids).values("product_id"))
+            }
+            empty = {"total_stock": Decimal('0.00'), "lot_count": 0, "earliest_expiry": None, "partial_units": 0}
+            now = timezone.now()
+            changed, missing = [], []
+            for product_id in product_ids:
+                defaults = totals.get(product_id, empty)
+                summary = existing.get(product_id)
+                if summary is None:
+                    missing.append(cls(product_id=product_id, **defaults))
+                    continue
+                for field, value in defaults.items():
+                    setattr(summary, field, value)
+                summary.updated_at = now
+                changed.append(summary)
+            if changed:
+                cls.objects.bulk_update(changed, list(empty) + ["updated_at"])
+            if missing:
+                try:
+                    with transaction.atomic():
+                        cls.objects.bulk_create(missing)
+                except IntegrityError:
+                    # Created concurrently; fall back to one upsert per product.
+                    for summary in missing:
+                        cls.refresh_for_product(summary.product_id)
+
+    @classmethod
+    def rebuild(cls):
+        """Drop and recompute every summary row with a single grouped query."""
+        rows = cls._totals(Product.objects.values("id"), prefix="items__")
+        summaries = [cls(product_id=row["id"], **cls._defaults(row)) for row in rows]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(summaries, batch_size=500)
+        return len(summaries)
 
 
 
@@ -145,6 +284,13 @@ class Withdrawal(models.Model):
     lot_number = models.CharField(max_length=50, default="UNKNOWN")
     expiry_date = models.DateField(default=date.today)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["timestamp", "id"]),
+            models.Index(fields=["location", "timestamp", "id"]),
+            models.Index(fields=["user", "timestamp", "id"]),
+        ]
+
     def save(self, *args, **kwargs):
         if self.product_item:
             product = self.product_item.product
@@ -155,7 +301,22 @@ class Withdrawal(models.Model):
             if self.location is None:
                 # default withdrawal location to the item's location if not provided
                 self.location = getattr(self.product_item, 'location', None)
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic():
+            previous = None if adding else Withdrawal.objects.filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            if previous is None:
+                DailyConsumption.record_withdrawal(self)
+            elif DailyConsumption.rollup_values(previous) != DailyConsumption.rollup_values(self):
+                # Move the old figures out of their row and the new ones in
+                DailyConsumption.record_withdrawals([previous], sign=-1)
+                DailyConsumption.record_withdrawal(self)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            DailyConsumption.record_withdrawals([self], sign=-1)
+        return result
 
     def get_full_items_withdrawn(self):
         return int(self.quantity)
@@ -167,6 +328,177 @@ class Withdrawal(models.Model):
         return f"{self.product_name} withdrawn on {self.timestamp}"
 
 
+class DailyConsumption(models.Model):
+    """Per-day withdrawal totals by product, location and withdrawal type.
+
+    Kept in step with every Withdrawal save and delete; charts aggregate these
+    rows instead of scanning the raw withdrawal table. Writes that bypass the
+    model (``QuerySet.update``/``delete``, raw SQL) are not folded in;
+    ``manage.py rebuild_daily_consumption`` recomputes a date range from the
+    withdrawals themselves.
+    """
+    product_code = models.CharField(max_length=50)
+    product_name = models.CharField(max_length=100, default="Unnamed Product")
+    location = models.ForeignKey('Location', on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_consumption')
+    day = models.DateField()
+    withdrawal_type = models.CharField(max_length=20, default='unit')
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    parts = models.PositiveIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [("product_code", "location", "day", "withdrawal_type")]
+        constraints = [
+            # NULLs never collide in unique_together, so rows without a location need their own
+            models.UniqueConstraint(
+                fields=["product_code", "day", "withdrawal_type"],
+                condition=models.Q(location__isnull=True),
+                name="daily_consumption_unique_row_no_location",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["day"]),
+            models.Index(fields=["product_code", "day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_code} on {self.day}: {self.quantity}"
+
+    @classmethod
+    def record_withdrawal(cls, withdrawal):
+        """Fold a newly created withdrawal into its day's rollup row."""
+        cls.record_withdrawals([withdrawal])
+
+    @staticmethod
+    def rollup_values(withdrawal):
+        """The withdrawal fields a rollup row is keyed and summed by."""
+        return (withdrawal.product_code, withdrawal.location_id, withdrawal.withdrawal_type,
+                Decimal(str(withdrawal.quantity or 0)), withdrawal.parts_withdrawn or 0)
+
+    @classmethod
+    def record_withdrawals(cls, withdrawals, sign=1):
+        """Fold newly created withdrawals into their rollup rows (``sign=-1`` takes them out again).
+
+        Costs one read, one bulk insert for new rows and one UPDATE for the
+        rest, however many withdrawals and groups there are.
+        """
+        groups = {}
+        for withdrawal in withdrawals:
+            day = timezone.localdate(withdrawal.timestamp) if withdrawal.timestamp else timezone.localdate()
+            key = (withdrawal.product_code, withdrawal.location_id, day, withdrawal.withdrawal_type)
+            name, quantity, parts, count = groups.get(key, (None, Decimal('0'), 0, 0))
+            groups[key] = (
+                withdrawal.product_name,
+                quantity + sign * Decimal(str(withdrawal.quantity or 0)),
+                parts + sign * (withdrawal.parts_withdrawn or 0),
+                count + sign,
+            )
+        existing = {}
+        if groups:
+            rows = cls.objects.filter(
+                product_code__in={key[0] for key in groups},
+                day__in={key[2] for key in groups},
+            )
+            for row in rows:
+                key = (row.product_code, row.location_id, row.day, row.withdrawal_type)
+                if key in groups:
+                    existing[key] = row.pk
+
+        with transaction.atomic():
+            # Nothing to take out of a row that was never recorded; rebuild repairs such gaps
+            missing = [
+                cls(product_code=product_code, location_id=location_id, day=day, withdrawal_type=withdrawal_type,
+                    product_name=name, quantity=quantity, parts=parts, count=count)
+                for (product_code, location_id, day, withdrawal_type), (name, quantity, parts, count) in groups.items()
+                if (product_code, location_id, day, withdrawal_type) not in existing and sign > 0
+            ]
+            if missing:
+                try:
+                    with transaction.atomic():
+                        cls.objects.bulk_create(missing)
+                except IntegrityError:
+                    # Another request created one of the rows first; fold group by group.
+                    for row in missing:
+                        cls._fold(row)
+            if existing:
+                # One UPDATE for every existing row, still incrementing in SQL.
+                def per_row(position, output_field):
+                    return models.Case(
+                        *[models.When(pk=pk, then=models.Value(groups[key][position])) for key, pk in existing.items()],
+                        output_field=output_field,
+                    )
+                cls.objects.filter(pk__in=existing.values()).update(
+                    product_name=per_row(0, models.CharField()),
+                    quantity=models.F("quantity") + per_row(1, models.DecimalField(max_digits=14, decimal_places=2)),
+                    parts=models.F("parts") + per_row(2, models.IntegerField()),
+                    count=models.F("count") + per_row(3, models.IntegerField()),
+                )
+                if sign < 0:
+                    cls.objects.filter(pk__in=existing.values(), count__lte=0).delete()
+
+    @classmethod
+    def _fold(cls, entry):
+        """Add an unsaved rollup ``entry`` to its row, creating the row if needed."""
+        row, created = cls.objects.get_or_create(
+            product_code=entry.product_code,
+            location_id=entry.location_id,
+            day=entry.day,
+            withdrawal_type=entry.withdrawal_type,
+            defaults={
+                "product_name": entry.product_name,
+                "quantity": entry.quantity,
+                "parts": entry.parts,
+                "count": entry.count,
+            },
+        )
+        if not created:
+            cls.objects.filter(pk=row.pk).update(
+                product_name=entry.product_name,
+                quantity=models.F("quantity") + entry.quantity,
+                parts=models.F("parts") + entry.parts,
+                count=models.F("count") + entry.count,
+            )
+
+    @classmethod
+    def rebuild(cls, start=None, end=None):
+        """Recompute rollup rows for days in ``[start, end]`` (open-ended if omitted)."""
+        withdrawals = Withdrawal.objects.annotate(day=TruncDate("timestamp"))
+        rollups = cls.objects.all()
+        if start:
+            withdrawals = withdrawals.filter(day__gte=start)
+            rollups = rollups.filter(day__gte=start)
+        if end:
+            withdrawals = withdrawals.filter(day__lte=end)
+            rollups = rollups.filter(day__lte=end)
+
+        rows = (withdrawals
+                .values("product_code", "location_id", "day", "withdrawal_type")
+                .annotate(
+                    name=models.Max("product_name"),
+                    total_quantity=Sum("quantity"),
+                    total_parts=Sum("parts_withdrawn"),
+                    total_count=Count("id"),
+                )
+                .order_by())
+        entries = [
+            cls(
+                product_code=row["product_code"],
+                product_name=row["name"],
+                location_id=row["location_id"],
+                day=row["day"],
+                withdrawal_type=row["withdrawal_type"],
+                quantity=row["total_quantity"] or Decimal('0.00'),
+                parts=row["total_parts"] or 0,
+                count=row["total_count"],
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            rollups.delete()
+            cls.objects.bulk_create(entries, batch_size=500)
+        return len(entries)
+
+
 class StockRegistrationLog(models.Model):
     product_item = models.ForeignKey('ProductItem', on_delete=models.SET_NULL, null=True, blank=True)
     quantity = models.DecimalField(
@@ -186,6 +518,13 @@ class StockRegistrationLog(models.Model):
     lot_number = models.CharField(max_length=50, default="UNKNOWN")
     expiry_date = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["timestamp", "id"]),
+            models.Index(fields=["location", "timestamp", "id"]),
+            models.Index(fields=["user", "timestamp", "id"]),
+        ]
+
     def save(self, *args, **kwargs):
         if self.product_item:
             product = self.product_item.product
@@ -216,6 +555,15 @@ class PurchaseOrder(models.Model):
     product_name = models.CharField(max_length=100, default="Unnamed Product")
     lot_number = models.CharField(max_length=50, default="UNKNOWN")
     expiry_date = models.DateField(default=date.today)
+    # Bumped on every save; the purchase order changefeed pages on (updated_at, id).
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "expected_delivery"]),
+            models.Index(fields=["product_code", "status"]),
+            models.Index(fields=["updated_at", "id"]),
+        ]
 
     def save(self, *args, **kwargs):
         if self.product_item:
@@ -240,6 +588,96 @@ class PurchaseOrder(models.Model):
 
 
 
+class StockMovement(models.Model):
+    """Append-only ledger entry for a single change to a lot's ``current_stock``.
+
+    Every stock-changing path (withdrawals, registrations, PO deliveries, lot
+    discards and manual adjustments) records one row here via
+    ``services.data_storage.ledger.record_movement``.
+    """
+    SOURCE_WITHDRAWAL = 'withdrawal'
+    SOURCE_REGISTRATION = 'registration'
+    SOURCE_PO_DELIVERY = 'po_delivery'
+    SOURCE_LOT_DISCARD = 'lot_discard'
+    SOURCE_LOT_CREATED = 'lot_created'
+    SOURCE_ADJUSTMENT = 'adjustment'
+    SOURCE_CHOICES = [
+        (SOURCE_WITHDRAWAL, 'Withdrawal'),
+        (SOURCE_REGISTRATION, 'Stock Registration'),
+        (SOURCE_PO_DELIVERY, 'Purchase Order Delivery'),
+        (SOURCE_LOT_DISCARD, 'Lot Discarded'),
+        (SOURCE_LOT_CREATED, 'Lot Created'),
+        (SOURCE_ADJUSTMENT, 'Manual Adjustment'),
+    ]
+
+    product_item = models.ForeignKey('ProductItem', on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    location = models.ForeignKey('Location', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    quantity_delta = models.DecimalField(max_digits=12, decimal_places=2)
+    parts_delta = models.IntegerField(default=0, help_text="Partial units withdrawn alongside the full-item delta")
+    reference = models.CharField(max_length=100, blank=True, default="")
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    product_code = models.CharField(max_length=50, default="N/A")
+    lot_number = models.CharField(max_length=50, default="UNKNOWN")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["product_item", "timestamp"]),
+            models.Index(fields=["timestamp"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_source_display()} {self.quantity_delta:+} for {self.product_code} (Lot {self.lot_number})"
+
+
+class StockSnapshot(models.Model):
+    """Checkpoint of a lot's absolute stock after a given ledger movement.
+
+    ``movement`` is the last StockMovement folded into ``balance``; it is null
+    for an opening balance taken before the lot's first ledger entry.
+    """
+    product_item = models.ForeignKey('ProductItem', on_delete=models.CASCADE, related_name='stock_snapshots')
+    movement = models.ForeignKey(StockMovement, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["product_item", "taken_at"]),
+        ]
+
+    def __str__(self):
+        return f"Snapshot of lot {self.product_item_id} at {self.taken_at}: {self.balance}"
+
+
+class ForecastResult(models.Model):
+    """Latest offline demand forecast for a product, written by ``manage.py compute_forecasts``."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="forecast")
+    computed_at = models.DateTimeField(default=timezone.now)
+    method = models.CharField(max_length=30)
+    history_days = models.PositiveIntegerField()
+    horizon_days = models.PositiveIntegerField()
+    daily_forecast = models.JSONField(default=list, help_text="Forecast demand per day, starting tomorrow")
+    avg_daily_demand = models.FloatField(default=0)
+    stock_at_forecast = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    run_out_date = models.DateField(null=True, blank=True)
+    reorder_date = models.DateField(null=True, blank=True)
+    fit_seconds = models.FloatField(default=0)
+    aic = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["computed_at"]),
+            models.Index(fields=["run_out_date"]),
+        ]
+
+    def __str__(self):
+        return f"Forecast for product {self.product_id} ({self.method}) at {self.computed_at:%Y-%m-%d %H:%M}"
+
+
 class PurchaseOrderCompletionLog(models.Model):
     # Link to the original PO (optional, for traceability)
     purchase_order = models.ForeignKey(
@@ -274,3 +712,81 @@ class PurchaseOrderCompletionLog(models.Model):
 
     def __str__(self):
         return f"Completed PO - {self.product_name} ({self.product_code}) on {self.completed_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class ExportJob(models.Model):
+    """A report export run by ``manage.py run_export_worker`` and downloaded once finished."""
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    FORMAT_CSV = "csv"
+    FORMAT_EXCEL = "excel"
+    FORMAT_CHOICES = [
+        (FORMAT_CSV, "CSV"),
+        (FORMAT_EXCEL, "Excel"),
+    ]
+
+    model_name = models.CharField(max_length=50, help_text="Key in reporting MODEL_DEFINITIONS")
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="export_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    rows_total = models.PositiveIntegerField(null=True, blank=True)
+    rows_written = models.PositiveIntegerField(default=0)
+    file_path = models.CharField(max_length=255, blank=True, default="")
+    file_size = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["model_name", "export_format", "start_date", "end_date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_export_format_display()} export of {self.model_name} ({self.status})"
+
+    @property
+    def duration_seconds(self):
+        if not self.started_at:
+            return None
+        return ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+
+    @property
+    def progress(self):
+        """Fraction of rows written, or ``None`` while the total is unknown."""
+        if self.status == self.STATUS_DONE:
+            return 1.0
+        if not self.rows_total:
+            return None
+        return min(self.rows_written / self.rows_total, 1.0)
+
+
+class ActiveUserSession(models.Model):
+    """One row per signed-in session, kept current by inventory.signals and
+    ``ActiveSessionMiddleware`` so presence counts never decode session data."""
+    session_key = models.CharField(max_length=40, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="active_sessions")
+    expire_date = models.DateTimeField()
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["expire_date", "user"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user} until {self.expire_date:%Y-%m-%d %H:%M}"
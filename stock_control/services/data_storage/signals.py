@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .code_index import product_code_index
+from .models import Product, ProductCodeMapping
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCodeMapping)
+@receiver(post_delete, sender=ProductCodeMapping)
+def product_codes_changed(sender, **kwargs):
+    # Now for this connection's own reads, and again once other processes can see the change.
+    product_code_index.invalidate()
+    transaction.on_commit(product_code_index.invalidate)
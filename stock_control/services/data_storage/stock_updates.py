@@ -0,0 +1,201 @@
+"""Concurrency-safe stock changes for withdrawals and registrations.
+
+Each change runs in its own transaction that starts by locking the lot, so the
+values it computes from (``accumulated_partial`` in particular) cannot be
+overwritten by a parallel worker. PostgreSQL and MySQL use ``SELECT ... FOR
+UPDATE``; SQLite has no row locks, so a no-op write takes its database-wide
+write lock as the transaction's first statement instead. A lock conflict the
+database resolves by aborting one side (a deadlock, a serialization failure,
+SQLite's "database is locked") is retried with backoff.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from .bulk import bulk_create_with_pks
+from .ledger import record_movement, record_movements
+from .models import ProductItem, ProductStockSummary, StockMovement, StockRegistrationLog, Withdrawal
+
+LOCK_RETRY_ATTEMPTS = 5
+LOCK_RETRY_BACKOFF_SECONDS = 0.05
+# PostgreSQL serialization_failure and deadlock_detected
+RETRYABLE_PGCODES = {"40001", "40P01"}
+
+
+def is_lock_conflict(exc):
+    pgcode = getattr(exc.__cause__, "pgcode", None)
+    if pgcode in RETRYABLE_PGCODES:
+        return True
+    message = str(exc).lower()
+    return "database is locked" in message or "deadlock" in message
+
+
+def retry_on_lock_conflict(func, attempts=LOCK_RETRY_ATTEMPTS):
+    """Call ``func`` (which opens its own transaction), retrying lock conflicts.
+
+    Inside an outer transaction nothing can be retried, so the error is raised.
+    """
+    for attempt in range(attempts):
+        try:
+            return func()
+        except OperationalError as exc:
+            if attempt == attempts - 1 or connection.in_atomic_block or not is_lock_conflict(exc):
+                raise
+            time.sleep(LOCK_RETRY_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random()))
+
+
+def lock_lots(queryset):
+    """Lock the lots in ``queryset`` for the rest of the transaction and return them freshly read.
+
+    Call it first in the transaction: on SQLite the lock is only race-free
+    before anything else has been read.
+    """
+    if connection.features.has_select_for_update:
+        if connection.features.has_select_for_update_of:
+            return list(queryset.select_for_update(of=("self",)))
+        return list(queryset.select_for_update())
+    ProductItem.objects.filter(pk__in=queryset.values("pk")).update(accumulated_partial=F("accumulated_partial"))
+    return list(queryset)
+
+
+def _lock_lot(item_pk):
+    lots = lock_lots(ProductItem.objects.select_related("product", "location").filter(pk=item_pk))
+    if not lots:
+        raise ProductItem.DoesNotExist(f"ProductItem {item_pk} no longer exists")
+    return lots[0]
+
+
+def withdraw_from_lot(item_pk, *, mode="full", quantity=Decimal("0"), parts=0, user=None,
+                      withdrawal_type="unit", barcode=None, location_id=None):
+    """Withdraw from a lot and record the Withdrawal, ledger row and summaries.
+
+    ``mode`` is ``"full"`` (``quantity`` items) or ``"part"`` (``parts`` units
+    folded into ``accumulated_partial``); volume lots always withdraw
+    ``quantity``. Returns the saved Withdrawal; the lot's new values are on
+    ``withdrawal.product_item``.
+    """
+    if user is not None and not getattr(user, "is_authenticated", False):
+        user = None
+
+    def apply():
+        with transaction.atomic():
+            item = _lock_lot(item_pk)
+            withdrawal = Withdrawal(product_item=item, user=user, barcode=barcode,
+                                    withdrawal_type=withdrawal_type, location_id=location_id)
+            if item.product_feature == "volume":
+                withdrawal.quantity = Decimal(str(quantity or 0))
+            elif mode == "part":
+                total_units = item.accumulated_partial + (parts or 0)
+                full_items, item.accumulated_partial = divmod(total_units, item.units_per_quantity or 1)
+                withdrawal.quantity = Decimal(full_items)
+                withdrawal.parts_withdrawn = parts or 0
+            else:
+                withdrawal.quantity = Decimal(str(quantity or 0))
+
+            item.current_stock -= withdrawal.quantity
+            ProductItem.objects.filter(pk=item.pk).update(
+                current_stock=F("current_stock") - withdrawal.quantity,
+                accumulated_partial=item.accumulated_partial,
+            )
+            ProductStockSummary.refresh_for_product(item.product_id)
+            withdrawal.save()
+            record_movement(
+                item,
+                -withdrawal.quantity,
+                StockMovement.SOURCE_WITHDRAWAL,
+                user=user,
+                location=withdrawal.location,
+                parts_delta=-(withdrawal.parts_withdrawn or 0),
+                reference=f"Withdrawal:{withdrawal.pk}",
+            )
+            return withdrawal
+
+    return retry_on_lock_conflict(apply)
+
+
+def register_to_lot(item_pk, quantity=Decimal("1"), *, user=None, barcode="", delivery_datetime=None, location=None):
+    """Add ``quantity`` units to a lot and record the registration log and ledger row.
+
+    Returns the StockRegistrationLog; the lot's new stock is on ``log.product_item``.
+    """
+    if user is not None and not getattr(user, "is_authenticated", False):
+        user = None
+    quantity = Decimal(str(quantity))
+
+    def apply():
+        with transaction.atomic():
+            item = _lock_lot(item_pk)
+            ProductItem.objects.filter(pk=item.pk).update(current_stock=F("current_stock") + quantity)
+            item.current_stock += quantity
+            ProductStockSummary.refresh_for_product(item.product_id)
+            log_location = location or item.location
+            registration = StockRegistrationLog.objects.create(
+                product_item=item,
+                quantity=quantity,
+                user=user,
+                barcode=barcode,
+                delivery_datetime=delivery_datetime,
+                location=log_location,
+            )
+            record_movement(
+                item,
+                quantity,
+                StockMovement.SOURCE_REGISTRATION,
+                user=user,
+                location=log_location,
+                reference=f"StockRegistrationLog:{registration.pk}",
+            )
+            return registration
+
+    return retry_on_lock_conflict(apply)
+
+
+def register_to_lots(quantities, *, user=None, barcodes=None, delivery_datetime=None, location=None):
+    """Register several lots in one transaction: ``quantities`` maps lot pk to units to add.
+
+    Each lot gets one UPDATE and one StockRegistrationLog for its total; the
+    logs, ledger rows and summaries are written in bulk. ``barcodes`` maps lot
+    pk to the barcode stored on its log. Returns the logs in lot pk order; lots
+    that no longer exist are skipped.
+    """
+    if user is not None and not getattr(user, "is_authenticated", False):
+        user = None
+    quantities = {pk: Decimal(str(quantity)) for pk, quantity in quantities.items()}
+    barcodes = barcodes or {}
+
+    def apply():
+        with transaction.atomic():
+            items = lock_lots(ProductItem.objects.select_related("product", "location")
+                              .filter(pk__in=list(quantities)).order_by("pk"))
+            logs = []
+            for item in items:
+                quantity = quantities[item.pk]
+                ProductItem.objects.filter(pk=item.pk).update(current_stock=F("current_stock") + quantity)
+                item.current_stock += quantity
+                # bulk_create skips StockRegistrationLog.save, so denormalise here
+                logs.append(StockRegistrationLog(
+                    product_item=item,
+                    quantity=quantity,
+                    user=user,
+                    barcode=barcodes.get(item.pk, ""),
+                    delivery_datetime=delivery_datetime,
+                    location=location or item.location,
+                    product_code=item.product.product_code,
+                    product_name=item.product.name,
+                    lot_number=item.lot_number,
+                    expiry_date=item.expiry_date,
+                ))
+            if not logs:
+                return []
+            logs = bulk_create_with_pks(StockRegistrationLog, logs)
+            record_movements([
+                (log.product_item, log.quantity, 0, log.location, f"StockRegistrationLog:{log.pk}")
+                for log in logs
+            ], StockMovement.SOURCE_REGISTRATION, user=user)
+            ProductStockSummary.refresh_for_products(item.product_id for item in items)
+            return logs
+
+    return retry_on_lock_conflict(apply)
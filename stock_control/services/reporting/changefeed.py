@@ -0,0 +1,110 @@
+"""Read-only JSON changefeed for downstream ETL.
+
+Each feed pages with a keyset cursor over an indexed column, so a poll costs
+one index range scan of at most ``limit`` rows however large the table is.
+Append-only logs page on ``id``; purchase orders change status after they are
+created, so they page on ``(updated_at, id)``.
+"""
+import datetime
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from inventory.access_control import group_required
+from services.data_storage.keyset import decode_cursor, encode_cursor
+from services.data_storage.models import (
+    PurchaseOrder,
+    PurchaseOrderCompletionLog,
+    StockRegistrationLog,
+    Withdrawal,
+)
+
+CHANGEFEED_DEFAULT_LIMIT = 500
+CHANGEFEED_MAX_LIMIT = 5000
+# Rows updated within this window are held back so a transaction that commits
+# slightly later with an older updated_at cannot slip behind a client's cursor.
+CHANGEFEED_SETTLE_SECONDS = 2
+
+FEEDS = {
+    'withdrawals': {'model': Withdrawal, 'cursor_field': 'id'},
+    'stock-registrations': {'model': StockRegistrationLog, 'cursor_field': 'id'},
+    'purchase-orders': {'model': PurchaseOrder, 'cursor_field': 'updated_at'},
+    'purchase-order-completions': {'model': PurchaseOrderCompletionLog, 'cursor_field': 'id'},
+}
+
+
+def read_feed(feed_name, cursor=None, limit=CHANGEFEED_DEFAULT_LIMIT):
+    """Return ``(rows, next_cursor, has_more)`` for the rows after ``cursor``.
+
+    With no rows left, ``next_cursor`` is the cursor that was passed in so the
+    client can keep polling with it.
+    """
+    feed = FEEDS[feed_name]
+    model = feed['model']
+    fields = [field.attname for field in model._meta.fields]
+    qs = model.objects.all()
+
+    if feed['cursor_field'] == 'id':
+        if cursor is not None:
+            try:
+                (last_id,) = decode_cursor(cursor)
+                last_id = int(last_id)
+            except (TypeError, ValueError) as exc:
+                raise ValueError("Malformed cursor") from exc
+            qs = qs.filter(id__gt=last_id)
+        qs = qs.order_by('id')
+    else:
+        qs = qs.filter(updated_at__lte=timezone.now() - datetime.timedelta(seconds=CHANGEFEED_SETTLE_SECONDS))
+        if cursor is not None:
+            try:
+                last_updated, last_id = decode_cursor(cursor)
+                last_updated = parse_datetime(last_updated) if isinstance(last_updated, str) else None
+                last_id = int(last_id)
+            except (TypeError, ValueError) as exc:
+                raise ValueError("Malformed cursor") from exc
+            if last_updated is None:
+                raise ValueError("Malformed cursor")
+            # Same as (updated_at, id) > (last_updated, last_id), written as a
+            # range so the (updated_at, id) index is used.
+            qs = qs.filter(updated_at__gte=last_updated).exclude(Q(updated_at=last_updated) & Q(id__lte=last_id))
+        qs = qs.order_by('updated_at', 'id')
+
+    rows = list(qs.values(*fields)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return rows, cursor, False
+    last = rows[-1]
+    if feed['cursor_field'] == 'id':
+        next_cursor = encode_cursor([last['id']])
+    else:
+        next_cursor = encode_cursor([last['updated_at'].isoformat(), last['id']])
+    return rows, next_cursor, has_more
+
+
+@login_required
+@group_required(["Admin", "Staff"])
+def changefeed(request, feed):
+    """``GET reporting/changefeed/<feed>/?cursor=...&limit=...``"""
+    if feed not in FEEDS:
+        return JsonResponse({"error": "Unknown feed", "feeds": sorted(FEEDS)}, status=404)
+    try:
+        limit = int(request.GET.get('limit', CHANGEFEED_DEFAULT_LIMIT))
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    limit = min(max(limit, 1), CHANGEFEED_MAX_LIMIT)
+
+    try:
+        rows, next_cursor, has_more = read_feed(feed, request.GET.get('cursor') or None, limit)
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return JsonResponse({
+        "feed": feed,
+        "count": len(rows),
+        "results": rows,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    })
@@ -0,0 +1,191 @@
+"""Background report exports: queue an ``ExportJob``, run it in a worker, serve the file.
+
+``request_export`` is called by the report page, ``run_next_job`` by
+``manage.py run_export_worker``. Artifacts are written under
+``settings.EXPORT_ROOT``.
+"""
+import datetime
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from services.data_storage.models import ExportJob
+from services.reporting.exports import (
+    MODEL_DEFINITIONS,
+    csv_lines,
+    export_columns,
+    iter_export_rows,
+    report_meta_rows,
+    report_queryset,
+    write_xlsx,
+)
+
+# rows_written is saved at most this often while a job runs.
+PROGRESS_EVERY_ROWS = 5000
+FILE_EXTENSIONS = {
+    ExportJob.FORMAT_CSV: "csv",
+    ExportJob.FORMAT_EXCEL: "xlsx",
+}
+
+
+def export_root():
+    return str(getattr(settings, "EXPORT_ROOT", os.path.join(settings.BASE_DIR, "exports")))
+
+
+def _is_reusable(job, today):
+    """A finished job can be served again if its file exists and its data cannot have changed.
+
+    Ranges that end before today are closed for append-only models (logs whose
+    rows are never edited); anything else, purchase orders included, is only
+    reused for ``EXPORT_JOB_REUSE_SECONDS`` after it finished.
+    """
+    if not job.file_path or not os.path.exists(job.file_path):
+        return False
+    append_only = MODEL_DEFINITIONS[job.model_name].get('append_only', False)
+    if append_only and job.end_date is not None and job.end_date < today:
+        return True
+    max_age = getattr(settings, "EXPORT_JOB_REUSE_SECONDS", 15 * 60)
+    return job.finished_at is not None and (timezone.now() - job.finished_at).total_seconds() <= max_age
+
+
+def request_export(model_name, export_format, start_date=None, end_date=None, user=None):
+    """Return ``(job, reused)`` for an export, queueing a new job only when needed.
+
+    An identical job that is still queued or running is shared, as is a finished
+    one whose file is still valid (see ``_is_reusable``).
+    """
+    definition = MODEL_DEFINITIONS[model_name]
+    if not definition.get('date_field'):
+        start_date = end_date = None
+    same = ExportJob.objects.filter(
+        model_name=model_name,
+        export_format=export_format,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    in_flight = same.filter(status__in=[ExportJob.STATUS_QUEUED, ExportJob.STATUS_RUNNING]).order_by('created_at').first()
+    if in_flight is not None:
+        return in_flight, True
+    today = timezone.localdate()
+    for job in same.filter(status=ExportJob.STATUS_DONE).order_by('-finished_at')[:3]:
+        if _is_reusable(job, today):
+            return job, True
+
+    if user is not None and not getattr(user, 'is_authenticated', False):
+        user = None
+    job = ExportJob.objects.create(
+        model_name=model_name,
+        export_format=export_format,
+        start_date=start_date,
+        end_date=end_date,
+        requested_by=user,
+    )
+    return job, False
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running and return it, or ``None``.
+
+    The conditional update means two workers can never pick up the same job.
+    """
+    while True:
+        job = ExportJob.objects.filter(status=ExportJob.STATUS_QUEUED).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        started_at = timezone.now()
+        claimed = ExportJob.objects.filter(pk=job.pk, status=ExportJob.STATUS_QUEUED).update(
+            status=ExportJob.STATUS_RUNNING, started_at=started_at,
+        )
+        if claimed:
+            job.status, job.started_at = ExportJob.STATUS_RUNNING, started_at
+            return job
+
+
+def requeue_stale_jobs(older_than):
+    """Put jobs left running by a worker that died back in the queue."""
+    cutoff = timezone.now() - datetime.timedelta(seconds=older_than)
+    return ExportJob.objects.filter(status=ExportJob.STATUS_RUNNING).filter(
+        Q(started_at__lt=cutoff) | Q(started_at__isnull=True)
+    ).update(status=ExportJob.STATUS_QUEUED, started_at=None, rows_written=0)
+
+
+def _track_progress(job, rows):
+    written = 0
+    for row in rows:
+        yield row
+        written += 1
+        if written % PROGRESS_EVERY_ROWS == 0:
+            ExportJob.objects.filter(pk=job.pk).update(rows_written=written)
+    job.rows_written = written
+
+
+def run_export_job(job):
+    """Write the job's artifact to disk and record the outcome on the job."""
+    definition = MODEL_DEFINITIONS[job.model_name]
+    model_class = apps.get_model(*definition['model_path'].split('.'))
+    start_date = job.start_date.isoformat() if job.start_date else None
+    end_date = job.end_date.isoformat() if job.end_date else None
+    qs = report_queryset(definition, start_date, end_date)
+    columns = export_columns(model_class)
+    user_name = getattr(job.requested_by, 'username', '') or 'Anonymous'
+    meta_rows = report_meta_rows(user_name, start_date, end_date)
+
+    directory = export_root()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"export_{job.pk}_{job.model_name.lower()}.{FILE_EXTENSIONS[job.export_format]}")
+    partial_path = f"{path}.part"
+
+    started = time.perf_counter()
+    try:
+        job.rows_total = qs.count()
+        ExportJob.objects.filter(pk=job.pk).update(rows_total=job.rows_total)
+        rows = _track_progress(job, iter_export_rows(qs, columns))
+        headers = [column.name for column in columns]
+        if job.export_format == ExportJob.FORMAT_EXCEL:
+            with open(partial_path, 'wb') as fh:
+                write_xlsx(fh, job.model_name, meta_rows, headers, rows)
+        else:
+            with open(partial_path, 'w', newline='', encoding='utf-8') as fh:
+                fh.writelines(csv_lines(meta_rows, headers, rows))
+        os.replace(partial_path, path)
+    except Exception as exc:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        job.status = ExportJob.STATUS_FAILED
+        job.error = f"{type(exc).__name__}: {exc}"
+    else:
+        job.status = ExportJob.STATUS_DONE
+        job.file_path = path
+        job.file_size = os.path.getsize(path)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'file_path', 'file_size', 'rows_total', 'rows_written', 'finished_at'])
+    return job, time.perf_counter() - started
+
+
+def run_next_job():
+    """Claim and run one queued job. Returns ``(job, seconds)`` or ``None`` when the queue is empty."""
+    job = claim_next_job()
+    if job is None:
+        return None
+    return run_export_job(job)
+
+
+def job_payload(job, reused=False):
+    """JSON-ready status for the report page's polling."""
+    return {
+        "id": job.pk,
+        "model": job.model_name,
+        "format": job.export_format,
+        "status": job.status,
+        "rows_written": job.rows_written,
+        "rows_total": job.rows_total,
+        "progress": job.progress,
+        "duration_seconds": job.duration_seconds,
+        "file_size": job.file_size,
+        "error": job.error,
+        "reused": reused,
+    }
@@ -1,51 +1,37 @@
-import io
-import csv
+import os
 import zipfile
 import datetime
 from django.apps import apps
-from django.http import HttpResponse
-from django.shortcuts import render
-from django.utils.timezone import make_aware
-from openpyxl import Workbook
-from openpyxl.styles import Font
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from inventory.access_control import group_required
 
 from services.data_storage.models import (
+    ExportJob,
     Product,
     Withdrawal,
     PurchaseOrder,
     StockRegistrationLog,
 )  # Adjust as needed
-
-
-MODEL_DEFINITIONS = {
-    'Withdrawal': {
-        'label': 'Withdrawals',
-        'model_path': 'data_storage.Withdrawal',
-        'date_field': 'timestamp',
-    },
-    'Product': {
-        'label': 'Products',
-        'model_path': 'data_storage.Product',
-    },
-    'PurchaseOrder': {
-        'label': 'Purchase Orders',
-        'model_path': 'data_storage.PurchaseOrder',
-        'date_field': 'order_date',
-    },
-    'StockRegistrationLog': {
-        'label': 'Stock Registration Logs (Check-ins)',
-        'model_path': 'data_storage.StockRegistrationLog',
-        'date_field': 'timestamp',
-    },
-    'DeletedLot': {
-        'label': 'Deleted Lots',
-        'model_path': 'data_storage.Withdrawal',
-        'date_field': 'timestamp',
-        'base_filters': {
-            'withdrawal_type': 'lot_discard',
-        },
-    },
-}
+from services.reporting.exports import (
+    COLUMNAR_FORMATS,
+    MODEL_DEFINITIONS,
+    XLSX_CONTENT_TYPE,
+    columnar_export_file,
+    columnar_exports_available,
+    column_values,
+    export_columns,
+    report_meta_rows,
+    report_queryset,
+    stream_bundle,
+    stream_csv,
+    xlsx_export_file,
+)
+from services.reporting.jobs import job_payload, request_export
 
 
 MODEL_MAP = {name: meta['model_path'] for name, meta in MODEL_DEFINITIONS.items()}
@@ -53,6 +39,15 @@ MODEL_LABELS = {name: meta['label'] for name, meta in MODEL_DEFINITIONS.items()}
 MODEL_CHOICES = [(name, meta['label']) for name, meta in MODEL_DEFINITIONS.items()]
 
 
+# Export jobs are shared between everyone who asks for the same data, so they
+# are open to the report page's audience (Admin, as in the navbar) and no one else.
+EXPORT_JOB_GROUPS = ["Admin"]
+
+PREVIEW_PAGE_SIZE = 25
+PREVIEW_DEFAULT_SORT = '-id'
+# The preview counts at most this many matching rows ("10000+" beyond that).
+PREVIEW_COUNT_CAP = 10000
+
 FILTER_FIELDS = {
     name: meta['date_field']
     for name, meta in MODEL_DEFINITIONS.items()
@@ -68,106 +63,194 @@ def download_report(request):
     end_date = request.GET.get('end_date')
     download_type = request.GET.get('download')
 
-    preview_model_class = apps.get_model(*MODEL_MAP[selected_model].split('.'))
-    base_filters = MODEL_DEFINITIONS[selected_model].get('base_filters', {})
-    preview_fields = [f.name for f in preview_model_class._meta.fields]
-
-    if base_filters:
-        preview_queryset = preview_model_class.objects.filter(**base_filters)
-    else:
-        preview_queryset = preview_model_class.objects.all()
-
-    # Filter preview table if model supports date filtering
-    if selected_model in FILTER_FIELDS:
-        date_field = FILTER_FIELDS[selected_model]
-        if start_date:
-            preview_queryset = preview_queryset.filter(
-                **{f"{date_field}__gte": make_aware(datetime.datetime.strptime(start_date, "%Y-%m-%d"))}
-            )
-        if end_date:
-            preview_queryset = preview_queryset.filter(
-                **{f"{date_field}__lte": make_aware(datetime.datetime.strptime(end_date, "%Y-%m-%d"))}
-            )
+    definition = MODEL_DEFINITIONS[selected_model]
 
-    # ✅ THEN slice it
-    preview_queryset = preview_queryset.order_by('-id')
+    # Bundle every model for the chosen date range into one ZIP
+    if download_type == 'bundle':
+        user_name = getattr(request.user, 'username', '') or 'Anonymous'
+        today_str = datetime.date.today().strftime('%Y-%m-%d')
+        meta_rows = report_meta_rows(user_name, start_date, end_date)
+        response = StreamingHttpResponse(
+            stream_bundle(MODEL_DEFINITIONS, start_date, end_date, meta_rows),
+            content_type='application/zip',
+        )
+        response['Content-Disposition'] = f'attachment; filename=report_bundle_{today_str}.zip'
+        return response
 
+    # Typed columnar downloads (Parquet / Arrow IPC) for loading into pandas
+    if download_type in COLUMNAR_FORMATS:
+        if not columnar_exports_available():
+            return HttpResponse("Parquet and Arrow exports need the optional 'pyarrow' package.",
+                                status=501, content_type='text/plain')
+        model_class = apps.get_model(*MODEL_MAP[selected_model].split('.'))
+        user_name = getattr(request.user, 'username', '') or 'Anonymous'
+        today_str = datetime.date.today().strftime('%Y-%m-%d')
+        extension, content_type = COLUMNAR_FORMATS[download_type]
+        export_file = columnar_export_file(
+            report_queryset(definition, start_date, end_date),
+            model_class,
+            download_type,
+            report_meta_rows(user_name, start_date, end_date),
+        )
+        return FileResponse(
+            export_file,
+            as_attachment=True,
+            filename=f'report_{selected_model.lower()}_{today_str}.{extension}',
+            content_type=content_type,
+        )
 
     # Handle Excel or CSV download (only for the selected model + date range)
     if download_type in ['excel', 'csv']:
         model_path = MODEL_MAP[selected_model]
         model_class = apps.get_model(*model_path.split('.'))
-        fields = [f.name for f in model_class._meta.fields]
-        qs = model_class.objects.filter(**base_filters) if base_filters else model_class.objects.all()
-
-        if selected_model in FILTER_FIELDS:
-            date_field = FILTER_FIELDS[selected_model]
-            if start_date:
-                qs = qs.filter(
-                    **{f"{date_field}__gte": make_aware(datetime.datetime.strptime(start_date, "%Y-%m-%d"))}
-                )
-            if end_date:
-                qs = qs.filter(
-                    **{f"{date_field}__lte": make_aware(datetime.datetime.strptime(end_date, "%Y-%m-%d"))}
-                )
+        qs = report_queryset(definition, start_date, end_date)
 
         # Prepare meta
         user_name = getattr(request.user, 'username', '') or 'Anonymous'
         today_str = datetime.date.today().strftime('%Y-%m-%d')
-        if start_date or end_date:
-            range_str = f"{start_date or '—'} to {end_date or '—'}"
-        else:
-            range_str = "All dates"
+        meta_rows = report_meta_rows(user_name, start_date, end_date)
 
         if download_type == 'excel':
-            wb = Workbook()
-            # openpyxl creates a default sheet; write into it and rename for cleanliness
-            ws = wb.active
-            ws.title = selected_model
-            # Top meta rows (bold)
-            bold = Font(bold=True)
-            ws.append(["Downloaded by", user_name])
-            ws.append(["Download date", today_str])
-            ws.append(["Date range", range_str])
-            for cell in ws[1] + ws[2] + ws[3]:
-                cell.font = bold
-            ws.append([])  # blank spacer
-            # Header row
-            ws.append(fields)
-            for cell in ws[5]:
-                cell.font = bold
-            for obj in qs:
-                ws.append([str(getattr(obj, field, '')) for field in fields])
-
-            out = io.BytesIO()
-            wb.save(out)
-            out.seek(0)
-            response = HttpResponse(out, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename=report_{selected_model.lower()}_{today_str}.xlsx'
-            return response
+            # Write-only workbook fed from the same chunked rows as the CSV export,
+            # spooled to a temp file once it outgrows memory.
+            export_file = xlsx_export_file(qs, export_columns(model_class), selected_model, meta_rows)
+            return FileResponse(
+                export_file,
+                as_attachment=True,
+                filename=f'report_{selected_model.lower()}_{today_str}.xlsx',
+                content_type=XLSX_CONTENT_TYPE,
+            )
 
         elif download_type == 'csv':
-            csv_buffer = io.StringIO()
-            writer = csv.writer(csv_buffer)
-            # Meta rows
-            writer.writerow(["Downloaded by", user_name])
-            writer.writerow(["Download date", today_str])
-            writer.writerow(["Date range", range_str])
-            writer.writerow([])
-            # Header row
-            writer.writerow(fields)
-            for obj in qs:
-                writer.writerow([str(getattr(obj, field, '')) for field in fields])
-            response = HttpResponse(csv_buffer.getvalue(), content_type='text/csv')
+            # Stream rows straight from a chunked values_list query: FKs are joined
+            # in SQL and memory stays flat however many rows are exported.
+            rows = stream_csv(qs, export_columns(model_class), meta_rows)
+            response = StreamingHttpResponse(rows, content_type='text/csv')
             response['Content-Disposition'] = f'attachment; filename=report_{selected_model.lower()}_{today_str}.csv'
             return response
 
+    preview = _preview_page(
+        report_queryset(definition, start_date, end_date),
+        apps.get_model(*MODEL_MAP[selected_model].split('.')),
+        request.GET.get('sort'),
+        request.GET.get('page'),
+    )
+    preview_params = QueryDict(mutable=True)
+    for key, value in (('model', selected_model), ('start_date', start_date), ('end_date', end_date)):
+        if value:
+            preview_params[key] = value
+    sort_params = preview_params.copy()
+    if preview['sort'] != PREVIEW_DEFAULT_SORT:
+        preview_params['sort'] = preview['sort']
+
     return render(request, 'inventory/download_report.html', {
         'model_options': MODEL_CHOICES,
         'selected_model': selected_model,
         'selected_model_label': MODEL_LABELS.get(selected_model, selected_model),
-        'fields': preview_fields,
-        'data': preview_queryset,
+        'fields': preview['fields'],
+        'data': preview['rows'],
+        'preview': preview,
+        'preview_query': preview_params.urlencode(),
+        'sort_query': sort_params.urlencode(),
         'start_date': start_date,
         'end_date': end_date,
+        'columnar_exports_available': columnar_exports_available(),
     })
+
+
+def _preview_page(queryset, model_class, sort, page_number, per_page=PREVIEW_PAGE_SIZE):
+    """One sorted page of preview rows plus a bounded row count.
+
+    Only the displayed columns are fetched, with foreign keys joined in the same
+    query. The total is counted up to ``PREVIEW_COUNT_CAP`` rows so the preview
+    never scans a whole large table just to print a number.
+    """
+    columns = export_columns(model_class)
+    by_name = {column.name: column for column in columns}
+    if not sort or sort.lstrip('-') not in by_name:
+        sort = PREVIEW_DEFAULT_SORT
+    descending = sort.startswith('-')
+    sort_lookup = by_name[sort.lstrip('-')].lookups[0]
+    ordering = [f"-{sort_lookup}", '-pk'] if descending else [sort_lookup, 'pk']
+
+    try:
+        number = max(int(page_number), 1)
+    except (TypeError, ValueError):
+        number = 1
+    number = min(number, PREVIEW_COUNT_CAP // per_page)
+
+    total = queryset[:PREVIEW_COUNT_CAP + 1].count()
+    last_page = max((min(total, PREVIEW_COUNT_CAP) + per_page - 1) // per_page, 1)
+    number = min(number, last_page)
+    offset = (number - 1) * per_page
+
+    lookups, to_row = column_values(columns)
+    rows = [to_row(raw) for raw in queryset.order_by(*ordering).values_list(*lookups)[offset:offset + per_page]]
+    return {
+        'fields': [column.name for column in columns],
+        'rows': rows,
+        'sort': sort,
+        'number': number,
+        'has_previous': number > 1,
+        'has_next': number < last_page,
+        'previous_page_number': number - 1,
+        'next_page_number': number + 1,
+        'start_index': offset + 1 if rows else 0,
+        'end_index': offset + len(rows),
+        'total': min(total, PREVIEW_COUNT_CAP),
+        'total_is_estimate': total > PREVIEW_COUNT_CAP,
+    }
+
+
+def _export_job_response(job, reused=False, status=200):
+    payload = job_payload(job, reused)
+    payload["status_url"] = reverse('reporting:export_job_status', args=[job.pk])
+    if job.status == ExportJob.STATUS_DONE:
+        payload["download_url"] = reverse('reporting:download_export_job', args=[job.pk])
+    return JsonResponse(payload, status=status)
+
+
+@login_required
+@group_required(EXPORT_JOB_GROUPS)
+@require_POST
+def create_export_job(request):
+    """Queue a background export (or reuse an identical one) and return its status as JSON."""
+    selected_model = request.POST.get('model')
+    export_format = request.POST.get('format')
+    if selected_model not in MODEL_MAP:
+        return JsonResponse({"error": "Unknown model"}, status=400)
+    if export_format not in dict(ExportJob.FORMAT_CHOICES):
+        return JsonResponse({"error": "Unknown export format"}, status=400)
+    try:
+        start_date, end_date = (
+            datetime.datetime.strptime(value, "%Y-%m-%d").date() if value else None
+            for value in (request.POST.get('start_date'), request.POST.get('end_date'))
+        )
+    except ValueError:
+        return JsonResponse({"error": "Dates must be YYYY-MM-DD"}, status=400)
+
+    job, reused = request_export(selected_model, export_format, start_date, end_date, request.user)
+    return _export_job_response(job, reused, status=200 if reused else 202)
+
+
+@login_required
+@group_required(EXPORT_JOB_GROUPS)
+def export_job_status(request, job_id):
+    job = get_object_or_404(ExportJob, pk=job_id)
+    return _export_job_response(job)
+
+
+@login_required
+@group_required(EXPORT_JOB_GROUPS)
+def download_export_job(request, job_id):
+    job = get_object_or_404(ExportJob, pk=job_id, status=ExportJob.STATUS_DONE)
+    if not job.file_path or not os.path.exists(job.file_path):
+        raise Http404("Export file is no longer available")
+    extension = os.path.splitext(job.file_path)[1]
+    day = job.finished_at.date().strftime('%Y-%m-%d')
+    return FileResponse(
+        open(job.file_path, 'rb'),
+        as_attachment=True,
+        filename=f'report_{job.model_name.lower()}_{day}{extension}',
+        content_type=XLSX_CONTENT_TYPE if job.export_format == ExportJob.FORMAT_EXCEL else 'text/csv',
+    )
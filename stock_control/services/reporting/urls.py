@@ -1,10 +1,15 @@
 from django.urls import include, path
-from services.reporting.reporting import download_report
+from services.reporting.changefeed import changefeed
+from services.reporting.reporting import create_export_job, download_export_job, download_report, export_job_status
 
 app_name = 'reporting'
 
 urlpatterns = [
     path('download_report/', download_report, name='download_report'),
+    path('export_jobs/', create_export_job, name='create_export_job'),
+    path('export_jobs/<int:job_id>/', export_job_status, name='export_job_status'),
+    path('export_jobs/<int:job_id>/download/', download_export_job, name='download_export_job'),
+    path('changefeed/<slug:feed>/', changefeed, name='changefeed'),
     path('stock-withdrawals/', include(('services.reporting_stock_withdrawal.urls', 'reporting_stock_withdrawal'), namespace='reporting_stock_withdrawal')),
     path('stock-inputs/', include(('services.reporting_stock_input.urls', 'reporting_stock_input'), namespace='reporting_stock_input')),
 ]
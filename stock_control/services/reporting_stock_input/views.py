@@ -1,7 +1,11 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import get_user_model
+from django.db.models import CharField, Exists, F, OuterRef, Value
+from django.db.models.functions import Coalesce
+from django.http import QueryDict
 from django.shortcuts import render
 
+from services.data_storage.keyset import keyset_page, local_day_bounds
 from services.data_storage.models import Location, StockRegistrationLog
 
 
@@ -9,33 +13,63 @@ def _is_admin(user):
     return user.is_authenticated and user.is_staff
 
 
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 @login_required
 @user_passes_test(_is_admin, login_url='inventory:dashboard')
 def track_stock_registries(request):
     location_id = request.GET.get('location_id') or ''
     user_id = request.GET.get('user_id') or ''
+    date_from = request.GET.get('date_from') or ''
+    date_to = request.GET.get('date_to') or ''
+
+    # Only the displayed columns, with location and user names joined in SQL
     registrations = (StockRegistrationLog.objects
-                     .select_related('product_item', 'user', 'location', 'product_item__location')
-                     .order_by('-timestamp'))
-    if location_id:
-        try:
-            registrations = registrations.filter(location_id=int(location_id))
-        except (TypeError, ValueError):
-            pass
-
-    if user_id:
-        try:
-            registrations = registrations.filter(user_id=int(user_id))
-        except (TypeError, ValueError):
-            pass
+                     .only('timestamp', 'delivery_datetime', 'product_name', 'product_code', 'quantity', 'barcode')
+                     .annotate(
+                         location_name=Coalesce('location__name', 'product_item__location__name',
+                                                Value('Central'), output_field=CharField()),
+                         username=F('user__username'),
+                     ))
+    # Filters match the (location|user, timestamp, id) indexes
+    if _int_or_none(location_id) is not None:
+        registrations = registrations.filter(location_id=int(location_id))
+    if _int_or_none(user_id) is not None:
+        registrations = registrations.filter(user_id=int(user_id))
+    start, end = local_day_bounds(date_from, date_to)
+    if start:
+        registrations = registrations.filter(timestamp__gte=start)
+    if end:
+        registrations = registrations.filter(timestamp__lt=end)
+
+    try:
+        page = keyset_page(registrations, after=request.GET.get('after'), before=request.GET.get('before'))
+    except ValueError:
+        page = keyset_page(registrations)
+
+    filters = QueryDict(mutable=True)
+    for key, value in (('location_id', location_id), ('user_id', user_id), ('date_from', date_from), ('date_to', date_to)):
+        if value:
+            filters[key] = value
 
     locations = Location.objects.all().order_by('name')
     User = get_user_model()
-    users = User.objects.filter(stockregistrationlog__isnull=False).distinct().order_by('username')
+    users = (User.objects
+             .filter(Exists(StockRegistrationLog.objects.filter(user_id=OuterRef('pk'))))
+             .order_by('username'))
     return render(request, 'reporting/track_stock_registries.html', {
-        'registrations': registrations,
+        'registrations': page,
+        'page': page,
+        'filter_query': filters.urlencode(),
         'locations': locations,
         'users': users,
         'selected_location_id': str(location_id),
         'selected_user_id': str(user_id),
+        'date_from': date_from,
+        'date_to': date_to,
     })
@@ -1,6 +1,11 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth import get_user_model
+from django.db.models import CharField, Exists, F, IntegerField, OuterRef, Q, Value
+from django.db.models.functions import Cast, Coalesce, Floor
+from django.http import QueryDict
 from django.shortcuts import render
 
+from services.data_storage.keyset import keyset_page, local_day_bounds
 from services.data_storage.models import Withdrawal, Location
 
 
@@ -8,26 +13,68 @@ def _is_admin(user):
     return user.is_authenticated and user.is_staff
 
 
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 @login_required
 @user_passes_test(_is_admin, login_url='inventory:dashboard')
 def track_withdrawals(request):
     location_id = request.GET.get('location_id') or ''
+    user_id = request.GET.get('user_id') or ''
+    date_from = request.GET.get('date_from') or ''
+    date_to = request.GET.get('date_to') or ''
+
+    # Only the displayed columns, with the per-row values computed in SQL
     withdrawals = (Withdrawal.objects
-                   .select_related('product_item', 'user', 'product_item__location')
-                   .order_by('-timestamp'))
-    if location_id:
-        try:
-            withdrawals = withdrawals.filter(product_item__location_id=int(location_id))
-        except (TypeError, ValueError):
-            pass
-
-    for withdrawal in withdrawals:
-        withdrawal.full_items = withdrawal.get_full_items_withdrawn()
-        withdrawal.partial_items = withdrawal.get_partial_items_withdrawn()
+                   .only('timestamp', 'product_name', 'withdrawal_type', 'barcode')
+                   .annotate(
+                       full_items=Cast(Floor('quantity'), IntegerField()),
+                       partial_items=F('parts_withdrawn'),
+                       location_name=Coalesce('location__name', 'product_item__location__name',
+                                              Value('Central'), output_field=CharField()),
+                       username=F('user__username'),
+                   ))
+    # Filters match the (location|user, timestamp, id) indexes. Rows without a
+    # withdrawal location are shown (and so filtered) under their lot's location.
+    if _int_or_none(location_id) is not None:
+        withdrawals = withdrawals.filter(
+            Q(location_id=int(location_id))
+            | Q(location__isnull=True, product_item__location_id=int(location_id))
+        )
+    if _int_or_none(user_id) is not None:
+        withdrawals = withdrawals.filter(user_id=int(user_id))
+    start, end = local_day_bounds(date_from, date_to)
+    if start:
+        withdrawals = withdrawals.filter(timestamp__gte=start)
+    if end:
+        withdrawals = withdrawals.filter(timestamp__lt=end)
+
+    try:
+        page = keyset_page(withdrawals, after=request.GET.get('after'), before=request.GET.get('before'))
+    except ValueError:
+        page = keyset_page(withdrawals)
+
+    filters = QueryDict(mutable=True)
+    for key, value in (('location_id', location_id), ('user_id', user_id), ('date_from', date_from), ('date_to', date_to)):
+        if value:
+            filters[key] = value
 
     locations = Location.objects.all().order_by('name')
+    users = (get_user_model().objects
+             .filter(Exists(Withdrawal.objects.filter(user_id=OuterRef('pk'))))
+             .order_by('username'))
     return render(request, 'reporting/track_withdrawals.html', {
-        'withdrawals': withdrawals,
+        'withdrawals': page,
+        'page': page,
+        'filter_query': filters.urlencode(),
         'locations': locations,
+        'users': users,
         'selected_location_id': str(location_id),
+        'selected_user_id': str(user_id),
+        'date_from': date_from,
+        'date_to': date_to,
     })
@@ -23,33 +23,29 @@ document.addEventListener("DOMContentLoaded", function () {
     return out;
   }
 
-  async function parseRemote(raw) {
-    const response = await fetch(`/data/parse-barcode/?raw=${encodeURIComponent(raw)}`);
+  // One round trip: parsed fields, the resolved product and its FEFO lots
+  async function resolveRemote(raw) {
+    const response = await fetch(`/data/resolve-scan/?raw=${encodeURIComponent(raw)}`, { credentials: "same-origin" });
     const json = await response.json().catch(() => ({}));
-    if (!response.ok) throw new Error(json.error || "Barcode parsing failed");
+    if (response.status === 404 && json.parsed) return json;
+    if (!response.ok) throw new Error(json.error || "Barcode resolution failed");
     return json;
   }
 
-  async function hydrateProductDetails(code) {
-    try {
-      const productResponse = await fetch(`/data/get-product-by-barcode/?barcode=${encodeURIComponent(code)}`);
-      if (!productResponse.ok) return;
-      const product = await productResponse.json();
-      const nameEl = document.getElementById("id_product_name");
-      if (nameEl) nameEl.value = product.name || "";
-      const stockEl = document.getElementById("stock-display");
-      if (stockEl) stockEl.textContent = product.stock ?? "";
-      const unitsDisp = document.getElementById("units-display");
-      if (unitsDisp) unitsDisp.textContent = product.units_per_quantity ?? "";
-      const unitsInput = document.getElementById("id_units_per_quantity");
-      if (unitsInput) unitsInput.value = product.units_per_quantity ?? "";
-      const codeHidden = document.getElementById("parsed_product_code_hidden");
-      if (codeHidden) codeHidden.value = code || "";
-      const volumeSection = document.getElementById("volume-withdrawal-section");
-      if (volumeSection) volumeSection.style.display = (product.product_feature === "volume") ? "block" : "none";
-    } catch (e) {
-      console.warn("Failed to hydrate product details", e);
-    }
+  function fillProductDetails(product, lots) {
+    const lot = lots.find((candidate) => candidate.matches_scan) || lots[0] || null;
+    const nameEl = document.getElementById("id_product_name");
+    if (nameEl) nameEl.value = product.name || "";
+    const stockEl = document.getElementById("stock-display");
+    if (stockEl) stockEl.textContent = lot ? lot.current_stock : "0";
+    const unitsDisp = document.getElementById("units-display");
+    if (unitsDisp) unitsDisp.textContent = lot ? lot.units_per_quantity : "";
+    const unitsInput = document.getElementById("id_units_per_quantity");
+    if (unitsInput) unitsInput.value = lot ? lot.units_per_quantity : "";
+    const codeHidden = document.getElementById("parsed_product_code_hidden");
+    if (codeHidden) codeHidden.value = product.product_code || "";
+    const volumeSection = document.getElementById("volume-withdrawal-section");
+    if (volumeSection) volumeSection.style.display = (lot && lot.product_feature === "volume") ? "block" : "none";
   }
 
   barcodeInput.addEventListener("keydown", async function (event) {
@@ -59,8 +55,10 @@ document.addEventListener("DOMContentLoaded", function () {
     if (rawBarcode.length < 6) return;
 
     let data = null;
+    let resolved = null;
     try {
-      data = await parseRemote(rawBarcode);
+      resolved = await resolveRemote(rawBarcode);
+      data = resolved.parsed || { product_code: rawBarcode, lot_number: "", expiry_date: "" };
     } catch (remoteErr) {
       // Fallback to lightweight client-side GS1 parse
       data = localParseGS1(rawBarcode);
@@ -72,8 +70,10 @@ document.addEventListener("DOMContentLoaded", function () {
     }
 
     // Fill parsed barcode details when fields exist
+    let displayCode = data.product_code || "";
+    if (/^\d+$/.test(displayCode)) displayCode = displayCode.replace(/^0+/, "") || "0";
     const codeField = document.getElementById("parsed_product_code");
-    if (codeField) codeField.value = data.normalized_product_code || data.product_code || "";
+    if (codeField) codeField.value = displayCode;
     const lotField = document.getElementById("parsed_lot_number");
     if (lotField) lotField.value = data.lot_number || "";
     const expField = document.getElementById("parsed_expiry_date");
@@ -85,10 +85,6 @@ document.addEventListener("DOMContentLoaded", function () {
     const expHidden = document.getElementById("expiry_date_field");
     if (expHidden) expHidden.value = data.expiry_date || "";
 
-    // Normalize product code for DB lookup (strip leading zeros when purely numeric)
-    let lookupCode = data.normalized_product_code || data.product_code || "";
-    if (/^\d+$/.test(lookupCode)) lookupCode = lookupCode.replace(/^0+/, "") || "0";
-
-    if (lookupCode) await hydrateProductDetails(lookupCode);
+    if (resolved && resolved.product) fillProductDetails(resolved.product, resolved.lots || []);
   });
 });
@@ -0,0 +1,81 @@
+// Background exports: queue a job, poll its status and download once it is ready.
+(function () {
+  const statusEl = document.getElementById('exportJobStatus');
+  const form = document.getElementById('downloadForm');
+  if (!statusEl || !form) return;
+
+  const POLL_MS = 1500;
+  const csrfInput = document.querySelector('[name=csrfmiddlewaretoken]');
+
+  class ExportError extends Error {}
+
+  // Rejects with a readable message for non-OK responses, whose body may be an HTML error page
+  function readJob(res) {
+    if (res.ok) return res.json();
+    const message = res.status === 403
+      ? 'You do not have permission to run background exports.'
+      : `The export request failed (HTTP ${res.status}).`;
+    if (!(res.headers.get('Content-Type') || '').includes('application/json')) {
+      return Promise.reject(new ExportError(message));
+    }
+    return res.json().then((body) => { throw new ExportError(body.error || message); });
+  }
+
+  function describe(job) {
+    if (job.status === 'queued') return 'Export queued…';
+    if (job.status === 'running') {
+      if (job.rows_total) {
+        const pct = Math.round((job.progress || 0) * 100);
+        return `Exporting… ${job.rows_written} of ${job.rows_total} rows (${pct}%)`;
+      }
+      return 'Exporting…';
+    }
+    if (job.status === 'done') {
+      const reused = job.reused ? ' (reused an identical export)' : '';
+      return `Export ready: ${job.rows_written} rows${reused}. Downloading…`;
+    }
+    return `Export failed: ${job.error || 'unknown error'}`;
+  }
+
+  function handle(job) {
+    statusEl.textContent = describe(job);
+    if (job.status === 'done' && job.download_url) {
+      window.location.href = job.download_url;
+    } else if (job.status === 'queued' || job.status === 'running') {
+      setTimeout(() => poll(job.status_url), POLL_MS);
+    }
+  }
+
+  function poll(url) {
+    fetch(url, { credentials: 'same-origin' })
+      .then(readJob)
+      .then(handle)
+      .catch((err) => {
+        statusEl.textContent = err instanceof ExportError
+          ? err.message
+          : 'Lost contact with the export job; reload to retry.';
+      });
+  }
+
+  document.querySelectorAll('[data-export-format]').forEach((button) => {
+    button.addEventListener('click', () => {
+      const body = new FormData();
+      body.append('model', form.elements.model.value);
+      body.append('start_date', form.elements.start_date.value);
+      body.append('end_date', form.elements.end_date.value);
+      body.append('format', button.dataset.exportFormat);
+      statusEl.textContent = 'Submitting export…';
+      fetch(statusEl.dataset.createUrl, {
+        method: 'POST',
+        body,
+        credentials: 'same-origin',
+        headers: { 'X-CSRFToken': csrfInput ? csrfInput.value : '' },
+      })
+        .then(readJob)
+        .then(handle)
+        .catch((err) => {
+          statusEl.textContent = err instanceof ExportError ? err.message : 'Could not queue the export.';
+        });
+    });
+  });
+})();
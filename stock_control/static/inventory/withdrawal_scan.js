@@ -0,0 +1,58 @@
+// Submit withdrawals as JSON so the scanner page stays put and is ready for the next scan.
+document.addEventListener("DOMContentLoaded", function () {
+  const form = document.querySelector("form[data-scan-url]");
+  const resultEl = document.getElementById("withdrawal-result");
+  if (!form || !resultEl) return;
+
+  const csrfInput = form.querySelector("[name=csrfmiddlewaretoken]");
+  const barcodeInput = document.getElementById("id_barcode");
+
+  function show(ok, message) {
+    resultEl.className = `feedback-banner ${ok ? "success" : "error"}`;
+    resultEl.textContent = message;
+    resultEl.hidden = false;
+  }
+
+  function describeErrors(json) {
+    if (!json.errors) return json.error || "Withdrawal failed.";
+    const fields = Object.entries(json.errors).map(([field, errors]) => `${field}: ${errors.join(" ")}`);
+    return `${json.error}: ${fields.join("; ")}`;
+  }
+
+  function resetScan() {
+    ["id_barcode", "parsed_product_code", "parsed_lot_number", "parsed_expiry_date", "id_product_name",
+     "parsed_product_code_hidden", "lot_number_field", "expiry_date_field"].forEach((id) => {
+      const el = document.getElementById(id);
+      if (el) el.value = "";
+    });
+    if (barcodeInput) barcodeInput.focus();
+  }
+
+  form.addEventListener("submit", function (event) {
+    event.preventDefault();
+    fetch(form.dataset.scanUrl, {
+      method: "POST",
+      body: new FormData(form),
+      credentials: "same-origin",
+      headers: { "X-CSRFToken": csrfInput ? csrfInput.value : "" },
+    })
+      .then((res) => res.json().then((json) => ({ ok: res.ok, json })))
+      .then(({ ok, json }) => {
+        if (!ok) {
+          show(false, describeErrors(json));
+          return;
+        }
+        const { withdrawal, lot } = json;
+        const amount = withdrawal.withdrawal_type === "part"
+          ? `${withdrawal.parts_withdrawn} part(s)`
+          : `${withdrawal.quantity} ${withdrawal.withdrawal_type === "volume" ? "volume" : "item(s)"}`;
+        show(true, `Withdrew ${amount} of ${lot.product_name} (lot ${lot.lot_number}). Stock now ${lot.current_stock}.`);
+        ["stock-display", "manual-stock-display"].forEach((id) => {
+          const el = document.getElementById(id);
+          if (el) el.textContent = lot.current_stock;
+        });
+        resetScan();
+      })
+      .catch(() => show(false, "Could not reach the server; the withdrawal was not saved."));
+  });
+});
@@ -1,15 +1,90 @@
+import json
 import os
+import threading
+import time
+
 import yaml
 
+# Support loading from config/ relative to project root
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+YAML_CONFIG_PATH = os.path.join(BASE_DIR, "config", "module_config.yaml")
+JSON_CONFIG_PATH = os.path.join(BASE_DIR, "config", "module_config.json")
+
+# A config file is stat'ed at most this often; between checks lookups are plain reads.
+CHECK_INTERVAL_SECONDS = 1.0
+
+
+class ConfigFile:
+    """A parsed config file that is re-read only when its mtime or size changes.
+
+    If a reload fails (say the file is half written) the last good value is
+    kept; if the first load fails, ``default`` is used.
+    """
+
+    def __init__(self, path, parse, default):
+        self.path = path
+        self.parse = parse
+        self.default = default
+        self.generation = 0
+        self._value = default
+        self._signature = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= CHECK_INTERVAL_SECONDS:
+            with self._lock:
+                if self._checked_at is None or now - self._checked_at >= CHECK_INTERVAL_SECONDS:
+                    self._reload_if_changed()
+                    self._checked_at = now
+        return self._value
+
+    def _reload_if_changed(self):
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if self.generation and signature == self._signature:
+            return
+        try:
+            with open(self.path, "r") as f:
+                self._value = self.parse(f)
+        except Exception as e:
+            print(f"⚠️ Could not load module config {os.path.basename(self.path)}: {e}")
+        self._signature = signature
+        self.generation += 1
+
+
+def _parse_yaml(f):
+    config = yaml.safe_load(f) or {}
+    enabled = tuple(config.get("enabled_modules") or ())
+    return {"enabled": enabled, "flags": {module: True for module in enabled}}
+
+
+def _parse_json(f):
+    return json.load(f)
+
+
+module_yaml = ConfigFile(YAML_CONFIG_PATH, _parse_yaml, {"enabled": (), "flags": {}})
+module_json = ConfigFile(JSON_CONFIG_PATH, _parse_json, {})
+
+
+def enabled_modules():
+    """Tuple of the modules enabled in module_config.yaml, in file order."""
+    return module_yaml.get()["enabled"]
+
+
+def enabled_module_flags():
+    """``{module: True}`` for every enabled module. Shared; do not modify."""
+    return module_yaml.get()["flags"]
+
+
+def module_config_flags():
+    """The flags in module_config.json. Shared; do not modify."""
+    return module_json.get()
+
+
 def load_enabled_modules():
-    # Support loading from config/module_config.yaml relative to project root
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    config_path = os.path.join(base_dir, "config", "module_config.yaml")
-
-    try:
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
-        return config.get("enabled_modules", [])
-    except Exception as e:
-        print(f"⚠️ Could not load module config: {e}")
-        return []
+    return list(enabled_modules())
@@ -70,6 +70,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventory.middleware.active_sessions.ActiveSessionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # 'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -90,6 +91,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'inventory.context_processors.module_flags',
                 'inventory.context_processors.active_user_stats',
+                'inventory.context_processors.user_roles',
 
             ],
         },
@@ -110,6 +112,19 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared by every worker process on the host, so a role change or the product
+# code index version stamp written by one process is seen by the others.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', str(BASE_DIR / 'services/data_storage/cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -177,6 +192,11 @@ STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Background report exports (manage.py run_export_worker) write their files here.
+EXPORT_ROOT = BASE_DIR / 'services/data_storage/exports'
+# Finished exports whose date range still includes today are reused for this long.
+EXPORT_JOB_REUSE_SECONDS = 15 * 60
+
 LOGIN_REDIRECT_URL = 'inventory:dashboard'
 LOGOUT_REDIRECT_URL = 'inventory:dashboard'
 # LOGOUT_REDIRECT_URL = '/login/'